@@ -1,7 +1,6 @@
 #!/usr/bin/env python3
 
 import sys
-import joblib
 import numpy as np
 import pandas as pd
 from pathlib import Path
@@ -13,6 +12,12 @@ from PyQt5.QtWidgets import (
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QFont
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from comun.artefacto import cargar_artefacto
+from comun.cache_predicciones import CachePredicciones
+from comun.esquema import aplicar_tipos
+from comun.instrumentacion import Instrumentacion
+
 class EvaluadorRiesgoDiabetes(QMainWindow):
     """Aplicación de evaluación de riesgo de diabetes usando ML."""
     
@@ -20,6 +25,9 @@ class EvaluadorRiesgoDiabetes(QMainWindow):
         super().__init__()
         self.ruta_base = Path(__file__).parent.parent.parent
         self.modelo_info = None
+        # Se activa con DIABETES_INSTRUMENTACION=1; la traza se reescribe tras cada evaluación.
+        self.instrumentacion = Instrumentacion("app")
+        self.ruta_traza = self.ruta_base / "resultados" / "traza_app.json"
         self._configurar_geometria()
         self.cargar_modelo()
         self.inicializar_interfaz()
@@ -34,9 +42,12 @@ class EvaluadorRiesgoDiabetes(QMainWindow):
         
     def cargar_modelo(self):
         """Carga el modelo de ML desde el disco."""
-        ruta_modelo = self.ruta_base / "resultados" / "modelo.pkl"
         try:
-            self.modelo_info = joblib.load(ruta_modelo)
+            # resultados/modelo/ o, si no existe, el modelo.pkl anterior. Con arboles.npz se predice
+            # en NumPy y la aplicación arranca sin importar CatBoost.
+            self.modelo_info = cargar_artefacto(self.ruta_base / "resultados", motor="auto")
+            # Perfiles que caen en los mismos intervalos de bordes reutilizan la probabilidad ya calculada.
+            self.predictor = CachePredicciones(self.modelo_info['modelo'])
         except Exception as e:
             QMessageBox.critical(
                 None, 
@@ -393,31 +404,40 @@ class EvaluadorRiesgoDiabetes(QMainWindow):
                     widget.setValue(widget.minimum())
     
     def evaluar_riesgo(self):
+        etapa = self.instrumentacion.etapa
         try:
-            datos = {}
-            for nombre, widget in self.campos.items():
-                if isinstance(widget, QComboBox):
-                    datos[nombre] = widget.currentData()
-                else:
-                    datos[nombre] = widget.value()
-            
-            peso = self.peso_widget.value()
-            altura_cm = self.altura_widget.value()
-            altura_m = altura_cm / 100.0
-            imc = peso / (altura_m ** 2)
-            datos['imc'] = round(imc, 1)
-            
-            df_entrada = pd.DataFrame([datos])
-            df_entrada = df_entrada[self.modelo_info['nombres_caracteristicas']]
-            
-            probabilidad = self.modelo_info['modelo'].predict_proba(df_entrada)[0, 1]
-            umbral = self.modelo_info['umbral_optimo']
-            prediccion = 1 if probabilidad >= umbral else 0
-            
-            self.mostrar_resultado(prediccion, probabilidad, umbral, imc, datos)
+            with etapa("evaluar_riesgo"):
+                with etapa("formulario"):
+                    datos = {}
+                    for nombre, widget in self.campos.items():
+                        if isinstance(widget, QComboBox):
+                            datos[nombre] = widget.currentData()
+                        else:
+                            datos[nombre] = widget.value()
+                    
+                    peso = self.peso_widget.value()
+                    altura_cm = self.altura_widget.value()
+                    altura_m = altura_cm / 100.0
+                    imc = peso / (altura_m ** 2)
+                    datos['imc'] = round(imc, 1)
+                    
+                    df_entrada = pd.DataFrame([datos])
+                    df_entrada = aplicar_tipos(df_entrada[self.modelo_info['nombres_caracteristicas']])
+                
+                with etapa("prediccion"):
+                    # Una sola fila: más hilos solo añadirían coste y competirían con otros procesos por la cuota de CPU.
+                    probabilidad = self.predictor.predict_proba(df_entrada, thread_count=1)[0, 1]
+                umbral = self.modelo_info['umbral_optimo']
+                prediccion = 1 if probabilidad >= umbral else 0
+                
+                with etapa("resultado"):
+                    self.mostrar_resultado(prediccion, probabilidad, umbral, imc, datos)
             
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Error al realizar la evaluación:\n{str(e)}")
+        if self.instrumentacion.activa:
+            self.instrumentacion.anotar("cache_predicciones", self.predictor.estadisticas())
+            self.instrumentacion.guardar(self.ruta_traza, informar=False)
     
     def mostrar_resultado(self, prediccion, probabilidad, umbral, imc, datos):
         # Limpiar layout anterior de resultados si existe
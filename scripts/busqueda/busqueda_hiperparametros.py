@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import csv
+import math
+import argparse
+import itertools
+import numpy as np
+from pathlib import Path
+from dataclasses import asdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Set, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from comun.cache_etapas import ManifiestoEtapas, huella_configuracion
+from comun.concurrencia import limitar_nucleos, repartir_nucleos
+from entrenamiento.entrenamiento import ConfiguracionModelo, DetectorRiesgoDiabetes
+
+RUTA_BASE = Path(__file__).resolve().parent.parent.parent
+RUTA_RESULTADOS = RUTA_BASE / "pruebas" / "grid_search_results.csv"
+RUTA_SUCESIVA = RUTA_BASE / "pruebas" / "busqueda_sucesiva.csv"
+
+# Rejilla de hiperparámetros: nombre de columna en el CSV -> (campo de ConfiguracionModelo, valores).
+REJILLA: Dict[str, Tuple[str, List]] = {
+    "iterations": ("iteraciones", [150, 175, 200]),
+    "learning_rate": ("tasa_aprendizaje", [0.05, 0.07, 0.1]),
+    "depth": ("profundidad", [4, 5, 6]),
+    "l2_leaf_reg": ("reg_l2_hoja", [3, 4, 5]),
+}
+COLUMNAS_METRICAS = ["recall", "roc_auc", "balance_score"]
+# ``huella`` identifica los datos, el código y la configuración con que se obtuvo cada fila.
+COLUMNAS = list(REJILLA) + COLUMNAS_METRICAS + ["huella"]
+# En la búsqueda por reducción sucesiva cada fila indica además la fracción de datos e iteraciones usada.
+COLUMNAS_SUCESIVA = COLUMNAS + ["fidelidad"]
+
+Clave = Tuple
+
+
+def clave(fila: Dict) -> Clave:
+    """Identifica una configuración; los flotantes se redondean para que la lectura del CSV coincida."""
+    return tuple(round(float(fila[col]), 10) for col in REJILLA)
+
+
+def configuraciones() -> List[Dict]:
+    return [dict(zip(REJILLA, valores)) for valores in itertools.product(*(v for _, v in REJILLA.values()))]
+
+
+def huella_busqueda(ruta_base: Path, colapsar_duplicados: bool) -> str:
+    """Huella de lo que determina las métricas de una fila además de sus hiperparámetros.
+
+    Cuenta los archivos de datos que leerá el entrenamiento, el código de entrenamiento, de
+    ``scripts/comun`` y de este módulo, y el resto de ``ConfiguracionModelo``. Las filas con otra
+    huella (otra partición, otro código o filas anteriores a esta columna) no se reanudan.
+    """
+    detector = DetectorRiesgoDiabetes(ruta_base, ConfiguracionModelo(colapsar_duplicados=colapsar_duplicados), verbosidad=0)
+    # Solo se usa para calcular huellas de archivo (claves relativas a la raíz); no se guarda.
+    manifiesto = ManifiestoEtapas(ruta_base / "manifiesto_etapas.json")
+    archivos = detector._fuentes_datos() + detector._fuentes_codigo() + [Path(__file__).resolve()]
+    configuracion = {campo: valor for campo, valor in asdict(detector.config).items()
+                     if campo not in {c for c, _ in REJILLA.values()}}
+    return huella_configuracion({
+        "archivos": {manifiesto._clave(f): manifiesto.huella_archivo(f) for f in sorted(set(archivos))},
+        "configuracion": configuracion,
+    })[:16]
+
+
+def leer_filas(ruta: Path, huella: Optional[str] = None) -> List[Dict]:
+    """Filas completas ya registradas en el CSV.
+
+    Si una ejecución se interrumpió a mitad de una escritura, la línea incompleta final se
+    elimina para que la configuración vuelva a evaluarse. Con ``huella`` solo se devuelven las
+    filas obtenidas con esa huella.
+    """
+    if not ruta.exists():
+        return []
+    with open(ruta, "rb+") as f:
+        contenido = f.read()
+        if contenido and not contenido.endswith(b"\n"):
+            f.truncate(contenido.rfind(b"\n") + 1)
+    filas = []
+    with open(ruta, newline="", encoding="utf-8") as f:
+        for fila in csv.DictReader(f):
+            try:
+                for col in COLUMNAS_METRICAS:
+                    fila[col] = float(fila[col])
+                clave(fila)
+            except (TypeError, ValueError):
+                continue
+            if huella is None or fila.get("huella") == huella:
+                filas.append(fila)
+    return filas
+
+
+def leer_terminadas(ruta: Path, huella: Optional[str] = None) -> Set[Clave]:
+    """Claves ya registradas en el CSV (con ``huella``, solo las obtenidas con ella)."""
+    return {clave(fila) for fila in leer_filas(ruta, huella)}
+
+
+def preparar_cabecera(ruta: Path, columnas: List[str] = COLUMNAS):
+    """Reescribe el CSV con ``columnas`` si su cabecera es otra (p. ej. un registro sin ``huella``),
+    para que las filas nuevas se añadan alineadas. Las filas existentes se conservan."""
+    if not ruta.exists() or ruta.stat().st_size == 0:
+        return
+    with open(ruta, newline="", encoding="utf-8") as f:
+        lector = csv.DictReader(f)
+        if lector.fieldnames == columnas:
+            return
+        filas = list(lector)
+    temporal = ruta.with_suffix(".tmp")
+    with open(temporal, "w", newline="", encoding="utf-8") as f:
+        escritor = csv.DictWriter(f, fieldnames=columnas, extrasaction="ignore")
+        escritor.writeheader()
+        escritor.writerows(filas)
+    os.replace(temporal, ruta)
+
+
+def agregar_resultado(ruta: Path, fila: Dict, columnas: List[str] = COLUMNAS):
+    """Añade una fila y la lleva a disco de inmediato, para poder reanudar tras una interrupción."""
+    nuevo = not ruta.exists() or ruta.stat().st_size == 0
+    with open(ruta, "a", newline="", encoding="utf-8") as f:
+        escritor = csv.DictWriter(f, fieldnames=columnas)
+        if nuevo:
+            escritor.writeheader()
+        escritor.writerow(fila)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def ordenar_resultados(ruta: Path, columnas: List[str] = COLUMNAS, huella: Optional[str] = None):
+    """Reescribe el CSV ordenado por balance_score (descendente), como el registro original.
+
+    Primero van las filas con ``huella`` y, si hay columna de fidelidad, las de mayor fidelidad.
+    """
+    with open(ruta, newline="", encoding="utf-8") as f:
+        filas = list(csv.DictReader(f))
+    filas.sort(key=lambda fila: (fila.get("huella") != huella, -float(fila.get("fidelidad") or 1),
+                                 -float(fila["balance_score"])))
+    temporal = ruta.with_suffix(".tmp")
+    with open(temporal, "w", newline="", encoding="utf-8") as f:
+        escritor = csv.DictWriter(f, fieldnames=columnas)
+        escritor.writeheader()
+        escritor.writerows(filas)
+    os.replace(temporal, ruta)
+
+
+# Estado de cada proceso trabajador: los datos se cargan una sola vez por proceso.
+_DATOS = None
+_PESOS = None
+_SUBMUESTRAS: Dict[float, Tuple] = {}
+
+
+def _inicializar_trabajador(ruta_base: Path, colapsar_duplicados: bool, hilos: Optional[int] = None):
+    global _DATOS, _PESOS
+    if hilos is not None:
+        # Cada proceso se queda con su parte del presupuesto de núcleos.
+        limitar_nucleos(hilos)
+    detector = DetectorRiesgoDiabetes(ruta_base, ConfiguracionModelo(colapsar_duplicados=colapsar_duplicados), verbosidad=0)
+    _DATOS = detector.cargar_datos()
+    _PESOS = detector.pesos_entrenamiento
+    _SUBMUESTRAS.clear()
+
+
+def submuestra(fidelidad: float, semilla: int = 42) -> Tuple:
+    """Datos y pesos con una fracción ``fidelidad`` del entrenamiento, estratificada por clase.
+
+    El conjunto de prueba se conserva completo para que las métricas sean comparables entre
+    fidelidades. La muestra es fija para cada fidelidad y se calcula una vez por proceso.
+    """
+    if fidelidad >= 1.0:
+        return _DATOS, _PESOS
+    if fidelidad not in _SUBMUESTRAS:
+        X_entrenamiento, y_entrenamiento, X_prueba, y_prueba = _DATOS
+        rng = np.random.default_rng(semilla)
+        etiquetas = y_entrenamiento.to_numpy()
+        idx = np.sort(np.concatenate([
+            rng.choice(fila, size=max(1, int(round(len(fila) * fidelidad))), replace=False)
+            for fila in (np.flatnonzero(etiquetas == c) for c in np.unique(etiquetas))
+        ]))
+        pesos = None if _PESOS is None else np.asarray(_PESOS)[idx]
+        _SUBMUESTRAS[fidelidad] = ((X_entrenamiento.iloc[idx], y_entrenamiento.iloc[idx], X_prueba, y_prueba), pesos)
+    return _SUBMUESTRAS[fidelidad]
+
+
+def evaluar_configuracion(ruta_base: Path, parametros: Dict, colapsar_duplicados: bool, hilos: int, huella: str) -> Dict:
+    if _DATOS is None:
+        _inicializar_trabajador(ruta_base, colapsar_duplicados)
+    config = ConfiguracionModelo(
+        colapsar_duplicados=colapsar_duplicados,
+        **{campo: parametros[col] for col, (campo, _) in REJILLA.items()},
+    )
+    detector = DetectorRiesgoDiabetes(ruta_base, config, n_trabajos=hilos, verbosidad=0)
+    detector.pesos_entrenamiento = _PESOS
+    metricas = detector.evaluar(_DATOS)
+    return {
+        **parametros,
+        "recall": metricas["sensibilidad"],
+        "roc_auc": metricas["roc_auc"],
+        "balance_score": metricas["puntaje_balance"],
+        "huella": huella,
+    }
+
+
+def iteraciones_fidelidad(iteraciones: int, fidelidad: float) -> int:
+    return max(1, math.ceil(iteraciones * fidelidad))
+
+
+def evaluar_grupo(ruta_base: Path, parametros: List[Dict], fidelidad: float, colapsar_duplicados: bool, hilos: int,
+                  huella: str) -> List[Dict]:
+    """Evalúa configuraciones que solo difieren en ``iterations`` a partir de un único ajuste.
+
+    Con fidelidad < 1 se entrena con una submuestra del entrenamiento y con la misma fracción
+    de iteraciones. Las métricas de cada configuración salen del historial de evaluación por
+    iteración del ajuste más largo (``DetectorRiesgoDiabetes.evaluar_prefijos``).
+    """
+    if _DATOS is None:
+        _inicializar_trabajador(ruta_base, colapsar_duplicados)
+    datos, pesos = submuestra(fidelidad)
+    config = ConfiguracionModelo(
+        colapsar_duplicados=colapsar_duplicados,
+        **{campo: parametros[0][col] for col, (campo, _) in REJILLA.items() if col != "iterations"},
+    )
+    detector = DetectorRiesgoDiabetes(ruta_base, config, n_trabajos=hilos, verbosidad=0)
+    detector.pesos_entrenamiento = pesos
+    iteraciones = {iteraciones_fidelidad(p["iterations"], fidelidad) for p in parametros}
+    metricas = detector.evaluar_prefijos(datos, sorted(iteraciones))
+    filas = []
+    for p in parametros:
+        m = metricas[iteraciones_fidelidad(p["iterations"], fidelidad)]
+        filas.append({
+            **p,
+            "recall": m["sensibilidad"],
+            "roc_auc": m["roc_auc"],
+            "balance_score": m["puntaje_balance"],
+            "huella": huella,
+            "fidelidad": round(fidelidad, 10),
+        })
+    return filas
+
+
+def fidelidades(eta: int, niveles: int) -> List[float]:
+    """Fracciones de datos e iteraciones de cada ronda: eta^-(niveles-1), ..., 1/eta, 1."""
+    return [eta ** -(niveles - 1 - i) for i in range(niveles)]
+
+
+def ejecutar_busqueda_sucesiva(ruta_base: Path = RUTA_BASE, ruta_resultados: Path = RUTA_SUCESIVA,
+                               procesos: Optional[int] = None, hilos: Optional[int] = None,
+                               colapsar_duplicados: bool = False, eta: int = 3, niveles: int = 3):
+    """Búsqueda por reducción sucesiva (successive halving) sobre la misma rejilla.
+
+    La primera ronda evalúa todas las configuraciones con ``1/eta^(niveles-1)`` de los datos de
+    entrenamiento y de las iteraciones; en cada ronda pasa a la siguiente la mejor fracción
+    ``1/eta`` por ``balance_score``, con ``eta`` veces más datos e iteraciones, hasta llegar a la
+    fidelidad completa. Las configuraciones que solo difieren en ``iterations`` comparten un ajuste.
+    El CSV se reanuda por (configuración, fidelidad) entre las filas con la huella actual.
+    """
+    if eta < 2 or niveles < 1:
+        raise ValueError("Se requiere eta >= 2 y al menos un nivel de fidelidad.")
+    huella = huella_busqueda(ruta_base, colapsar_duplicados)
+    preparar_cabecera(ruta_resultados, COLUMNAS_SUCESIVA)
+    registradas = {(clave(f), round(float(f["fidelidad"]), 10)): f
+                   for f in leer_filas(ruta_resultados, huella) if f.get("fidelidad")}
+    candidatas = configuraciones()
+    print(f"[*] Búsqueda por reducción sucesiva: {len(candidatas)} configuraciones, eta={eta}, "
+          f"fidelidades {', '.join(f'{f:.3g}' for f in fidelidades(eta, niveles))}")
+    ruta_resultados.parent.mkdir(parents=True, exist_ok=True)
+    # Coste en árboles × filas relativo a evaluar toda la rejilla con fidelidad completa (un ajuste por configuración).
+    coste_rejilla = sum(p["iterations"] for p in candidatas)
+    coste = 0.0
+    filas: List[Dict] = []
+
+    for nivel, fidelidad in enumerate(fidelidades(eta, niveles)):
+        fidelidad = round(fidelidad, 10)
+        filas = [registradas[(clave(p), fidelidad)] for p in candidatas if (clave(p), fidelidad) in registradas]
+        pendientes = [p for p in candidatas if (clave(p), fidelidad) not in registradas]
+        grupos: Dict[Clave, List[Dict]] = {}
+        for p in pendientes:
+            grupos.setdefault(tuple(round(float(p[c]), 10) for c in REJILLA if c != "iterations"), []).append(p)
+        print(f"    > Ronda {nivel + 1}: {len(candidatas)} configuraciones con fidelidad {fidelidad:.3g} "
+              f"({len(candidatas) - len(pendientes)} ya registradas, {len(grupos)} grupos por entrenar)")
+
+        if grupos:
+            n_procesos, n_hilos = repartir_nucleos(len(grupos), procesos, hilos)
+            with ProcessPoolExecutor(max_workers=n_procesos, initializer=_inicializar_trabajador,
+                                     initargs=(ruta_base, colapsar_duplicados, n_hilos)) as pool:
+                futuros = [pool.submit(evaluar_grupo, ruta_base, grupo, fidelidad, colapsar_duplicados, n_hilos, huella)
+                           for grupo in grupos.values()]
+                for futuro in as_completed(futuros):
+                    for fila in futuro.result():
+                        agregar_resultado(ruta_resultados, fila, COLUMNAS_SUCESIVA)
+                        filas.append(fila)
+        # Un ajuste por grupo, hasta las iteraciones más largas del grupo.
+        coste += fidelidad * sum(iteraciones_fidelidad(max(p["iterations"] for p in g), fidelidad)
+                                 for g in grupos.values())
+
+        if nivel == niveles - 1:
+            break
+        # Pasan las mejores 1/eta; los empates se resuelven por el orden de la rejilla.
+        orden = {clave(p): i for i, p in enumerate(candidatas)}
+        filas.sort(key=lambda f: (-float(f["balance_score"]), orden[clave(f)]))
+        supervivientes = {clave(f) for f in filas[:max(1, math.ceil(len(candidatas) / eta))]}
+        candidatas = [p for p in candidatas if clave(p) in supervivientes]
+
+    ordenar_resultados(ruta_resultados, COLUMNAS_SUCESIVA, huella)
+    mejor = max(filas, key=lambda f: float(f["balance_score"]))
+    print(f"[OK] Mejor configuración: {', '.join(f'{c}={mejor[c]}' for c in REJILLA)} "
+          f"-> recall {float(mejor['recall'])*100:.2f}% | AUC {float(mejor['roc_auc'])*100:.2f}% | "
+          f"balance {float(mejor['balance_score'])*100:.2f}%")
+    if coste:
+        print(f"    > Cómputo de esta ejecución: {coste / coste_rejilla * 100:.1f}% del de la rejilla completa")
+    print(f"[OK] Resultados guardados en: {ruta_resultados}")
+
+
+def ejecutar_busqueda(ruta_base: Path = RUTA_BASE, ruta_resultados: Path = RUTA_RESULTADOS,
+                      procesos: Optional[int] = None, hilos: Optional[int] = None, colapsar_duplicados: bool = False):
+    """Evalúa la rejilla completa; reanuda las configuraciones registradas con la huella actual."""
+    huella = huella_busqueda(ruta_base, colapsar_duplicados)
+    preparar_cabecera(ruta_resultados)
+    terminadas = leer_terminadas(ruta_resultados, huella)
+    pendientes = [p for p in configuraciones() if clave(p) not in terminadas]
+    total = len(configuraciones())
+    print(f"[*] Búsqueda de hiperparámetros: {total} configuraciones, {total - len(pendientes)} ya registradas "
+          f"en {ruta_resultados} (huella {huella})")
+    otras = len(leer_filas(ruta_resultados)) - len(leer_filas(ruta_resultados, huella))
+    if otras:
+        print(f"    > {otras} filas con otra huella (otros datos, código o configuración): se conservan pero no se reanudan")
+    if not pendientes:
+        print("[=] No queda ninguna configuración pendiente.")
+        return
+
+    procesos, hilos = repartir_nucleos(len(pendientes), procesos, hilos)
+    print(f"    > {len(pendientes)} pendientes | {procesos} procesos × {hilos} hilos de CatBoost")
+    ruta_resultados.parent.mkdir(parents=True, exist_ok=True)
+
+    with ProcessPoolExecutor(max_workers=procesos, initializer=_inicializar_trabajador,
+                             initargs=(ruta_base, colapsar_duplicados, hilos)) as pool:
+        futuros = {pool.submit(evaluar_configuracion, ruta_base, p, colapsar_duplicados, hilos, huella): p for p in pendientes}
+        for n, futuro in enumerate(as_completed(futuros), start=1):
+            fila = futuro.result()
+            agregar_resultado(ruta_resultados, fila)
+            print(f"    [{n}/{len(pendientes)}] {', '.join(f'{c}={fila[c]}' for c in REJILLA)} "
+                  f"-> recall {fila['recall']*100:.2f}% | AUC {fila['roc_auc']*100:.2f}% | balance {fila['balance_score']*100:.2f}%")
+
+    ordenar_resultados(ruta_resultados, huella=huella)
+    print(f"[OK] Resultados guardados en: {ruta_resultados}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Búsqueda en rejilla de hiperparámetros de CatBoost, paralela y reanudable.")
+    parser.add_argument("--salida", type=Path, default=None,
+                        help=f"CSV de resultados, se reanuda si ya existe (por defecto {RUTA_RESULTADOS.name} o {RUTA_SUCESIVA.name} con --sucesiva).")
+    parser.add_argument("--procesos", type=int, default=None, help="Ajustes simultáneos (por defecto, según los núcleos).")
+    parser.add_argument("--hilos", type=int, default=None, help="thread_count de CatBoost en cada ajuste.")
+    parser.add_argument("--colapsar-duplicados", action="store_true",
+                        help="Entrena con el conjunto colapsado y pesos por fila (requiere preprocesar con la misma opción).")
+    parser.add_argument("--sucesiva", action="store_true",
+                        help="Reducción sucesiva: muchas configuraciones con pocos datos e iteraciones, solo las mejores llegan a fidelidad completa.")
+    parser.add_argument("--eta", type=int, default=3, help="Factor de reducción entre rondas (con --sucesiva).")
+    parser.add_argument("--niveles", type=int, default=3, help="Número de fidelidades (con --sucesiva).")
+    args = parser.parse_args()
+
+    if args.sucesiva:
+        ejecutar_busqueda_sucesiva(ruta_resultados=args.salida or RUTA_SUCESIVA, procesos=args.procesos, hilos=args.hilos,
+                                   colapsar_duplicados=args.colapsar_duplicados, eta=args.eta, niveles=args.niveles)
+    else:
+        ejecutar_busqueda(ruta_resultados=args.salida or RUTA_RESULTADOS, procesos=args.procesos, hilos=args.hilos,
+                          colapsar_duplicados=args.colapsar_duplicados)
@@ -0,0 +1,143 @@
+import os
+import json
+import tempfile
+import numpy as np
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+Ruta = Union[str, Path]
+
+# Filas que se puntúan a la vez: con bloques mayores las matrices (árboles × filas) dejan de caber
+# en caché y el rendimiento cae (medido con 148 árboles de profundidad 6).
+FILAS_POR_BLOQUE = 2048
+
+
+def exportar_arboles(modelo) -> Dict[str, np.ndarray]:
+    """Arrays de los árboles simétricos de un ``CatBoostClassifier`` binario, a partir de su exportación JSON.
+
+    Cada árbol de profundidad ``d`` tiene ``d`` divisiones (característica, borde) comunes a todo el
+    nivel; la hoja de una fila es el entero cuyo bit ``i`` vale ``x[caracteristica_i] > borde_i``.
+    Los árboles menos profundos que el máximo se rellenan con divisiones que nunca se cumplen
+    (borde +inf) y hojas repetidas, para que todos compartan forma.
+    """
+    with tempfile.TemporaryDirectory() as carpeta:
+        ruta = os.path.join(carpeta, "modelo.json")
+        modelo.save_model(ruta, format="json")
+        with open(ruta, encoding="utf-8") as f:
+            datos = json.load(f)
+
+    if set(datos["features_info"]) - {"float_features"}:
+        raise ValueError("Solo se exportan modelos con características numéricas.")
+    caracteristicas_info = sorted(datos["features_info"]["float_features"], key=lambda c: c["flat_feature_index"])
+    arboles = datos["oblivious_trees"]
+    profundidad = max(len(a["splits"]) for a in arboles)
+
+    n_arboles = len(arboles)
+    caracteristicas = np.zeros((n_arboles, profundidad), dtype=np.int32)
+    bordes = np.full((n_arboles, profundidad), np.inf, dtype=np.float32)
+    hojas = np.zeros((n_arboles, 1 << profundidad), dtype=np.float64)
+    for t, arbol in enumerate(arboles):
+        divisiones = arbol["splits"]
+        if any(d["split_type"] != "FloatFeature" for d in divisiones) or len(arbol["leaf_values"]) != 1 << len(divisiones):
+            raise ValueError("Solo se exportan árboles simétricos de clasificación binaria con divisiones numéricas.")
+        for i, division in enumerate(divisiones):
+            caracteristicas[t, i] = division["float_feature_index"]
+            bordes[t, i] = division["border"]
+        # Los bits de relleno siempre valen 0, así que basta repetir las hojas en los índices altos.
+        hojas[t] = np.tile(arbol["leaf_values"], 1 << (profundidad - len(divisiones)))
+
+    escala, sesgo = datos["scale_and_bias"]
+    return {
+        "caracteristicas": caracteristicas,
+        "bordes": bordes,
+        "hojas": hojas,
+        "escala": np.float64(escala),
+        "sesgo": np.float64(sesgo[0] if isinstance(sesgo, list) else sesgo),
+        "nombres": np.array([c["feature_id"] for c in caracteristicas_info]),
+        # Con 'Max', CatBoost trata un NaN como mayor que cualquier borde; con 'Min' y 'AsIs', como menor.
+        "nan_mayor": np.array([c.get("nan_value_treatment") == "Max" for c in caracteristicas_info]),
+    }
+
+
+def guardar_arboles(ruta: Ruta, arrays: Dict[str, np.ndarray]):
+    temporal = Path(ruta).with_name(f"{Path(ruta).name}.{os.getpid()}.tmp.npz")
+    np.savez(temporal, **arrays)
+    os.replace(temporal, ruta)
+
+
+class PuntuadorArboles:
+    """Evaluación en NumPy de los árboles exportados con ``exportar_arboles``, sin importar CatBoost.
+
+    Imita la interfaz de predicción de ``CatBoostClassifier`` (``predict_proba``, ``feature_names_``)
+    para poder sustituirlo donde solo se predice. Las características se comparan en float32, como
+    hace CatBoost, y las hojas se suman en float64. Muchos árboles repiten división, así que cada
+    bloque compara una vez cada par (característica, borde) distinto y los bits de cada nivel se
+    copian de esa matriz binaria.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        self.caracteristicas = arrays["caracteristicas"]
+        self.bordes = arrays["bordes"]
+        self.escala = float(arrays["escala"])
+        self.sesgo = float(arrays["sesgo"])
+        self.feature_names_: List[str] = [str(n) for n in arrays["nombres"]]
+        self.nan_mayor = np.asarray(arrays["nan_mayor"], dtype=bool)
+        n_arboles, profundidad = self.caracteristicas.shape
+        self.tree_count_ = n_arboles
+        pares = np.stack([self.caracteristicas.ravel().astype(np.float64), self.bordes.ravel().astype(np.float64)], axis=1)
+        unicos, inversos = np.unique(pares, axis=0, return_inverse=True)
+        self._columnas_unicas = unicos[:, 0].astype(np.intp)
+        self._bordes_unicos = unicos[:, 1].astype(np.float32)[:, None]
+        self._division = inversos.reshape(n_arboles, profundidad)
+        # Con hasta 8 niveles el índice de hoja cabe en un byte, y operar en uint8 es casi el doble de rápido.
+        self._tipo_indice = np.uint8 if profundidad <= 8 else np.int32
+        # Hojas aplanadas y desplazamiento de cada árbol, para recogerlas con un único np.take.
+        self._hojas = np.ascontiguousarray(arrays["hojas"]).ravel()
+        self._desplazamientos = (np.arange(n_arboles, dtype=np.int32) << profundidad)[:, None]
+
+    @classmethod
+    def cargar(cls, ruta: Ruta) -> "PuntuadorArboles":
+        with np.load(ruta) as datos:
+            return cls({clave: datos[clave] for clave in datos.files})
+
+    def bordes_por_caracteristica(self) -> List[np.ndarray]:
+        """Bordes float32 distintos y ordenados que usa el modelo en cada característica (sin el relleno)."""
+        return [
+            np.unique(self.bordes[(self.caracteristicas == j) & np.isfinite(self.bordes)])
+            for j in range(len(self.feature_names_))
+        ]
+
+    def matriz(self, X) -> np.ndarray:
+        """Filas en float32 con las columnas en el orden del modelo y los NaN ya resueltos según ``nan_mayor``."""
+        if hasattr(X, "columns"):
+            # Seleccionar columnas en un DataFrame cuesta más que puntuar una fila: se evita si ya vienen en orden.
+            if list(X.columns) != self.feature_names_:
+                X = X[self.feature_names_]
+            X = X.to_numpy(dtype=np.float32)
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[None, :]
+        if self.nan_mayor.any():
+            X = X.copy()
+            columnas = np.flatnonzero(self.nan_mayor)
+            X[:, columnas] = np.where(np.isnan(X[:, columnas]), np.inf, X[:, columnas])
+        return X
+
+    def puntuacion(self, X) -> np.ndarray:
+        """Suma de hojas escalada más el sesgo (el ``RawFormulaVal`` de CatBoost)."""
+        X = self.matriz(X)
+        salida = np.empty(len(X), dtype=np.float64)
+        for inicio in range(0, len(X), FILAS_POR_BLOQUE):
+            bloque = X[inicio:inicio + FILAS_POR_BLOQUE]
+            # (divisiones distintas × filas) con 0/1, y de ahí el índice de hoja (árboles × filas).
+            binaria = (bloque.T[self._columnas_unicas] > self._bordes_unicos).view(np.uint8)
+            indices = binaria[self._division[:, 0]].astype(self._tipo_indice)
+            for nivel in range(1, self._division.shape[1]):
+                indices |= binaria[self._division[:, nivel]].astype(self._tipo_indice, copy=False) << nivel
+            salida[inicio:inicio + len(bloque)] = np.take(self._hojas, indices + self._desplazamientos).sum(axis=0)
+        return self.escala * salida + self.sesgo
+
+    def predict_proba(self, X, thread_count: Optional[int] = None) -> np.ndarray:
+        """Probabilidades (n, 2) como ``CatBoostClassifier.predict_proba``; ``thread_count`` se ignora."""
+        p = 1.0 / (1.0 + np.exp(-self.puntuacion(X)))
+        return np.column_stack([1.0 - p, p])
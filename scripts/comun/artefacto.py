@@ -0,0 +1,162 @@
+import os
+import json
+import hashlib
+from pathlib import Path
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Union
+
+Ruta = Union[str, Path]
+
+VERSION_ARTEFACTO = 1
+CARPETA_ARTEFACTO = "modelo"
+ARCHIVO_MODELO = "modelo.cbm"
+ARCHIVO_METADATOS = "metadatos.json"
+# Árboles del modelo como arrays de NumPy (``comun.arboles``): permiten predecir sin importar CatBoost.
+ARCHIVO_ARBOLES = "arboles.npz"
+
+MOTORES = ("catboost", "numpy", "auto")
+
+# Formato anterior: un pickle de joblib con el modelo y los metadatos en un diccionario. Solo se lee.
+ARCHIVO_LEGADO = "modelo.pkl"
+
+
+def localizar_artefacto(ruta: Ruta) -> Path:
+    """Artefacto a partir de la carpeta de resultados, de la carpeta del artefacto o de un ``.pkl``.
+
+    En la carpeta de resultados se prefiere ``modelo/`` y, si no existe, el pickle legado.
+    """
+    ruta = Path(ruta)
+    if ruta.suffix == ".pkl" or (ruta / ARCHIVO_METADATOS).exists():
+        return ruta
+    if (ruta / CARPETA_ARTEFACTO / ARCHIVO_METADATOS).exists():
+        return ruta / CARPETA_ARTEFACTO
+    if (ruta / ARCHIVO_LEGADO).exists():
+        return ruta / ARCHIVO_LEGADO
+    raise FileNotFoundError(f"No hay artefacto del modelo en {ruta} (ni {CARPETA_ARTEFACTO}/ ni {ARCHIVO_LEGADO}).")
+
+
+def es_legado(ruta: Ruta) -> bool:
+    return Path(ruta).suffix == ".pkl"
+
+
+def archivos_artefacto(ruta: Ruta) -> List[Path]:
+    """Archivos que componen el artefacto (para las huellas de las etapas que dependen de él)."""
+    ruta = Path(ruta)
+    return [ruta] if es_legado(ruta) else [ruta / ARCHIVO_MODELO, ruta / ARCHIVO_ARBOLES, ruta / ARCHIVO_METADATOS]
+
+
+def _sha256(ruta: Path) -> str:
+    sha = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 20), b""):
+            sha.update(bloque)
+    return sha.hexdigest()
+
+
+def _a_json(valor: Any):
+    import numpy as np
+    if isinstance(valor, np.generic):
+        return valor.item()
+    if isinstance(valor, np.ndarray):
+        return valor.tolist()
+    raise TypeError(f"{type(valor).__name__} no es serializable en los metadatos del artefacto")
+
+
+def guardar_artefacto(carpeta: Ruta, modelo, metadatos: Dict[str, Any]) -> Path:
+    """Guarda ``modelo`` en el formato binario de CatBoost, sus árboles como arrays y ``metadatos`` en un JSON.
+
+    Se añaden la versión del formato, los nombres y tipos de las características, la versión de
+    CatBoost y el SHA-256 del modelo y de los árboles. El JSON se escribe el último, así que un
+    artefacto a medio guardar no pasa la comprobación de ``cargar_artefacto``.
+    """
+    import catboost
+    from comun.arboles import exportar_arboles, guardar_arboles
+    from comun.esquema import POR_DESTINO
+
+    carpeta = Path(carpeta)
+    carpeta.mkdir(parents=True, exist_ok=True)
+    ruta_modelo = carpeta / ARCHIVO_MODELO
+    temporal = carpeta / f"{ARCHIVO_MODELO}.{os.getpid()}.tmp"
+    modelo.save_model(str(temporal), format="cbm")
+    os.replace(temporal, ruta_modelo)
+    guardar_arboles(carpeta / ARCHIVO_ARBOLES, exportar_arboles(modelo))
+
+    nombres = list(modelo.feature_names_)
+    completos = {
+        "version": VERSION_ARTEFACTO,
+        "formato": "cbm",
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "catboost": catboost.__version__,
+        "sha256_modelo": _sha256(ruta_modelo),
+        "sha256_arboles": _sha256(carpeta / ARCHIVO_ARBOLES),
+        "nombres_caracteristicas": nombres,
+        "tipos": {c: POR_DESTINO[c].tipo if c in POR_DESTINO else "float32" for c in nombres},
+        **metadatos,
+    }
+    temporal = carpeta / f"{ARCHIVO_METADATOS}.{os.getpid()}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(completos, f, indent=2, ensure_ascii=False, default=_a_json)
+    os.replace(temporal, carpeta / ARCHIVO_METADATOS)
+    return carpeta
+
+
+def leer_metadatos(ruta: Ruta) -> Dict[str, Any]:
+    """Metadatos del artefacto sin cargar el modelo (ni importar CatBoost).
+
+    Con el pickle legado no hay forma de separarlos: se deserializa entero y se descarta el modelo.
+    """
+    ruta = localizar_artefacto(ruta)
+    if es_legado(ruta):
+        import joblib
+        datos = joblib.load(ruta)
+        datos.pop("modelo", None)
+        return {"version": 0, "formato": "pkl", **datos}
+    with open(ruta / ARCHIVO_METADATOS, encoding="utf-8") as f:
+        metadatos = json.load(f)
+    if metadatos.get("version", 0) > VERSION_ARTEFACTO:
+        raise ValueError(f"El artefacto {ruta} tiene la versión {metadatos['version']}; "
+                         f"este código lee hasta la {VERSION_ARTEFACTO}.")
+    return metadatos
+
+
+def _comprobar(ruta: Path, sha256: Optional[str]):
+    if _sha256(ruta) != sha256:
+        raise ValueError(f"{ruta} no coincide con su {ARCHIVO_METADATOS}: el artefacto está incompleto o se modificó.")
+
+
+def cargar_artefacto(ruta: Ruta, motor: str = "catboost") -> Dict[str, Any]:
+    """Modelo y metadatos en el mismo diccionario que guardaba el pickle legado (``'modelo'``,
+    ``'nombres_caracteristicas'``, ``'umbral_optimo'``, ``'metricas'``...), de cualquiera de los dos formatos.
+
+    Con ``motor='numpy'``, ``'modelo'`` es un ``PuntuadorArboles``: solo predice, pero no importa
+    CatBoost. ``'auto'`` lo usa si el artefacto trae ``arboles.npz`` y, si no, carga CatBoost.
+    """
+    if motor not in MOTORES:
+        raise ValueError(f"motor debe ser uno de {MOTORES}, no {motor!r}.")
+    ruta = localizar_artefacto(ruta)
+    if es_legado(ruta):
+        import joblib
+        artefacto = joblib.load(ruta)
+        if motor == "numpy":
+            from comun.arboles import PuntuadorArboles, exportar_arboles
+            artefacto["modelo"] = PuntuadorArboles(exportar_arboles(artefacto["modelo"]))
+        return artefacto
+
+    metadatos = leer_metadatos(ruta)
+    if motor == "numpy" or (motor == "auto" and "sha256_arboles" in metadatos):
+        from comun.arboles import PuntuadorArboles
+        _comprobar(ruta / ARCHIVO_ARBOLES, metadatos.get("sha256_arboles"))
+        return {**metadatos, "modelo": PuntuadorArboles.cargar(ruta / ARCHIVO_ARBOLES)}
+
+    from catboost import CatBoostClassifier
+    _comprobar(ruta / ARCHIVO_MODELO, metadatos["sha256_modelo"])
+    return {**metadatos, "modelo": CatBoostClassifier().load_model(str(ruta / ARCHIVO_MODELO), format="cbm")}
+
+
+def convertir_legado(ruta_pkl: Ruta, carpeta: Ruta) -> Path:
+    """Reescribe un ``modelo.pkl`` en el formato de carpeta (sin huella de datos: el pickle no la tenía)."""
+    import joblib
+    datos = joblib.load(ruta_pkl)
+    modelo = datos.pop("modelo")
+    datos.pop("nombres_caracteristicas", None)
+    return guardar_artefacto(carpeta, modelo, {"huella_datos": None, **datos})
@@ -0,0 +1,127 @@
+import os
+import json
+import hashlib
+from pathlib import Path
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Union
+
+Ruta = Union[str, Path]
+
+TAMANO_LECTURA = 1 << 20
+
+
+@dataclass
+class EstadoEtapa:
+    nombre: str
+    vigente: bool
+    motivos: List[str]
+    entradas: Dict[str, str] = field(default_factory=dict)
+    configuracion: str = ""
+    salidas: List[str] = field(default_factory=list)
+
+
+def fuentes_comun() -> List[Path]:
+    """Módulos de ``scripts/comun``: las etapas los cuentan todos como entradas, porque cualquiera de
+    ellos (métricas, gráficos, pools, exportación de árboles...) puede cambiar lo que producen."""
+    return sorted(Path(__file__).resolve().parent.glob("*.py"))
+
+
+def huella_configuracion(configuracion: Any) -> str:
+    texto = json.dumps(configuracion, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+
+class ManifiestoEtapas:
+    """Registro de huellas de contenido por etapa para omitir el trabajo cuyas entradas no cambiaron.
+
+    Cada etapa guarda el SHA-256 de sus archivos de entrada, el de su configuración y la lista de
+    artefactos que produjo. Los hashes de archivo se memorizan junto a su tamaño y fecha de
+    modificación, de modo que un archivo sin tocar no vuelve a leerse.
+    """
+
+    def __init__(self, ruta: Ruta, forzar: bool = False):
+        self.ruta = Path(ruta)
+        self.base = self.ruta.parent
+        self.forzar = forzar
+        self.estados: List[EstadoEtapa] = []
+        self.datos = {"archivos": {}, "etapas": {}}
+        if self.ruta.exists():
+            with open(self.ruta, encoding="utf-8") as f:
+                self.datos = json.load(f)
+
+    def _clave(self, ruta: Ruta) -> str:
+        return os.path.relpath(Path(ruta).resolve(), self.base.resolve())
+
+    def huella_archivo(self, ruta: Ruta) -> str:
+        clave = self._clave(ruta)
+        estado = os.stat(ruta)
+        previo = self.datos["archivos"].get(clave)
+        if previo and previo["tamano"] == estado.st_size and previo["mtime_ns"] == estado.st_mtime_ns:
+            return previo["sha256"]
+        sha = hashlib.sha256()
+        with open(ruta, "rb") as f:
+            for bloque in iter(lambda: f.read(TAMANO_LECTURA), b""):
+                sha.update(bloque)
+        self.datos["archivos"][clave] = {"tamano": estado.st_size, "mtime_ns": estado.st_mtime_ns, "sha256": sha.hexdigest()}
+        return sha.hexdigest()
+
+    def comprobar(self, nombre: str, entradas: Iterable[Ruta], configuracion: Any, salidas: Iterable[Ruta]) -> EstadoEtapa:
+        """Compara las huellas actuales con las registradas y devuelve si la etapa puede omitirse."""
+        huellas = {}
+        motivos = []
+        for ruta in entradas:
+            if not Path(ruta).exists():
+                motivos.append(f"no existe la entrada {ruta}")
+                continue
+            huellas[self._clave(ruta)] = self.huella_archivo(ruta)
+        estado = EstadoEtapa(
+            nombre=nombre,
+            vigente=False,
+            motivos=motivos,
+            entradas=huellas,
+            configuracion=huella_configuracion(configuracion),
+            salidas=[self._clave(r) for r in salidas],
+        )
+
+        previo = self.datos["etapas"].get(nombre)
+        if self.forzar:
+            motivos.append("ejecución forzada")
+        elif previo is None:
+            motivos.append("sin ejecución previa registrada")
+        else:
+            cambiadas = [
+                clave for clave in sorted(set(huellas) | set(previo["entradas"]))
+                if huellas.get(clave) != previo["entradas"].get(clave)
+            ]
+            if len(cambiadas) == 1:
+                motivos.append(f"cambió la entrada {cambiadas[0]}")
+            elif cambiadas:
+                resto = f" y {len(cambiadas) - 3} más" if len(cambiadas) > 3 else ""
+                motivos.append(f"cambiaron {len(cambiadas)} entradas ({', '.join(cambiadas[:3])}{resto})")
+            if estado.configuracion != previo["configuracion"]:
+                motivos.append("cambió la configuración")
+            for clave in estado.salidas:
+                if not (self.base / clave).exists():
+                    motivos.append(f"falta el artefacto {clave}")
+
+        estado.vigente = not motivos
+        self.estados.append(estado)
+        self._informar(estado)
+        return estado
+
+    def registrar(self, estado: EstadoEtapa):
+        """Guarda la etapa como completada con las huellas calculadas en ``comprobar``."""
+        self.datos["etapas"][estado.nombre] = {
+            "entradas": estado.entradas,
+            "configuracion": estado.configuracion,
+            "salidas": estado.salidas,
+        }
+        self.ruta.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.ruta, "w", encoding="utf-8") as f:
+            json.dump(self.datos, f, indent=2, ensure_ascii=False)
+
+    def _informar(self, estado: EstadoEtapa):
+        if estado.vigente:
+            print(f"[=] Etapa '{estado.nombre}' vigente: se reutilizan {len(estado.salidas)} artefactos.")
+        else:
+            print(f"[*] Etapa '{estado.nombre}' se ejecuta: {'; '.join(estado.motivos)}.")
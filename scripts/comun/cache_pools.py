@@ -0,0 +1,95 @@
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Optional, Union
+
+import catboost
+from catboost import Pool
+
+Ruta = Union[str, Path]
+
+# Pools cuantizados que se conservan en disco; al superarlo se borran los usados hace más tiempo.
+LIMITE_ARCHIVOS = 16
+
+
+class CachePools:
+    """Pools de entrenamiento de CatBoost ya cuantizados, guardados en disco y reutilizables entre ejecuciones.
+
+    La clave es un SHA-256 del contenido (características, etiqueta y pesos por fila, o los bytes
+    del archivo y su ``.cd``), de los parámetros de cuantización y de la versión de CatBoost, así
+    que la cuantización solo se hace la primera vez que se ven los datos. ``Pool.quantize`` calcula
+    los bordes con todas las filas; dentro de ``fit``, CatBoost los calcula sobre una submuestra
+    cuando hay más de 200 000 filas, así que con conjuntos grandes los bordes pueden diferir
+    ligeramente de los de un ajuste sin caché. Por eso quien la use debe contar el uso de la caché
+    en la huella de lo que entrena.
+    """
+
+    def __init__(self, carpeta: Ruta, n_bordes: int = 254, tipo_bordes: str = "GreedyLogSum",
+                 limite_archivos: int = LIMITE_ARCHIVOS, verbose: bool = True):
+        self.carpeta = Path(carpeta)
+        self.n_bordes = n_bordes
+        self.tipo_bordes = tipo_bordes
+        self.limite_archivos = limite_archivos
+        self.verbose = verbose
+
+    def huella(self, X: pd.DataFrame, y: pd.Series, pesos=None) -> str:
+        sha = hashlib.sha256(self._parametros())
+        sha.update(json.dumps({"columnas": list(map(str, X.columns)), "tipos": [str(t) for t in X.dtypes]}).encode("utf-8"))
+        sha.update(pd.util.hash_pandas_object(X, index=False).to_numpy().tobytes())
+        sha.update(np.ascontiguousarray(np.asarray(y)).tobytes())
+        if pesos is not None:
+            sha.update(np.ascontiguousarray(np.asarray(pesos, dtype=np.float64)).tobytes())
+        return sha.hexdigest()
+
+    def _parametros(self) -> bytes:
+        return json.dumps({
+            "n_bordes": self.n_bordes,
+            "tipo_bordes": self.tipo_bordes,
+            "catboost": catboost.__version__,
+        }, sort_keys=True).encode("utf-8")
+
+    def huella_archivo(self, ruta: Ruta, ruta_cd: Ruta) -> str:
+        sha = hashlib.sha256(self._parametros())
+        for r in (ruta_cd, ruta):
+            with open(r, "rb") as f:
+                for bloque in iter(lambda: f.read(1 << 20), b""):
+                    sha.update(bloque)
+        return sha.hexdigest()
+
+    def obtener(self, X: pd.DataFrame, y: pd.Series, pesos=None, hilos: Optional[int] = None) -> Pool:
+        """Pool cuantizado para ``(X, y, pesos)``: se carga de disco si existe y, si no, se cuantiza y se guarda."""
+        return self._obtener(self.huella(X, y, pesos), lambda: Pool(X, y, weight=pesos, thread_count=hilos or -1))
+
+    def obtener_de_archivo(self, ruta: Ruta, ruta_cd: Ruta, hilos: Optional[int] = None) -> Pool:
+        """Como ``obtener``, para un CSV con cabecera descrito por el ``.cd`` dado (clave: contenido de ambos)."""
+        return self._obtener(self.huella_archivo(ruta, ruta_cd), lambda: Pool(
+            str(ruta), column_description=str(ruta_cd), delimiter=",", has_header=True, thread_count=hilos or -1
+        ))
+
+    def _obtener(self, huella: str, crear) -> Pool:
+        ruta = self.carpeta / f"{huella}.cbpool"
+        if ruta.exists():
+            os.utime(ruta)
+            if self.verbose:
+                print(f"    > Pool cuantizado reutilizado: {ruta.name[:12]}… ({ruta.stat().st_size / 1e6:.1f} MB)")
+            return Pool(f"quantized://{ruta}")
+
+        pool = crear()
+        pool.quantize(border_count=self.n_bordes, feature_border_type=self.tipo_bordes)
+        self.carpeta.mkdir(parents=True, exist_ok=True)
+        # Escritura atómica: varios procesos de una búsqueda pueden cuantizar los mismos datos a la vez.
+        temporal = ruta.with_name(f"{ruta.name}.{os.getpid()}.tmp")
+        pool.save(str(temporal))
+        os.replace(temporal, ruta)
+        self._podar()
+        if self.verbose:
+            print(f"    > Pool cuantizado guardado: {ruta.name[:12]}… ({ruta.stat().st_size / 1e6:.1f} MB)")
+        return pool
+
+    def _podar(self):
+        archivos = sorted(self.carpeta.glob("*.cbpool"), key=lambda r: r.stat().st_mtime_ns, reverse=True)
+        for ruta in archivos[self.limite_archivos:]:
+            ruta.unlink(missing_ok=True)
@@ -0,0 +1,105 @@
+import numpy as np
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from comun.arboles import PuntuadorArboles, exportar_arboles
+
+# Perfiles distintos que se recuerdan; cada entrada ocupa unos 150 bytes.
+CAPACIDAD = 16_384
+
+
+class CachePredicciones:
+    """Probabilidades memorizadas por intervalo de bordes, delante de cualquier modelo con ``predict_proba``.
+
+    Un árbol de CatBoost solo mira si cada característica supera cada uno de sus bordes, así que dos
+    filas cuyos valores caen entre los mismos bordes en todas las características reciben exactamente
+    la misma probabilidad. La clave de una fila es ese vector de intervalos (``intervalos``), y las
+    probabilidades se guardan en un LRU de ``capacidad`` entradas. En cada lote solo se evalúan
+    con el modelo los intervalos distintos que no estaban en la caché.
+    """
+
+    def __init__(self, modelo, capacidad: int = CAPACIDAD):
+        if capacidad < 1:
+            raise ValueError("capacidad debe ser al menos 1.")
+        self.modelo = modelo
+        self.capacidad = capacidad
+        arboles = modelo if isinstance(modelo, PuntuadorArboles) else PuntuadorArboles(exportar_arboles(modelo))
+        self._arboles = arboles
+        self.feature_names_: List[str] = arboles.feature_names_
+        self.tree_count_ = arboles.tree_count_
+        # Todos los bordes en un vector, con la columna de cada uno y dónde empieza cada característica:
+        # el intervalo de un valor es cuántos de sus bordes supera, y se suma con un solo reduceat.
+        bordes = arboles.bordes_por_caracteristica()
+        self._con_bordes = np.flatnonzero([len(b) > 0 for b in bordes])
+        self._bordes = np.concatenate([b for b in bordes if len(b)]).astype(np.float32)
+        self._columna_borde = np.concatenate([np.full(len(b), j, dtype=np.intp) for j, b in enumerate(bordes) if len(b)])
+        self._inicios = np.cumsum([0] + [len(b) for b in bordes if len(b)])[:-1]
+        self._entradas: "OrderedDict[bytes, float]" = OrderedDict()
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+
+    def intervalos(self, X) -> np.ndarray:
+        """Índice del intervalo de bordes de cada valor (filas × características): bordes que el valor supera.
+
+        Un NaN no supera ninguno, salvo con el tratamiento 'Max', que ``matriz`` ya convierte en +inf.
+        """
+        X = self._arboles.matriz(X)
+        claves = np.zeros(X.shape, dtype=np.uint16)
+        supera = (X[:, self._columna_borde] > self._bordes).view(np.uint8)
+        claves[:, self._con_bordes] = np.add.reduceat(supera, self._inicios, axis=1, dtype=np.uint16)
+        return claves
+
+    def _subconjunto(self, X, filas: np.ndarray):
+        if hasattr(X, "iloc"):
+            return X.iloc[filas]
+        return np.atleast_2d(np.asarray(X))[filas]
+
+    def predict_proba(self, X, thread_count: Optional[int] = None) -> np.ndarray:
+        claves = self.intervalos(X)
+        unicas, primera, inversa = np.unique(
+            np.ascontiguousarray(claves).view(np.dtype((np.void, claves.dtype.itemsize * claves.shape[1]))).ravel(),
+            return_index=True, return_inverse=True,
+        )
+        probabilidades = np.empty(len(unicas), dtype=np.float64)
+        pendientes = []
+        for i, clave in enumerate(unicas):
+            clave = clave.tobytes()
+            valor = self._entradas.get(clave)
+            if valor is None:
+                pendientes.append(i)
+            else:
+                self._entradas.move_to_end(clave)
+                probabilidades[i] = valor
+        # Las filas repetidas de un intervalo nuevo dentro del mismo lote cuentan como aciertos.
+        self.fallos += len(pendientes)
+        self.aciertos += len(claves) - len(pendientes)
+
+        if pendientes:
+            pendientes = np.asarray(pendientes)
+            # Una fila cualquiera de cada intervalo nuevo: todas dan la misma probabilidad.
+            opciones = {} if thread_count is None else {"thread_count": thread_count}
+            nuevas = self.modelo.predict_proba(self._subconjunto(X, primera[pendientes]), **opciones)[:, 1]
+            probabilidades[pendientes] = nuevas
+            for i, p in zip(pendientes, nuevas):
+                self._entradas[unicas[i].tobytes()] = float(p)
+            while len(self._entradas) > self.capacidad:
+                self._entradas.popitem(last=False)
+                self.expulsiones += 1
+
+        p = probabilidades[inversa.ravel()]
+        return np.column_stack([1.0 - p, p])
+
+    def estadisticas(self) -> Dict[str, Any]:
+        consultas = self.aciertos + self.fallos
+        return {
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "tasa_aciertos": self.aciertos / consultas if consultas else 0.0,
+            "entradas": len(self._entradas),
+            "capacidad": self.capacidad,
+            "expulsiones": self.expulsiones,
+        }
+
+    def vaciar(self):
+        self._entradas.clear()
@@ -0,0 +1,189 @@
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from comun.esquema import TIPOS_COLUMNAS
+
+VERSION_FORMATO = 1
+ARCHIVO_META = "meta.json"
+
+Ruta = Union[str, Path]
+
+
+def huella_archivo(ruta: Ruta) -> Optional[Dict[str, int]]:
+    """Tamaño y fecha de modificación de un archivo, o None si no existe."""
+    try:
+        estado = os.stat(ruta)
+    except FileNotFoundError:
+        return None
+    return {"tamano": estado.st_size, "mtime_ns": estado.st_mtime_ns}
+
+
+class EscritorColumnar:
+    """Escribe un DataFrame por bloques como un archivo binario crudo por columna más un ``meta.json``.
+
+    Los archivos ``<columna>.bin`` contienen los valores contiguos en el tipo declarado, por lo que
+    pueden abrirse con ``np.memmap`` sin copiar ni volver a parsear texto.
+    """
+
+    def __init__(self, carpeta: Ruta, tipos: Dict[str, str] = TIPOS_COLUMNAS):
+        self.carpeta = Path(carpeta)
+        self.tipos = tipos
+        self.columnas: List[str] = []
+        self.n_filas = 0
+        self._archivos = {}
+        self._mapas: Dict[str, np.ndarray] = {}
+        if self.carpeta.exists():
+            shutil.rmtree(self.carpeta)
+        self.carpeta.mkdir(parents=True)
+
+    def _convertir(self, serie: pd.Series) -> np.ndarray:
+        tipo = np.dtype(self.tipos.get(serie.name, "float64"))
+        valores = serie.to_numpy()
+        if tipo.kind in "iu":
+            if serie.isna().any():
+                raise ValueError(f"La columna '{serie.name}' tiene valores nulos y no puede guardarse como {tipo}.")
+            convertidos = valores.astype(tipo)
+            if not np.array_equal(convertidos, valores):
+                raise ValueError(f"La columna '{serie.name}' tiene valores que no caben en {tipo}.")
+            return convertidos
+        return valores.astype(tipo)
+
+    def agregar(self, bloque: pd.DataFrame):
+        if not self._archivos:
+            self.columnas = list(bloque.columns)
+            self._archivos = {col: open(self.carpeta / f"{col}.bin", "wb") for col in self.columnas}
+        for col in self.columnas:
+            self._archivos[col].write(np.ascontiguousarray(self._convertir(bloque[col])).tobytes())
+        self.n_filas += len(bloque)
+
+    def reservar(self, columnas: List[str], n_filas: int):
+        """Crea las columnas con ``n_filas`` filas de antemano, para rellenarlas en cualquier orden con ``escribir_en``."""
+        self.columnas = list(columnas)
+        self.n_filas = n_filas
+        for col in self.columnas:
+            tipo = np.dtype(self.tipos.get(col, "float64"))
+            ruta = self.carpeta / f"{col}.bin"
+            with open(ruta, "wb") as f:
+                f.truncate(n_filas * tipo.itemsize)
+            self._mapas[col] = np.memmap(ruta, dtype=tipo, mode="r+", shape=(n_filas,)) if n_filas else np.empty(0, dtype=tipo)
+
+    def escribir_en(self, bloque: pd.DataFrame, posiciones: np.ndarray):
+        """Escribe las filas de ``bloque`` en las ``posiciones`` indicadas de las columnas reservadas."""
+        for col in self.columnas:
+            self._mapas[col][posiciones] = self._convertir(bloque[col])
+
+    def concatenar(self, otro: "EscritorColumnar"):
+        """Añade al final las filas ya escritas por ``otro`` (mismas columnas) y lo descarta."""
+        for col in otro.columnas:
+            otro._archivos[col].close()
+            with open(otro.carpeta / f"{col}.bin", "rb") as origen:
+                shutil.copyfileobj(origen, self._archivos[col])
+        self.n_filas += otro.n_filas
+        otro._archivos = {}
+        otro.descartar()
+
+    def cerrar(self, fuente: Optional[Ruta] = None, extra: Optional[Dict[str, Any]] = None):
+        """Cierra los archivos y escribe ``meta.json``.
+
+        ``fuente`` es el CSV equivalente, si existe, cuya huella se usa para validar la frescura. Sin
+        fuente, la caché es el propio artefacto principal.
+        """
+        for archivo in self._archivos.values():
+            archivo.close()
+        for mapa in self._mapas.values():
+            if isinstance(mapa, np.memmap):
+                mapa.flush()
+        self._mapas = {}
+        meta = {
+            "version": VERSION_FORMATO,
+            "n_filas": self.n_filas,
+            "columnas": self.columnas,
+            "tipos": {col: np.dtype(self.tipos.get(col, "float64")).str for col in self.columnas},
+            "fuente": huella_archivo(fuente) if fuente else None,
+        }
+        meta.update(extra or {})
+        with open(self.carpeta / ARCHIVO_META, "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+
+    def descartar(self):
+        for archivo in self._archivos.values():
+            archivo.close()
+        self._mapas = {}
+        shutil.rmtree(self.carpeta, ignore_errors=True)
+
+
+def cache_vigente(carpeta: Ruta, fuente: Optional[Ruta] = None) -> bool:
+    """Indica si la caché existe y corresponde al CSV ``fuente`` tal como está ahora en disco."""
+    ruta_meta = Path(carpeta) / ARCHIVO_META
+    if not ruta_meta.exists():
+        return False
+    with open(ruta_meta, encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get("version") != VERSION_FORMATO:
+        return False
+    if fuente is not None and meta.get("fuente") is not None:
+        actual = huella_archivo(fuente)
+        if actual is not None and actual != meta["fuente"]:
+            return False
+    return True
+
+
+def cargar_columnas(carpeta: Ruta) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    """Devuelve el ``meta.json`` y cada columna abierta con ``np.memmap`` en solo lectura."""
+    carpeta = Path(carpeta)
+    with open(carpeta / ARCHIVO_META, encoding="utf-8") as f:
+        meta = json.load(f)
+    columnas = {}
+    for col in meta["columnas"]:
+        tipo = np.dtype(meta["tipos"][col])
+        if meta["n_filas"] == 0:
+            columnas[col] = np.empty(0, dtype=tipo)
+        else:
+            columnas[col] = np.memmap(carpeta / f"{col}.bin", dtype=tipo, mode="r", shape=(meta["n_filas"],))
+    return meta, columnas
+
+
+def cargar_columnar(carpeta: Ruta) -> pd.DataFrame:
+    """Abre la caché con ``np.memmap`` (solo lectura) y la expone como DataFrame con tipos compactos."""
+    _, columnas = cargar_columnas(carpeta)
+    return pd.DataFrame(columnas, copy=False)
+
+
+def materializar(columnas: Dict[str, np.ndarray], indices: np.ndarray) -> pd.DataFrame:
+    """Construye el DataFrame de un subconjunto de filas.
+
+    Si los índices forman un rango contiguo, cada columna es una vista del memmap (sin copia); en
+    otro caso se copian solo las filas seleccionadas.
+    """
+    if len(indices) and indices[-1] - indices[0] + 1 == len(indices) and np.all(np.diff(indices) == 1):
+        seleccion = slice(int(indices[0]), int(indices[-1]) + 1)
+        return pd.DataFrame({col: valores[seleccion] for col, valores in columnas.items()}, copy=False)
+    return pd.DataFrame({col: valores[indices] for col, valores in columnas.items()}, copy=False)
+
+
+def guardar_particion(ruta: Ruta, n_filas: int, train: np.ndarray, test: np.ndarray, pliegues: Optional[np.ndarray] = None):
+    """Guarda los índices de una partición; ``pliegues`` asigna un pliegue a cada índice de ``train``."""
+    Path(ruta).parent.mkdir(parents=True, exist_ok=True)
+    arrays = {"n_filas": np.array(n_filas, dtype=np.int64), "train": train.astype(np.uint32), "test": test.astype(np.uint32)}
+    if pliegues is not None:
+        arrays["pliegues"] = pliegues.astype(np.uint8)
+    with open(ruta, "wb") as f:
+        np.savez(f, **arrays)
+
+
+def cargar_particion(ruta: Ruta) -> Dict[str, np.ndarray]:
+    with np.load(ruta) as datos:
+        return {clave: datos[clave] for clave in datos.files}
+
+
+def indices_pliegue(particion: Dict[str, np.ndarray], pliegue: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Índices de entrenamiento y validación del pliegue indicado dentro de ``train``."""
+    if "pliegues" not in particion:
+        raise ValueError("La partición no contiene pliegues; regenérela con k_pliegues > 0.")
+    en_pliegue = particion["pliegues"] == pliegue
+    return particion["train"][~en_pliegue], particion["train"][en_pliegue]
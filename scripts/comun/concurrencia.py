@@ -0,0 +1,123 @@
+import os
+import math
+from pathlib import Path
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+# Fija el número de núcleos disponibles e ignora cgroups y afinidad (p. ej. DIABETES_NUCLEOS=4).
+VARIABLE_ENTORNO = "DIABETES_NUCLEOS"
+
+RAIZ_CGROUP = Path("/sys/fs/cgroup")
+
+# Hilos de CatBoost por ajuste en las búsquedas: por encima escala peor con este tamaño de datos.
+MAX_HILOS_POR_AJUSTE = 4
+
+
+def _rutas_cgroup() -> List[Tuple[str, str]]:
+    """Pares (controladores, ruta) de ``/proc/self/cgroup``; en v2 los controladores son ''."""
+    try:
+        with open("/proc/self/cgroup", encoding="ascii") as f:
+            lineas = f.read().splitlines()
+    except OSError:
+        return []
+    pares = []
+    for linea in lineas:
+        partes = linea.split(":", 2)
+        if len(partes) == 3:
+            pares.append((partes[1], partes[2]))
+    return pares
+
+
+def _ascendentes(base: Path, ruta: str) -> List[Path]:
+    """Carpeta del cgroup y sus ancestros hasta ``base`` (los límites de un padre también aplican)."""
+    carpetas = []
+    actual = Path(ruta.lstrip("/"))
+    while True:
+        carpetas.append(base / actual)
+        if actual == actual.parent:
+            return carpetas
+        actual = actual.parent
+
+
+def _leer(ruta: Path) -> Optional[str]:
+    try:
+        return ruta.read_text(encoding="ascii").strip()
+    except OSError:
+        return None
+
+
+def cuota_cgroup() -> Optional[float]:
+    """Núcleos que permite la cuota de CPU del cgroup (v2 ``cpu.max`` o v1 ``cfs_quota_us``), o None sin límite."""
+    cuotas = []
+    for controladores, ruta in _rutas_cgroup():
+        if controladores == "":
+            for carpeta in _ascendentes(RAIZ_CGROUP, ruta):
+                valor = _leer(carpeta / "cpu.max")
+                if valor and not valor.startswith("max"):
+                    cuota, periodo = valor.split()[:2]
+                    cuotas.append(int(cuota) / int(periodo))
+        elif "cpu" in controladores.split(","):
+            for montaje in (RAIZ_CGROUP / "cpu", RAIZ_CGROUP / "cpu,cpuacct", RAIZ_CGROUP / "cpuacct,cpu"):
+                for carpeta in _ascendentes(montaje, ruta):
+                    cuota, periodo = _leer(carpeta / "cpu.cfs_quota_us"), _leer(carpeta / "cpu.cfs_period_us")
+                    if cuota and periodo and int(cuota) > 0 and int(periodo) > 0:
+                        cuotas.append(int(cuota) / int(periodo))
+    return min(cuotas) if cuotas else None
+
+
+def nucleos_afinidad() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+@lru_cache(maxsize=None)
+def _nucleos_sistema() -> int:
+    nucleos = nucleos_afinidad()
+    cuota = cuota_cgroup()
+    if cuota is not None:
+        nucleos = min(nucleos, max(1, math.ceil(cuota)))
+    return max(1, nucleos)
+
+
+def nucleos_disponibles() -> int:
+    """Presupuesto de núcleos del proceso: la variable ``DIABETES_NUCLEOS`` si está definida y, si no,
+    el mínimo entre la máscara de afinidad y la cuota de CPU del cgroup (redondeada hacia arriba).
+    """
+    valor = os.environ.get(VARIABLE_ENTORNO)
+    if valor:
+        try:
+            return max(1, int(valor))
+        except ValueError:
+            raise ValueError(f"{VARIABLE_ENTORNO} debe ser un entero positivo, no {valor!r}.") from None
+    return _nucleos_sistema()
+
+
+def hilos_por_defecto() -> int:
+    """Hilos para un cálculo dentro del proceso: deja un núcleo libre si hay más de uno."""
+    return max(1, nucleos_disponibles() - 1)
+
+
+def repartir_nucleos(pendientes: int, procesos: Optional[int] = None, hilos: Optional[int] = None,
+                     max_hilos: int = MAX_HILOS_POR_AJUSTE) -> Tuple[int, int]:
+    """Divide el presupuesto entre procesos simultáneos y los hilos de cada uno.
+
+    Por defecto cada proceso usa hasta ``max_hilos`` hilos y se lanzan tantos procesos como
+    quepan, sin superar las tareas pendientes.
+    """
+    nucleos = nucleos_disponibles()
+    if hilos is None:
+        hilos = max(1, min(max_hilos, nucleos // max(1, procesos or 1)))
+    if procesos is None:
+        procesos = max(1, nucleos // hilos)
+    return max(1, min(procesos, pendientes)), hilos
+
+
+def limitar_nucleos(nucleos: int):
+    """Fija el presupuesto de este proceso (y de los que lance) a ``nucleos``.
+
+    Se llama al iniciar cada trabajador de un pool, para que lo que dimensione sus propios hilos
+    dentro de él use su parte del presupuesto y no el total de la máquina.
+    """
+    os.environ[VARIABLE_ENTORNO] = str(max(1, nucleos))
@@ -0,0 +1,223 @@
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+from typing import Dict, List, Sequence
+
+COLUMNA_OBJETIVO = "estado_diabetes"
+
+# Número de repeticiones de cada fila única cuando el conjunto de entrenamiento se colapsa.
+COLUMNA_CONTEO = "conteo"
+
+# Tipo con el que se parsean las columnas de entrada antes de validar su rango y compactarlas.
+TIPO_LECTURA = "float32"
+
+
+@dataclass(frozen=True)
+class ColumnaEsquema:
+    origen: str
+    destino: str
+    tipo: str
+    minimo: float
+    maximo: float
+    en_modelo: bool = False
+
+
+# Esquema del dataset BRFSS: nombre original, nombre en español, tipo compacto y rango permitido.
+ESQUEMA = (
+    ColumnaEsquema("Diabetes_012", "estado_diabetes", "uint8", 0, 2, en_modelo=True),
+    ColumnaEsquema("HighBP", "hipertension", "uint8", 0, 1),
+    ColumnaEsquema("HighChol", "colesterol_alto", "uint8", 0, 1),
+    ColumnaEsquema("CholCheck", "chequeo_colesterol_reciente", "uint8", 0, 1),
+    ColumnaEsquema("BMI", "imc", "float32", 12, 98, en_modelo=True),
+    ColumnaEsquema("Smoker", "fumador_historico", "uint8", 0, 1, en_modelo=True),
+    ColumnaEsquema("Stroke", "derrame_cerebral_previo", "uint8", 0, 1),
+    ColumnaEsquema("HeartDiseaseorAttack", "enfermedad_cardiaca_o_infarto", "uint8", 0, 1),
+    ColumnaEsquema("PhysActivity", "actividad_fisica_reciente", "uint8", 0, 1, en_modelo=True),
+    ColumnaEsquema("Fruits", "consumo_frutas", "uint8", 0, 1, en_modelo=True),
+    ColumnaEsquema("Veggies", "consumo_verduras", "uint8", 0, 1, en_modelo=True),
+    ColumnaEsquema("HvyAlcoholConsump", "consumo_alcohol_elevado", "uint8", 0, 1, en_modelo=True),
+    ColumnaEsquema("AnyHealthcare", "tiene_atencion_medica", "uint8", 0, 1),
+    ColumnaEsquema("NoDocbcCost", "no_fue_medico_por_costo", "uint8", 0, 1),
+    ColumnaEsquema("GenHlth", "salud_general", "uint8", 1, 5, en_modelo=True),
+    ColumnaEsquema("MentHlth", "dias_mala_salud_mental", "uint8", 0, 30, en_modelo=True),
+    ColumnaEsquema("PhysHlth", "dias_mala_salud_fisica", "uint8", 0, 30, en_modelo=True),
+    ColumnaEsquema("DiffWalk", "dificultad_caminar", "uint8", 0, 1, en_modelo=True),
+    ColumnaEsquema("Sex", "sexo", "uint8", 0, 1, en_modelo=True),
+    ColumnaEsquema("Age", "rango_edad", "uint8", 1, 13, en_modelo=True),
+    ColumnaEsquema("Education", "nivel_educativo", "uint8", 1, 6),
+    ColumnaEsquema("Income", "rango_ingresos", "uint8", 1, 8),
+)
+
+MAPEO_COLUMNAS: Dict[str, str] = {c.origen: c.destino for c in ESQUEMA}
+
+COLUMNAS_MODELO: List[str] = [
+    "estado_diabetes",
+    "imc",
+    "rango_edad",
+    "sexo",
+    "actividad_fisica_reciente",
+    "consumo_frutas",
+    "consumo_verduras",
+    "fumador_historico",
+    "consumo_alcohol_elevado",
+    "salud_general",
+    "dias_mala_salud_fisica",
+    "dias_mala_salud_mental",
+    "dificultad_caminar",
+]
+
+CARACTERISTICAS: List[str] = [c for c in COLUMNAS_MODELO if c != COLUMNA_OBJETIVO]
+
+POR_DESTINO: Dict[str, ColumnaEsquema] = {c.destino: c for c in ESQUEMA}
+
+TIPOS_COLUMNAS: Dict[str, str] = {c: POR_DESTINO[c].tipo for c in COLUMNAS_MODELO}
+TIPOS_COLUMNAS[COLUMNA_CONTEO] = "uint32"
+
+
+@dataclass(frozen=True)
+class ReglaValidacion:
+    columna: str
+    motivo: str
+
+    @property
+    def codigo(self) -> str:
+        return f"{self.columna}:{self.motivo}"
+
+
+def reglas_validacion(columnas: Sequence[str] = COLUMNAS_MODELO) -> List[ReglaValidacion]:
+    """Reglas a comprobar por columna: nulos, rango declarado y, en columnas enteras, valores no enteros."""
+    reglas = []
+    for col in columnas:
+        reglas += [ReglaValidacion(col, "nulo"), ReglaValidacion(col, "fuera_de_rango")]
+        if np.dtype(POR_DESTINO[col].tipo).kind in "iu":
+            reglas.append(ReglaValidacion(col, "no_entero"))
+    return reglas
+
+
+def validar_filas(df: pd.DataFrame, reglas: Sequence[ReglaValidacion]) -> np.ndarray:
+    """Devuelve, por fila, una máscara de bits con las reglas incumplidas (0 = fila válida).
+
+    Una primera pasada vectorizada en el tipo nativo de cada columna marca las filas
+    sospechosas; la máscara detallada solo se construye para esas filas.
+    """
+    if len(reglas) > 64:
+        raise ValueError("validar_filas admite como máximo 64 reglas.")
+    mascaras = np.zeros(len(df), dtype=np.uint64)
+    validas = np.ones(len(df), dtype=bool)
+    for col in dict.fromkeys(r.columna for r in reglas):
+        columna = POR_DESTINO[col]
+        valores = df[col].to_numpy()
+        if valores.dtype.kind not in "fiu":
+            valores = df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+        # NaN no cumple ninguna comparación, así que también queda marcado aquí.
+        validas &= (valores >= columna.minimo) & (valores <= columna.maximo)
+        if valores.dtype.kind == "f" and np.dtype(columna.tipo).kind in "iu":
+            validas &= np.rint(valores) == valores
+    
+    sospechosas = np.flatnonzero(~validas)
+    if len(sospechosas) == 0:
+        return mascaras
+    detalle = df.iloc[sospechosas]
+    valores_por_columna = {}
+    for bit, regla in enumerate(reglas):
+        if regla.columna not in valores_por_columna:
+            valores_por_columna[regla.columna] = detalle[regla.columna].to_numpy(dtype=np.float64, na_value=np.nan)
+        valores = valores_por_columna[regla.columna]
+        columna = POR_DESTINO[regla.columna]
+        if regla.motivo == "nulo":
+            falla = np.isnan(valores)
+        elif regla.motivo == "fuera_de_rango":
+            falla = (valores < columna.minimo) | (valores > columna.maximo)
+        else:
+            falla = np.isfinite(valores) & (valores != np.floor(valores))
+        mascaras[sospechosas] |= falla.astype(np.uint64) << np.uint64(bit)
+    return mascaras
+
+
+def describir_motivos(mascaras: np.ndarray, reglas: Sequence[ReglaValidacion]) -> np.ndarray:
+    """Convierte cada máscara en los códigos de motivo separados por ';' (una vez por máscara distinta)."""
+    unicas, inversa = np.unique(mascaras, return_inverse=True)
+    textos = np.array([
+        ";".join(r.codigo for bit, r in enumerate(reglas) if int(m) >> bit & 1) for m in unicas
+    ], dtype=object)
+    return textos[inversa]
+
+
+def contar_motivos(mascaras: np.ndarray, reglas: Sequence[ReglaValidacion]) -> Dict[str, int]:
+    """Número de filas que incumplen cada regla, calculado sobre las máscaras distintas."""
+    unicas, conteos = np.unique(mascaras[mascaras != 0], return_counts=True)
+    resultado = {r.codigo: 0 for r in reglas}
+    for mascara, conteo in zip(unicas, conteos):
+        for bit, regla in enumerate(reglas):
+            if int(mascara) >> bit & 1:
+                resultado[regla.codigo] += int(conteo)
+    return resultado
+
+
+def columnas_lectura() -> List[str]:
+    """Columnas del archivo original que hay que leer para construir el dataset del modelo."""
+    return [POR_DESTINO[c].origen for c in COLUMNAS_MODELO]
+
+
+def tipos_lectura() -> Dict[str, str]:
+    """Tipos de parseo por columna original; la etiqueta se deja sin declarar para poder coercionarla."""
+    return {POR_DESTINO[c].origen: TIPO_LECTURA for c in CARACTERISTICAS}
+
+
+def motor_lectura() -> str:
+    """Usa el lector multihilo de pyarrow si está instalado; si no, el lector C de pandas."""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return "c"
+    return "pyarrow"
+
+
+def aplicar_tipos(df: pd.DataFrame) -> pd.DataFrame:
+    """Convierte cada columna conocida a su tipo compacto cuando sus valores lo permiten.
+
+    Las columnas enteras con nulos o valores no representables se dejan en ``TIPO_LECTURA``.
+    """
+    convertidas = {}
+    for col in df.columns:
+        if col not in POR_DESTINO:
+            convertidas[col] = df[col]
+            continue
+        tipo = np.dtype(POR_DESTINO[col].tipo)
+        valores = df[col].to_numpy()
+        if tipo.kind in "iu":
+            info = np.iinfo(tipo)
+            representable = (
+                not np.isnan(valores).any()
+                and np.array_equal(valores, np.round(valores))
+                and (len(valores) == 0 or (valores.min() >= info.min and valores.max() <= info.max))
+            ) if valores.dtype.kind == "f" else True
+            convertidas[col] = valores.astype(tipo) if representable else valores.astype(TIPO_LECTURA)
+        else:
+            convertidas[col] = valores.astype(tipo)
+    return pd.DataFrame(convertidas, index=df.index)
+
+
+def leer_csv_modelo(ruta) -> pd.DataFrame:
+    """Lee un CSV ya preprocesado (columnas en español) con los tipos compactos del esquema."""
+    df = pd.read_csv(ruta, dtype={c: TIPO_LECTURA for c in COLUMNAS_MODELO}, engine=motor_lectura())
+    return aplicar_tipos(df)
+
+
+def descripcion_columnas(columnas: Sequence[str]) -> str:
+    """Contenido del archivo ``.cd`` de CatBoost para un CSV con estas columnas, en este orden.
+
+    La variable objetivo es ``Label``, el conteo de filas colapsadas es ``Weight``, las
+    características del modelo son ``Num`` y cualquier otra columna queda como ``Auxiliary``.
+    """
+    lineas = []
+    for i, col in enumerate(columnas):
+        if col == COLUMNA_OBJETIVO:
+            lineas.append(f"{i}\tLabel")
+        elif col == COLUMNA_CONTEO:
+            lineas.append(f"{i}\tWeight")
+        elif col in CARACTERISTICAS:
+            lineas.append(f"{i}\tNum\t{col}")
+        else:
+            lineas.append(f"{i}\tAuxiliary\t{col}")
+    return "\n".join(lineas) + "\n"
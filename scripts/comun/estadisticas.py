@@ -0,0 +1,172 @@
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, Optional, Tuple
+
+# Valores distintos que se conservan como frecuencias exactas antes de pasar al histograma.
+LIMITE_FRECUENCIAS = 10_000
+
+# Celdas del histograma de respaldo sobre el rango declarado de la columna.
+N_CELDAS = 1024
+
+
+class EstadisticasColumna:
+    """Estadísticas de una columna acumuladas en una sola pasada y combinables entre bloques o procesos.
+
+    Conteo, nulos, media y varianza (combinación de Chan), mínimo y máximo son exactos.
+    Las frecuencias por valor se conservan mientras haya como mucho ``limite_frecuencias``
+    valores distintos; a partir de ahí los cuantiles se aproximan con un histograma de
+    ``n_celdas`` celdas sobre ``[minimo_rango, maximo_rango]``, que se mantiene siempre.
+    """
+
+    def __init__(self, minimo_rango: float, maximo_rango: float,
+                 limite_frecuencias: int = LIMITE_FRECUENCIAS, n_celdas: int = N_CELDAS):
+        self.minimo_rango = float(minimo_rango)
+        self.maximo_rango = float(maximo_rango)
+        self.limite_frecuencias = limite_frecuencias
+        self.n = 0
+        self.nulos = 0
+        self.media = 0.0
+        self.m2 = 0.0
+        self.minimo = np.nan
+        self.maximo = np.nan
+        self.frecuencias: Optional[pd.Series] = pd.Series(dtype="int64")
+        self.histograma = np.zeros(n_celdas, dtype=np.int64)
+
+    @property
+    def bordes(self) -> np.ndarray:
+        return np.linspace(self.minimo_rango, self.maximo_rango, len(self.histograma) + 1)
+
+    def _celdas(self, valores: np.ndarray) -> np.ndarray:
+        ancho = (self.maximo_rango - self.minimo_rango) / len(self.histograma)
+        if ancho <= 0:
+            return np.zeros(len(valores), dtype=np.int64)
+        celdas = np.floor((valores - self.minimo_rango) / ancho).astype(np.int64)
+        return np.clip(celdas, 0, len(self.histograma) - 1)
+
+    def actualizar(self, serie: pd.Series):
+        """Incorpora un bloque: un único ``value_counts`` alimenta todos los acumuladores."""
+        conteo = serie.value_counts(sort=False)
+        parcial = type(self)(self.minimo_rango, self.maximo_rango, self.limite_frecuencias, len(self.histograma))
+        valores = conteo.index.to_numpy(dtype=np.float64)
+        pesos = conteo.to_numpy(dtype=np.int64)
+        parcial.n = int(pesos.sum())
+        parcial.nulos = len(serie) - parcial.n
+        if parcial.n:
+            parcial.media = float((valores * pesos).sum() / parcial.n)
+            parcial.m2 = float(((valores - parcial.media) ** 2 * pesos).sum())
+            parcial.minimo = float(valores.min())
+            parcial.maximo = float(valores.max())
+            np.add.at(parcial.histograma, parcial._celdas(valores), pesos)
+        parcial.frecuencias = conteo.astype("int64") if len(conteo) <= self.limite_frecuencias else None
+        self.combinar(parcial)
+
+    def combinar(self, otro: "EstadisticasColumna"):
+        """Suma en ``self`` las estadísticas de ``otro`` (mismo rango y número de celdas)."""
+        if len(otro.histograma) != len(self.histograma) or (otro.minimo_rango, otro.maximo_rango) != (self.minimo_rango, self.maximo_rango):
+            raise ValueError("Solo se pueden combinar estadísticas con el mismo rango y número de celdas.")
+        n = self.n + otro.n
+        if otro.n:
+            delta = otro.media - self.media
+            self.m2 += otro.m2 + delta ** 2 * self.n * otro.n / n
+            self.media += delta * otro.n / n
+            self.minimo = np.nanmin([self.minimo, otro.minimo])
+            self.maximo = np.nanmax([self.maximo, otro.maximo])
+        self.n = n
+        self.nulos += otro.nulos
+        self.histograma += otro.histograma
+        if self.frecuencias is not None and otro.frecuencias is not None:
+            self.frecuencias = self.frecuencias.add(otro.frecuencias, fill_value=0).astype("int64")
+            if len(self.frecuencias) > self.limite_frecuencias:
+                self.frecuencias = None
+        else:
+            self.frecuencias = None
+
+    @property
+    def exacta(self) -> bool:
+        return self.frecuencias is not None
+
+    def desviacion(self) -> float:
+        return float(np.sqrt(self.m2 / (self.n - 1))) if self.n > 1 else np.nan
+
+    def cuantil(self, q: float) -> float:
+        """Cuantil con interpolación lineal (como pandas); aproximado por celdas si no hay frecuencias."""
+        if self.n == 0:
+            return np.nan
+        if self.exacta:
+            frec = self.frecuencias.sort_index()
+            valores = frec.index.to_numpy(dtype=np.float64)
+            acumulado = np.cumsum(frec.to_numpy(dtype=np.int64))
+            h = (self.n - 1) * q
+            bajo = int(np.floor(h))
+            v_bajo = valores[np.searchsorted(acumulado, bajo, side="right")]
+            v_alto = valores[np.searchsorted(acumulado, min(bajo + 1, self.n - 1), side="right")]
+            return float(v_bajo + (h - bajo) * (v_alto - v_bajo))
+        acumulado = np.cumsum(self.histograma)
+        objetivo = q * self.n
+        celda = int(np.searchsorted(acumulado, objetivo, side="left"))
+        celda = min(celda, len(self.histograma) - 1)
+        previo = acumulado[celda - 1] if celda else 0
+        fraccion = (objetivo - previo) / self.histograma[celda] if self.histograma[celda] else 0.0
+        bordes = self.bordes
+        valor = bordes[celda] + fraccion * (bordes[celda + 1] - bordes[celda])
+        return float(np.clip(valor, self.minimo, self.maximo))
+
+    def describir(self) -> list:
+        """Fila equivalente a ``describe()``: count, mean, std, min, 25%, 50%, 75%, max."""
+        if self.n == 0:
+            return [0.0] + [np.nan] * 7
+        return [float(self.n), self.media, self.desviacion(), self.minimo,
+                self.cuantil(0.25), self.cuantil(0.5), self.cuantil(0.75), self.maximo]
+
+    def distribucion(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Valores y pesos para dibujar un histograma: exactos si hay frecuencias, centros de celda si no."""
+        if self.exacta:
+            frec = self.frecuencias.sort_index()
+            return frec.index.to_numpy(dtype=np.float64), frec.to_numpy(dtype=np.int64)
+        bordes = self.bordes
+        ocupadas = np.flatnonzero(self.histograma)
+        return (bordes[ocupadas] + bordes[ocupadas + 1]) / 2, self.histograma[ocupadas]
+
+    def a_dict(self) -> Dict[str, Any]:
+        ocupadas = np.flatnonzero(self.histograma)
+        return {
+            "rango": [self.minimo_rango, self.maximo_rango],
+            "limite_frecuencias": self.limite_frecuencias,
+            "n_celdas": len(self.histograma),
+            "n": self.n,
+            "nulos": self.nulos,
+            "media": self.media,
+            "m2": self.m2,
+            "minimo": None if np.isnan(self.minimo) else self.minimo,
+            "maximo": None if np.isnan(self.maximo) else self.maximo,
+            "histograma": [[int(i), int(self.histograma[i])] for i in ocupadas],
+            "frecuencias": None if self.frecuencias is None else [
+                [float(v), int(c)] for v, c in self.frecuencias.sort_index().items()
+            ],
+            # Los valores se guardan como float; el tipo permite recuperar el índice entero (etiquetas "0", no "0.0").
+            "tipo_frecuencias": None if self.frecuencias is None else str(self.frecuencias.index.dtype),
+        }
+
+    @classmethod
+    def desde_dict(cls, datos: Dict[str, Any]) -> "EstadisticasColumna":
+        est = cls(*datos["rango"], limite_frecuencias=datos["limite_frecuencias"], n_celdas=datos["n_celdas"])
+        est.n = datos["n"]
+        est.nulos = datos["nulos"]
+        est.media = datos["media"]
+        est.m2 = datos["m2"]
+        est.minimo = np.nan if datos["minimo"] is None else datos["minimo"]
+        est.maximo = np.nan if datos["maximo"] is None else datos["maximo"]
+        for i, c in datos["histograma"]:
+            est.histograma[i] = c
+        if datos["frecuencias"] is None:
+            est.frecuencias = None
+        else:
+            valores = np.array([v for v, _ in datos["frecuencias"]], dtype=np.float64)
+            tipo = datos.get("tipo_frecuencias")
+            if tipo is None and np.all(np.mod(valores, 1) == 0):
+                # Resúmenes guardados sin el tipo: los valores todos enteros vienen de columnas enteras.
+                tipo = "int64"
+            est.frecuencias = pd.Series(
+                [c for _, c in datos["frecuencias"]], index=valores.astype(tipo or np.float64), dtype="int64"
+            )
+        return est
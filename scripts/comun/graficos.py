@@ -0,0 +1,95 @@
+import numpy as np
+from dataclasses import dataclass
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from comun.concurrencia import nucleos_disponibles
+
+
+@dataclass(frozen=True)
+class PerfilGraficos:
+    nombre: str
+    dpi: int
+    max_puntos: int = 0  # 0 = series completas
+    anotaciones: bool = True
+
+
+PERFILES: Dict[str, PerfilGraficos] = {
+    "completo": PerfilGraficos("completo", dpi=300),
+    "rapido": PerfilGraficos("rapido", dpi=100, max_puntos=400, anotaciones=False),
+}
+
+
+def diezmar(n: int, max_puntos: int) -> np.ndarray:
+    """Índices equiespaciados (incluidos el primero y el último) para dibujar como mucho ``max_puntos``."""
+    if max_puntos <= 0 or n <= max_puntos:
+        return np.arange(n)
+    return np.unique(np.linspace(0, n - 1, max_puntos).round().astype(np.int64))
+
+
+def procesos_por_defecto() -> int:
+    """Deja un núcleo al proceso principal; con un solo núcleo se dibuja en línea (0 procesos)."""
+    return max(0, min(4, nucleos_disponibles() - 1))
+
+
+def _inicializar_trabajador():
+    import matplotlib
+    matplotlib.use("Agg")
+
+
+def _renderizar(funcion: Callable, perfil: PerfilGraficos, ruta: str, args, kwargs) -> str:
+    import matplotlib.pyplot as plt
+    try:
+        funcion(perfil, ruta, *args, **kwargs)
+    finally:
+        plt.close("all")
+    return ruta
+
+
+class ServicioGraficos:
+    """Renderiza figuras en un pool de procesos mientras el resto del pipeline sigue avanzando.
+
+    Cada trabajo es una función de módulo ``funcion(perfil, ruta, *args)`` que dibuja con
+    matplotlib y guarda en ``ruta``; sus argumentos deben ser serializables. Con
+    ``procesos=0`` (valor por defecto en máquinas de un núcleo) las figuras se dibujan en el
+    propio proceso, en el momento del envío.
+    """
+
+    def __init__(self, perfil: str = "completo", procesos: Optional[int] = None):
+        if perfil not in PERFILES:
+            raise ValueError(f"Perfil de gráficos desconocido: {perfil!r} (opciones: {', '.join(PERFILES)}).")
+        self.perfil = PERFILES[perfil]
+        self.procesos = procesos_por_defecto() if procesos is None else procesos
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pendientes: List[Future] = []
+
+    def enviar(self, funcion: Callable, ruta, *args, **kwargs) -> Future:
+        if self.procesos <= 0:
+            futuro = Future()
+            futuro.set_result(_renderizar(funcion, self.perfil, str(ruta), args, kwargs))
+        else:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.procesos, initializer=_inicializar_trabajador)
+            futuro = self._pool.submit(_renderizar, funcion, self.perfil, str(ruta), args, kwargs)
+        self._pendientes.append(futuro)
+        return futuro
+
+    def esperar(self) -> List[str]:
+        """Espera a todas las figuras enviadas y devuelve sus rutas; relanza el primer error."""
+        pendientes, self._pendientes = self._pendientes, []
+        return [futuro.result() for futuro in pendientes]
+
+    def cerrar(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def __enter__(self) -> "ServicioGraficos":
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        try:
+            if tipo is None:
+                self.esperar()
+        finally:
+            self.cerrar()
@@ -0,0 +1,194 @@
+import os
+import sys
+import json
+import time
+from pathlib import Path
+from datetime import datetime
+from contextlib import nullcontext
+from typing import Any, Dict, List, Optional, Union
+
+from comun.memoria import memoria_pico_mb, memoria_residente_mb
+from comun.perfil_rendimiento import huella_maquina
+
+Ruta = Union[str, Path]
+
+# Activa la instrumentación sin tocar la línea de órdenes (p. ej. DIABETES_INSTRUMENTACION=1 para la app).
+VARIABLE_ENTORNO = "DIABETES_INSTRUMENTACION"
+
+VERSION_TRAZA = 1
+
+# Contexto vacío compartido: con la instrumentación apagada, ``etapa`` no crea ningún objeto.
+_SIN_MEDIDA = nullcontext()
+
+
+def activada_por_entorno() -> bool:
+    return os.environ.get(VARIABLE_ENTORNO, "").strip().lower() not in ("", "0", "false", "no")
+
+
+def _reiniciar_pico() -> bool:
+    """Lleva VmHWM al RSS actual (``5`` en ``/proc/self/clear_refs``, Linux ≥ 4.0); False si no se puede."""
+    try:
+        with open("/proc/self/clear_refs", "w", encoding="ascii") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _tiempo_cpu() -> float:
+    """CPU de usuario y sistema del proceso y de los hijos ya terminados (p. ej. un pool de gráficos cerrado)."""
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+def _pico_hijos_mb() -> float:
+    try:
+        import resource
+    except ImportError:
+        return float("nan")
+    maximo = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return maximo / (1024 * 1024) if sys.platform == "darwin" else maximo / 1024
+
+
+class _Medida:
+    __slots__ = ("ruta", "nivel", "llamadas", "segundos", "cpu_segundos", "pico_rss_mb", "rss_final_mb")
+
+    def __init__(self, ruta: str, nivel: int):
+        self.ruta = ruta
+        self.nivel = nivel
+        self.llamadas = 0
+        self.segundos = 0.0
+        self.cpu_segundos = 0.0
+        self.pico_rss_mb = 0.0
+        self.rss_final_mb = float("nan")
+
+    def como_dict(self) -> Dict[str, Any]:
+        return {
+            "etapa": self.ruta.rsplit("/", 1)[-1], "ruta": self.ruta, "nivel": self.nivel, "llamadas": self.llamadas,
+            "segundos": round(self.segundos, 6), "cpu_segundos": round(self.cpu_segundos, 6),
+            "pico_rss_mb": round(self.pico_rss_mb, 1), "rss_final_mb": round(self.rss_final_mb, 1),
+        }
+
+
+class _Etapa:
+    __slots__ = ("instrumentacion", "nombre", "medida", "inicio", "inicio_cpu")
+
+    def __init__(self, instrumentacion: "Instrumentacion", nombre: str):
+        self.instrumentacion = instrumentacion
+        self.nombre = nombre
+
+    def __enter__(self):
+        self.medida = self.instrumentacion._abrir(self.nombre)
+        self.inicio_cpu = _tiempo_cpu()
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *excepcion):
+        segundos = time.perf_counter() - self.inicio
+        cpu = _tiempo_cpu() - self.inicio_cpu
+        self.instrumentacion._cerrar(self.medida, segundos, cpu)
+        return False
+
+
+class Instrumentacion:
+    """Tiempo de reloj, tiempo de CPU y pico de memoria residente por etapa con nombre.
+
+    Las etapas se anidan (``with inst.etapa("ajuste"):`` dentro de otra queda como ``entrenamiento/ajuste``)
+    y las que se repiten, como los bloques del preprocesamiento, se acumulan en una sola entrada. El pico
+    es el de cada etapa y no el del proceso: al abrir una etapa se reinicia VmHWM y el valor leído se
+    reparte entre todas las etapas abiertas. Sin ``clear_refs`` se anota el pico del proceso hasta el
+    cierre de la etapa. Apagada, ``etapa`` devuelve un contexto vacío compartido y no mide nada.
+    """
+
+    def __init__(self, programa: str, activa: Optional[bool] = None):
+        self.programa = programa
+        self.activa = activada_por_entorno() if activa is None else activa
+        self.medidas: Dict[str, _Medida] = {}
+        self.anotaciones: Dict[str, Any] = {}
+        self._abiertas: List[_Medida] = []
+        self.inicio = datetime.now()
+        self._inicio = time.perf_counter()
+        self._inicio_cpu = _tiempo_cpu()
+        self.pico_proceso_mb = memoria_pico_mb() if self.activa else float("nan")
+        self.pico_por_etapa = self.activa and _reiniciar_pico()
+
+    def etapa(self, nombre: str):
+        if not self.activa:
+            return _SIN_MEDIDA
+        return _Etapa(self, nombre)
+
+    def anotar(self, clave: str, valor: Any):
+        """Añade a la traza un dato que no es una etapa (p. ej. contadores de una caché)."""
+        if self.activa:
+            self.anotaciones[clave] = valor
+
+    def _repartir_pico(self):
+        pico = memoria_pico_mb()
+        self.pico_proceso_mb = max(self.pico_proceso_mb, pico)
+        for medida in self._abiertas:
+            medida.pico_rss_mb = max(medida.pico_rss_mb, pico)
+
+    def _abrir(self, nombre: str) -> _Medida:
+        ruta = f"{self._abiertas[-1].ruta}/{nombre}" if self._abiertas else nombre
+        medida = self.medidas.get(ruta)
+        if medida is None:
+            medida = self.medidas[ruta] = _Medida(ruta, len(self._abiertas))
+        if self.pico_por_etapa:
+            self._repartir_pico()
+            _reiniciar_pico()
+        self._abiertas.append(medida)
+        return medida
+
+    def _cerrar(self, medida: _Medida, segundos: float, cpu: float):
+        self._repartir_pico()
+        self._abiertas.remove(medida)
+        medida.llamadas += 1
+        medida.segundos += segundos
+        medida.cpu_segundos += cpu
+        medida.rss_final_mb = memoria_residente_mb()
+
+    def traza(self) -> Dict[str, Any]:
+        self._repartir_pico()
+        return {
+            "version": VERSION_TRAZA,
+            "programa": self.programa,
+            "inicio": self.inicio.isoformat(timespec="seconds"),
+            "pid": os.getpid(),
+            "maquina": huella_maquina(),
+            "pico_rss_por_etapa": self.pico_por_etapa,
+            "total": {
+                "segundos": round(time.perf_counter() - self._inicio, 6),
+                "cpu_segundos": round(_tiempo_cpu() - self._inicio_cpu, 6),
+                "pico_rss_mb": round(self.pico_proceso_mb, 1),
+                "pico_rss_hijos_mb": round(_pico_hijos_mb(), 1),
+            },
+            "etapas": [medida.como_dict() for medida in self.medidas.values()],
+            "anotaciones": self.anotaciones,
+        }
+
+    def guardar(self, ruta: Ruta, informar: bool = True) -> Optional[Path]:
+        """Escribe la traza JSON en ``ruta`` (sin efecto si está apagada) y, con ``informar``, la tabla por etapa."""
+        if not self.activa:
+            return None
+        traza = self.traza()
+        ruta = Path(ruta)
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        temporal = ruta.with_name(f"{ruta.name}.{os.getpid()}.tmp")
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(traza, f, indent=2)
+        os.replace(temporal, ruta)
+        if informar:
+            self.informar(traza)
+            print(f"    > Traza guardada en: {ruta}")
+        return ruta
+
+    def informar(self, traza: Optional[Dict[str, Any]] = None):
+        traza = traza or self.traza()
+        alcance = "por etapa" if traza["pico_rss_por_etapa"] else "del proceso"
+        print(f"\n[*] Tiempos por etapa (pico de memoria {alcance}):")
+        print(f"    {'Etapa':<32} | {'Llamadas':>8} | {'Reloj (s)':>10} | {'CPU (s)':>10} | {'Pico (MB)':>10}")
+        for e in traza["etapas"]:
+            nombre = "  " * e["nivel"] + e["etapa"]
+            print(f"    {nombre:<32} | {e['llamadas']:>8} | {e['segundos']:>10.3f} | {e['cpu_segundos']:>10.3f} | {e['pico_rss_mb']:>10,.0f}")
+        total = traza["total"]
+        print(f"    {'total':<32} | {'':>8} | {total['segundos']:>10.3f} | {total['cpu_segundos']:>10.3f} | {total['pico_rss_mb']:>10,.0f}")
@@ -0,0 +1,35 @@
+import sys
+from typing import Dict
+
+
+def _estado_proceso() -> Dict[str, float]:
+    """Campos ``Vm*`` de ``/proc/self/status`` en MB (vacío fuera de Linux)."""
+    campos = {}
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for linea in f:
+                if linea.startswith(("VmRSS:", "VmHWM:")):
+                    nombre, valor = linea.split(":", 1)
+                    campos[nombre] = int(valor.split()[0]) / 1024
+    except OSError:
+        pass
+    return campos
+
+
+def memoria_residente_mb() -> float:
+    """Memoria residente actual del proceso, en MB (NaN si no puede medirse)."""
+    return _estado_proceso().get("VmRSS", float("nan"))
+
+
+def memoria_pico_mb() -> float:
+    """Memoria residente máxima alcanzada por el proceso hasta ahora, en MB."""
+    pico = _estado_proceso().get("VmHWM")
+    if pico is not None:
+        return pico
+    try:
+        import resource
+    except ImportError:
+        return float("nan")
+    maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss está en KB en Linux y en bytes en macOS.
+    return maximo / (1024 * 1024) if sys.platform == "darwin" else maximo / 1024
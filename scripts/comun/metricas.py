@@ -0,0 +1,174 @@
+import numpy as np
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+# Elementos (réplicas × muestras) que se materializan a la vez en cada lote del bootstrap.
+ELEMENTOS_POR_LOTE = 4_000_000
+
+
+@dataclass
+class CurvaConfusion:
+    """Matriz de confusión en cada puntuación distinta, ordenadas de mayor a menor.
+
+    En la posición ``i`` se predice positivo toda muestra con puntuación ``>= umbrales[i]``;
+    ``vp`` y ``fp`` son acumulados (ponderados si se dieron pesos).
+    """
+    umbrales: np.ndarray
+    vp: np.ndarray
+    fp: np.ndarray
+    total_positivos: float
+    total_negativos: float
+
+    @property
+    def fn(self) -> np.ndarray:
+        return self.total_positivos - self.vp
+
+    @property
+    def vn(self) -> np.ndarray:
+        return self.total_negativos - self.fp
+
+    @property
+    def sensibilidad(self) -> np.ndarray:
+        return self.vp / self.total_positivos if self.total_positivos > 0 else np.zeros_like(self.vp)
+
+    @property
+    def especificidad(self) -> np.ndarray:
+        return self.vn / self.total_negativos if self.total_negativos > 0 else np.zeros_like(self.fp)
+
+    def puntos_roc(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Tasas (fpr, tpr) de la curva ROC, empezando en (0, 0)."""
+        fpr = np.r_[0.0, self.fp / self.total_negativos] if self.total_negativos > 0 else np.zeros(len(self.fp) + 1)
+        tpr = np.r_[0.0, self.sensibilidad]
+        return fpr, tpr
+
+    def auc(self) -> float:
+        fpr, tpr = self.puntos_roc()
+        return float(np.trapezoid(tpr, fpr))
+
+    def posicion(self, umbral: float) -> int:
+        """Índice del estado de la curva que corresponde a predecir positivo si ``puntuación >= umbral``.
+
+        Devuelve -1 si ninguna puntuación alcanza el umbral (todo negativo).
+        """
+        # umbrales está en orden descendente: se cuenta cuántas puntuaciones distintas son >= umbral.
+        return int(np.searchsorted(-self.umbrales, -umbral, side="right")) - 1
+
+    def en_umbral(self, umbral: float) -> Dict[str, float]:
+        i = self.posicion(umbral)
+        vp = self.vp[i] if i >= 0 else 0.0
+        fp = self.fp[i] if i >= 0 else 0.0
+        return {'vp': vp, 'fp': fp, 'fn': self.total_positivos - vp, 'vn': self.total_negativos - fp}
+
+
+def _agrupar(puntuaciones) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Orden descendente de las puntuaciones, sus valores distintos y el inicio de cada grupo de empates."""
+    p = np.asarray(puntuaciones, dtype=np.float64)
+    orden = np.argsort(-p, kind="mergesort")
+    p = p[orden]
+    inicios = np.r_[0, np.flatnonzero(np.diff(p)) + 1] if len(p) else np.array([], dtype=np.int64)
+    return orden, p[inicios], inicios
+
+
+def curva_confusion(y_verdadero, puntuaciones, pesos=None) -> CurvaConfusion:
+    """Calcula VP/FP/VN/FN en todas las puntuaciones distintas con una ordenación y sumas acumuladas."""
+    orden, umbrales, inicios = _agrupar(puntuaciones)
+    y = np.asarray(y_verdadero).astype(bool)[orden]
+    w = np.ones(len(y)) if pesos is None else np.asarray(pesos, dtype=np.float64)[orden]
+    if len(y) == 0:
+        return CurvaConfusion(umbrales, np.zeros(0), np.zeros(0), 0.0, 0.0)
+    vp = np.cumsum(np.add.reduceat(w * y, inicios))
+    fp = np.cumsum(np.add.reduceat(w * ~y, inicios))
+    return CurvaConfusion(
+        umbrales=umbrales,
+        vp=vp,
+        fp=fp,
+        total_positivos=float(vp[-1]),
+        total_negativos=float(fp[-1]),
+    )
+
+
+def buscar_umbral_optimo(curva: CurvaConfusion, peso_sensibilidad: float = 0.9,
+                         minimo: float = 0.001, maximo: float = 0.5) -> Optional[float]:
+    """Puntuación en ``[minimo, maximo]`` que maximiza ``peso·sensibilidad + (1-peso)·especificidad``.
+
+    Todos los umbrales entre dos puntuaciones consecutivas dan la misma matriz de confusión,
+    así que basta evaluar las puntuaciones distintas. Ante empates se elige el umbral más bajo.
+    """
+    candidatos = np.flatnonzero((curva.umbrales >= minimo) & (curva.umbrales <= maximo))
+    if len(candidatos) == 0:
+        return None
+    objetivo = peso_sensibilidad * curva.sensibilidad[candidatos] + (1 - peso_sensibilidad) * curva.especificidad[candidatos]
+    # Los candidatos van de mayor a menor umbral: el último máximo es el umbral más bajo.
+    mejor = len(objetivo) - 1 - int(np.argmax(objetivo[::-1]))
+    return float(curva.umbrales[candidatos[mejor]])
+
+
+# Función de distribución acumulada de Poisson(1) hasta k = 9; la cola restante (< 1e-7)
+# queda por debajo de la resolución de un uniforme float32.
+_CDF_POISSON_1 = np.cumsum([np.exp(-1.0) / np.prod(np.arange(1, k + 1)) for k in range(10)]).astype(np.float32)
+
+
+def _pesos_poisson(rng: np.random.Generator, lam, replicas: int, n: int) -> np.ndarray:
+    """Pesos de bootstrap de Poisson; con ``lam = 1`` se invierte la CDF sobre uniformes float32."""
+    if np.isscalar(lam) and lam == 1.0:
+        uniformes = rng.random((replicas, n), dtype=np.float32)
+        pesos = np.zeros((replicas, n), dtype=np.uint8)
+        for limite in _CDF_POISSON_1:
+            pesos += uniformes > limite
+        return pesos
+    return rng.poisson(lam, size=(replicas, n))
+
+
+def _metricas_replicas(y: np.ndarray, lam, inicios: np.ndarray, hasta: int,
+                       replicas: int, semilla: np.random.SeedSequence) -> Dict[str, np.ndarray]:
+    """Métricas de un lote de réplicas con pesos de Poisson, agregadas por grupo de puntuación."""
+    rng = np.random.default_rng(semilla)
+    pesos = _pesos_poisson(rng, lam, replicas, len(y))
+    tipo_suma = np.int64 if pesos.dtype == np.int64 else np.int32
+    positivos = np.add.reduceat(pesos * y, inicios, axis=1, dtype=tipo_suma).astype(np.float64)
+    negativos = np.add.reduceat(pesos, inicios, axis=1, dtype=tipo_suma) - positivos
+    total_p, total_n = positivos.sum(axis=1), negativos.sum(axis=1)
+    # AUC por rangos: cada negativo cuenta los positivos con puntuación mayor y la mitad de los empatados.
+    por_encima = np.cumsum(positivos, axis=1) - positivos / 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        roc_auc = (negativos * por_encima).sum(axis=1) / (total_p * total_n)
+        sensibilidad = positivos[:, :hasta].sum(axis=1) / total_p
+        especificidad = 1 - negativos[:, :hasta].sum(axis=1) / total_n
+    return {
+        'sensibilidad': sensibilidad,
+        'especificidad': especificidad,
+        'roc_auc': roc_auc,
+        'puntaje_balance': (sensibilidad + roc_auc) / 2,
+    }
+
+
+def bootstrap_metricas(y_verdadero, puntuaciones, umbral: float, pesos=None, replicas: int = 1000,
+                       nivel: float = 0.95, semilla: int = 42, hilos: int = 1) -> Dict[str, Tuple[float, float]]:
+    """Intervalos de confianza por percentiles con bootstrap de Poisson y umbral fijo.
+
+    Cada réplica pondera cada muestra con ``Poisson(peso)`` (``Poisson(1)`` sin pesos), lo que
+    equivale a remuestrear el conjunto expandido. Las réplicas se calculan por lotes vectorizados,
+    repartidos entre ``hilos``; el resultado solo depende de ``semilla``.
+    """
+    orden, umbrales, inicios = _agrupar(puntuaciones)
+    y = np.asarray(y_verdadero).astype(bool)[orden]
+    lam = 1.0 if pesos is None else np.asarray(pesos, dtype=np.float64)[orden]
+    # Grupos predichos como positivos: puntuación >= umbral.
+    hasta = int(np.searchsorted(-umbrales, -umbral, side="right"))
+
+    por_lote = max(1, min(replicas, ELEMENTOS_POR_LOTE // max(1, len(y))))
+    tamanos = [min(por_lote, replicas - i) for i in range(0, replicas, por_lote)]
+    semillas = np.random.SeedSequence(semilla).spawn(len(tamanos))
+    with ThreadPoolExecutor(max_workers=max(1, hilos)) as pool:
+        lotes = list(pool.map(
+            lambda args: _metricas_replicas(y, lam, inicios, hasta, *args), zip(tamanos, semillas)
+        ))
+
+    alfa = (1 - nivel) / 2
+    intervalos = {}
+    for nombre in lotes[0]:
+        valores = np.concatenate([lote[nombre] for lote in lotes])
+        bajo, alto = np.nanquantile(valores, [alfa, 1 - alfa])
+        intervalos[nombre] = (float(bajo), float(alto))
+    return intervalos
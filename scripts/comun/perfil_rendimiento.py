@@ -0,0 +1,56 @@
+import json
+import platform
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+from comun.concurrencia import nucleos_disponibles
+
+Ruta = Union[str, Path]
+
+VERSION_PERFIL = 1
+ARCHIVO_PERFIL = Path("resultados") / "perfil_rendimiento.json"
+
+
+def ruta_perfil(ruta_base: Ruta) -> Path:
+    return Path(ruta_base) / ARCHIVO_PERFIL
+
+
+def huella_maquina() -> Dict[str, Any]:
+    """Datos de la máquina con los que se midió un perfil; si cambian, el perfil deja de aplicarse."""
+    return {"nucleos": nucleos_disponibles(), "procesador": platform.processor() or platform.machine()}
+
+
+def cargar_perfil(ruta_base: Ruta) -> Optional[Dict[str, Any]]:
+    """Perfil de ``autoajuste_rendimiento.py`` si existe y se midió con el mismo presupuesto de núcleos."""
+    ruta = ruta_perfil(ruta_base)
+    try:
+        with open(ruta, encoding="utf-8") as f:
+            perfil = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if perfil.get("version") != VERSION_PERFIL or perfil.get("maquina") != huella_maquina():
+        return None
+    return perfil
+
+
+def hilos_entrenamiento(perfil: Optional[Dict[str, Any]], profundidad: int) -> Optional[int]:
+    """Mejor ``thread_count`` medido para la profundidad más cercana a ``profundidad``."""
+    if not perfil or not perfil.get("entrenamiento"):
+        return None
+    medidas = perfil["entrenamiento"]
+    cercana = min(medidas, key=lambda p: (abs(int(p) - profundidad), int(p)))
+    return int(medidas[cercana]["hilos"])
+
+
+def hilos_prediccion(perfil: Optional[Dict[str, Any]]) -> Optional[int]:
+    """``thread_count`` de predicción medido para el lote recomendado (etapa de gráficos, lotes y servicio)."""
+    if not perfil or not perfil.get("prediccion"):
+        return None
+    return int(perfil["prediccion"]["hilos"])
+
+
+def tamano_lote(perfil: Optional[Dict[str, Any]]) -> Optional[int]:
+    """Lote recomendado: bloques de ``prediccion_lotes.py`` y ``lote_maximo`` del servicio."""
+    if not perfil or not perfil.get("prediccion"):
+        return None
+    return int(perfil["prediccion"]["tamano_lote"])
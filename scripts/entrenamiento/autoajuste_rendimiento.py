@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import catboost
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from comun.concurrencia import nucleos_disponibles
+from comun.perfil_rendimiento import VERSION_PERFIL, huella_maquina, ruta_perfil
+from entrenamiento import ConfiguracionModelo, DetectorRiesgoDiabetes
+
+RUTA_BASE = Path(__file__).resolve().parent.parent.parent
+
+PROFUNDIDADES = [4, 5, 6]
+LOTES = [1, 256, 4096, 65536]
+
+# Fracción del mejor rendimiento (filas/s) que debe alcanzar el tamaño de lote recomendado:
+# se elige el lote más pequeño que llega a ella, porque lotes mayores solo añaden latencia y memoria.
+FRACCION_RENDIMIENTO_LOTE = 0.9
+
+# Diferencia relativa por debajo de la cual dos mediciones se consideran empatadas; ante un empate
+# se prefieren menos hilos, que dejan núcleos libres para otros procesos.
+TOLERANCIA = 0.05
+
+# Tiempo mínimo que se repite una medición muy corta (p. ej. predecir una fila) para que sea estable.
+SEGUNDOS_MINIMOS = 0.2
+
+
+def candidatos_hilos(nucleos: int) -> List[int]:
+    """Potencias de dos hasta el presupuesto de núcleos, más el propio presupuesto."""
+    candidatos = {nucleos}
+    h = 1
+    while h < nucleos:
+        candidatos.add(h)
+        h *= 2
+    return sorted(candidatos)
+
+
+def medir(funcion: Callable[[], object], repeticiones: int) -> float:
+    """Mejor tiempo (s) por llamada entre ``repeticiones`` rondas; las llamadas cortas se agrupan."""
+    mejores = []
+    for _ in range(repeticiones):
+        llamadas, inicio = 0, time.perf_counter()
+        while True:
+            funcion()
+            llamadas += 1
+            transcurrido = time.perf_counter() - inicio
+            if transcurrido >= SEGUNDOS_MINIMOS:
+                break
+        mejores.append(transcurrido / llamadas)
+    return min(mejores)
+
+
+def medir_entrenamiento(ruta_base: Path, datos, pesos, profundidades: List[int], hilos: List[int],
+                        iteraciones: int, repeticiones: int) -> Dict[str, Dict]:
+    """Tiempo de ``entrenar`` por profundidad y número de hilos; conserva el más rápido de cada profundidad."""
+    X_entrenamiento, y_entrenamiento, X_prueba, y_prueba = datos
+    resultados = {}
+    for profundidad in profundidades:
+        tiempos = {}
+        for h in hilos:
+            detector = DetectorRiesgoDiabetes(
+                ruta_base, ConfiguracionModelo(iteraciones=iteraciones, profundidad=profundidad), n_trabajos=h, verbosidad=0
+            )
+            tiempos[h] = medir(lambda: detector.entrenar(X_entrenamiento, y_entrenamiento, X_prueba, y_prueba, pesos), repeticiones)
+            print(f"    > entrenar  depth={profundidad} hilos={h:<3} {tiempos[h]:8.3f} s")
+        mejor = min(h for h, t in tiempos.items() if t <= min(tiempos.values()) * (1 + TOLERANCIA))
+        resultados[str(profundidad)] = {"hilos": mejor, "segundos": {str(h): t for h, t in tiempos.items()}}
+    return resultados
+
+
+def medir_prediccion(modelo, X: pd.DataFrame, lotes: List[int], hilos: List[int], repeticiones: int) -> Dict[str, Dict]:
+    """Filas por segundo de ``predict_proba`` por tamaño de lote y número de hilos."""
+    resultados = {}
+    for tamano in lotes:
+        repeticion = int(np.ceil(tamano / len(X)))
+        lote = (pd.concat([X] * repeticion, ignore_index=True) if repeticion > 1 else X).iloc[:tamano]
+        velocidades = {}
+        for h in hilos:
+            segundos = medir(lambda: modelo.predict_proba(lote, thread_count=h), repeticiones)
+            velocidades[h] = tamano / segundos
+            print(f"    > predecir  lote={tamano:<7} hilos={h:<3} {velocidades[h]:12,.0f} filas/s | {segundos * 1000:8.3f} ms por lote")
+        mejor = min(h for h, v in velocidades.items() if v >= max(velocidades.values()) * (1 - TOLERANCIA))
+        resultados[str(tamano)] = {
+            "hilos": mejor,
+            "filas_por_segundo": velocidades[mejor],
+            "latencia_ms": tamano / velocidades[mejor] * 1000,
+            "filas_por_segundo_por_hilos": {str(h): v for h, v in velocidades.items()},
+        }
+    return resultados
+
+
+def elegir_lote(prediccion: Dict[str, Dict]) -> Dict:
+    """Lote más pequeño con al menos ``FRACCION_RENDIMIENTO_LOTE`` del mejor rendimiento medido."""
+    mejor = max(m["filas_por_segundo"] for m in prediccion.values())
+    tamano = min(int(t) for t, m in prediccion.items() if m["filas_por_segundo"] >= FRACCION_RENDIMIENTO_LOTE * mejor)
+    return {"tamano_lote": tamano, "hilos": prediccion[str(tamano)]["hilos"]}
+
+
+def ejecutar_autoajuste(ruta_base: Path = RUTA_BASE, filas: int = 250_000, iteraciones: int = 50,
+                        profundidades: List[int] = PROFUNDIDADES, lotes: List[int] = LOTES,
+                        hilos: Optional[List[int]] = None, repeticiones: int = 2) -> Dict:
+    hilos = hilos or candidatos_hilos(nucleos_disponibles())
+    print(f"[*] Autoajuste de rendimiento: {nucleos_disponibles()} núcleos disponibles | hilos {hilos} | "
+          f"profundidades {profundidades} | lotes {lotes}")
+
+    detector = DetectorRiesgoDiabetes(ruta_base, ConfiguracionModelo(iteraciones=iteraciones), verbosidad=0)
+    X_entrenamiento, y_entrenamiento, X_prueba, y_prueba = detector.cargar_datos()
+    pesos = detector.pesos_entrenamiento
+    if len(X_entrenamiento) > filas:
+        idx = np.sort(np.random.default_rng(42).choice(len(X_entrenamiento), size=filas, replace=False))
+        X_entrenamiento, y_entrenamiento = X_entrenamiento.iloc[idx], y_entrenamiento.iloc[idx]
+        pesos = None if pesos is None else pesos.iloc[idx]
+    datos = (X_entrenamiento, y_entrenamiento, X_prueba, y_prueba)
+    print(f"    > {len(X_entrenamiento):,} filas × {X_entrenamiento.shape[1]} características, {iteraciones} iteraciones por ajuste")
+
+    # Ajuste de calentamiento: cuantiza (o carga) el pool de la caché y deja el modelo para medir la predicción.
+    detector.entrenar(*datos, pesos)
+    entrenamiento = medir_entrenamiento(ruta_base, datos, pesos, profundidades, hilos, iteraciones, repeticiones)
+    prediccion = medir_prediccion(detector.modelo, X_prueba, lotes, hilos, repeticiones)
+
+    perfil = {
+        "version": VERSION_PERFIL,
+        "maquina": huella_maquina(),
+        "catboost": catboost.__version__,
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "filas": len(X_entrenamiento),
+        "iteraciones": iteraciones,
+        "entrenamiento": entrenamiento,
+        "prediccion": {**elegir_lote(prediccion), "lotes": prediccion},
+    }
+    ruta = ruta_perfil(ruta_base)
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump(perfil, f, indent=2)
+
+    print(f"\n[OK] Perfil guardado en: {ruta}")
+    for profundidad, medida in entrenamiento.items():
+        print(f"    > Entrenamiento depth={profundidad}: {medida['hilos']} hilos")
+    print(f"    > Predicción: lotes de {perfil['prediccion']['tamano_lote']} filas con {perfil['prediccion']['hilos']} hilos")
+    return perfil
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mide hilos, profundidad y tamaño de lote en esta máquina y guarda el mejor perfil.")
+    parser.add_argument("--filas", type=int, default=250_000, help="Filas de entrenamiento usadas en la medición.")
+    parser.add_argument("--iteraciones", type=int, default=50, help="Iteraciones por ajuste medido.")
+    parser.add_argument("--profundidades", type=int, nargs="+", default=PROFUNDIDADES)
+    parser.add_argument("--lotes", type=int, nargs="+", default=LOTES, help="Tamaños de lote de predicción.")
+    parser.add_argument("--hilos", type=int, nargs="+", default=None,
+                        help="Números de hilos a probar (por defecto, potencias de dos hasta los núcleos disponibles).")
+    parser.add_argument("--repeticiones", type=int, default=2, help="Rondas por medición; se conserva la más rápida.")
+    args = parser.parse_args()
+
+    ejecutar_autoajuste(filas=args.filas, iteraciones=args.iteraciones, profundidades=args.profundidades,
+                        lotes=args.lotes, hilos=args.hilos, repeticiones=args.repeticiones)
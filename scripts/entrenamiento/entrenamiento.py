@@ -1,16 +1,34 @@
 #!/usr/bin/env python3
 
-import joblib
+import sys
+import json
+import argparse
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from pathlib import Path
 from datetime import datetime
-from multiprocessing import cpu_count
 from typing import Dict, Tuple, List, Any, Optional
-from dataclasses import dataclass, asdict
-from catboost import CatBoostClassifier
-from sklearn.metrics import recall_score, roc_auc_score, confusion_matrix, roc_curve
+from dataclasses import dataclass, asdict, replace
+from catboost import CatBoostClassifier, Pool
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from comun.artefacto import CARPETA_ARTEFACTO, archivos_artefacto, cargar_artefacto, guardar_artefacto
+from comun.cache_etapas import ManifiestoEtapas, fuentes_comun, huella_configuracion
+from comun.cache_pools import CachePools
+from comun.concurrencia import hilos_por_defecto
+from comun.perfil_rendimiento import cargar_perfil, hilos_entrenamiento, hilos_prediccion
+from comun.columnar import (
+    cache_vigente, cargar_columnar, cargar_columnas, cargar_particion, huella_archivo, indices_pliegue, materializar,
+)
+from comun.esquema import COLUMNA_CONTEO, COLUMNA_OBJETIVO, descripcion_columnas, leer_csv_modelo
+from comun.memoria import memoria_pico_mb, memoria_residente_mb
+from comun.metricas import CurvaConfusion, bootstrap_metricas, buscar_umbral_optimo, curva_confusion
+from comun.graficos import PERFILES, PerfilGraficos, ServicioGraficos, diezmar
+from comun.instrumentacion import Instrumentacion
+
+# Filas que se vuelcan a la vez al exportar una partición del almacén columnar a CSV.
+FILAS_POR_BLOQUE_EXPORTACION = 250_000
 
 @dataclass
 class ConfiguracionModelo:
@@ -20,60 +38,333 @@ class ConfiguracionModelo:
     reg_l2_hoja: int = 3
     semilla_aleatoria: int = 42
     pesos_clases: Dict[int, int] = None
+    colapsar_duplicados: bool = False
+    semilla_particion: Optional[int] = None
+    pliegue: Optional[int] = None
+    replicas_bootstrap: int = 0
+    fraccion_eval_entrenamiento: float = 1.0
+    n_bordes: int = 254
+    tipo_bordes: str = "GreedyLogSum"
+    cache_pools: bool = True
+    desde_archivos: bool = False
+    paciencia: Optional[int] = None
     
     def __post_init__(self):
         if self.pesos_clases is None:
             self.pesos_clases = {0: 1, 1: 7}
+        if self.colapsar_duplicados and (self.semilla_particion is not None or self.pliegue is not None):
+            raise ValueError("El entrenamiento colapsado solo existe para la partición canónica del preprocesamiento.")
+        if not 0.0 < self.fraccion_eval_entrenamiento <= 1.0:
+            raise ValueError("fraccion_eval_entrenamiento debe estar en (0, 1].")
+        if self.paciencia is not None and self.paciencia < 1:
+            raise ValueError("paciencia debe ser un entero positivo (o None para desactivar la parada temprana).")
+
+def graficar_evolucion(perfil: PerfilGraficos, ruta: str, df: pd.DataFrame, col: str, etiqueta: str, color: str, titulo: str, etiqueta_y: str, mejor_iteracion: int):
+    serie = df.iloc[diezmar(len(df), perfil.max_puntos)]
+    plt.figure(figsize=(12, 7))
+    if perfil.anotaciones:
+        plt.plot(serie['iteracion'], serie[col], linewidth=2.5, color=color, alpha=0.9, label=etiqueta, marker='o', markevery=20, markersize=6)
+    else:
+        plt.plot(serie['iteracion'], serie[col], linewidth=2.5, color=color, alpha=0.9, label=etiqueta)
+    plt.scatter([0], [0.0], s=100, color='red', zorder=5, edgecolors='darkred', linewidths=2)
+    
+    if perfil.anotaciones:
+        plt.annotate('Sin entrenamiento\n(0%)', xy=(0, 0), xytext=(15, 5), fontsize=10, color='darkred', fontweight='bold', arrowprops=dict(arrowstyle='->', color='darkred', lw=1.5))
+
+        for i in range(0, len(df), 20):
+            if i == 0: continue
+            val = df[col].iloc[i]
+            plt.annotate(f'{val:.1f}%', xy=(i, val), xytext=(0, 10), textcoords='offset points', ha='center', fontsize=8, fontweight='bold')
+
+        if (len(df)-1) % 20 != 0:
+            ultima_iter = len(df) - 1
+            ultimo_val = df[col].iloc[-1]
+            plt.annotate(f'{ultimo_val:.1f}%', xy=(ultima_iter, ultimo_val), xytext=(0, 10), textcoords='offset points', ha='center', fontsize=8, fontweight='bold')
+
+    if mejor_iteracion < len(df) - 1:
+        plt.axvline(x=mejor_iteracion, color='green', linestyle='--', alpha=0.7, label=f'Mejor iteración ({mejor_iteracion})')
+    
+    plt.xlabel('Iteración del Entrenamiento', fontsize=13, fontweight='bold')
+    plt.ylabel(etiqueta_y, fontsize=13, fontweight='bold')
+    plt.title(titulo, fontsize=15, fontweight='bold', pad=15)
+    plt.ylim([0, 100])
+    plt.xlim([0, df['iteracion'].max()])
+    plt.legend(loc='lower right')
+    plt.grid(True, alpha=0.3, linestyle='--')
+    plt.tight_layout()
+    plt.savefig(ruta, dpi=perfil.dpi, bbox_inches='tight')
+
+def graficar_matriz_confusion(perfil: PerfilGraficos, ruta: str, metricas: Dict):
+    fig, ax = plt.subplots(figsize=(10, 8))
+    
+    # Matriz organizada: [[VP, FN], [FP, VN]]
+    cm = np.array([[metricas['vp'], metricas['fn']], 
+                   [metricas['fp'], metricas['vn']]])
+    
+    colores = [['#1E3A8A', '#F97316'], ['#F97316', '#1E3A8A']]
+    etiquetas_texto = [['Verdadero Positivo', 'Falso Negativo'], 
+                   ['Falso Positivo', 'Verdadero Negativo']]
+    
+    for i in range(2):
+        for j in range(2):
+            ax.add_patch(plt.Rectangle((j, i), 1, 1, facecolor=colores[i][j], alpha=0.9, edgecolor='white', linewidth=2))
+            
+            val = cm[i, j]
+            porcentaje = (val / cm.sum()) * 100
+            
+            ax.text(j + 0.5, i + 0.25, etiquetas_texto[i][j], ha='center', va='center', color='white', fontsize=12, fontweight='bold')
+            ax.text(j + 0.5, i + 0.5, f"{val:,}", ha='center', va='center', color='white', fontsize=28, fontweight='bold')
+            ax.text(j + 0.5, i + 0.75, f"{porcentaje:.1f}%", ha='center', va='center', color='white', fontsize=12)
+
+    ax.set_xlim(0, 2)
+    ax.set_ylim(2, 0)
+    
+    nombres_clases = ['Diabético', 'Sano']
+    ax.set_xticks([0.5, 1.5])
+    ax.set_xticklabels(nombres_clases, fontsize=12, fontweight='bold')
+    ax.set_yticks([0.5, 1.5])
+    ax.set_yticklabels(nombres_clases, fontsize=12, fontweight='bold', rotation=90, va='center')
+    
+    ax.set_xlabel('Predicción del Modelo', fontsize=14, fontweight='bold', labelpad=10)
+    ax.set_ylabel('Estado Real', fontsize=14, fontweight='bold', labelpad=10)
+    ax.set_title('Matriz de Confusión', fontsize=16, fontweight='bold', pad=20)
+    ax.tick_params(axis='both', which='both', length=0)
+    
+    plt.tight_layout()
+    plt.savefig(ruta, dpi=perfil.dpi, bbox_inches='tight')
+
+def graficar_curva_roc(perfil: PerfilGraficos, ruta: str, fpr: np.ndarray, tpr: np.ndarray, idx: int, umbral, metricas):
+    plt.figure(figsize=(10, 8))
+    puntos = diezmar(len(fpr), perfil.max_puntos)
+    
+    plt.plot(fpr[puntos], tpr[puntos], linewidth=3, color='#2E86AB', label=f'Modelo CatBoost (AUC = {metricas["roc_auc"]:.3f})', alpha=0.9)
+    plt.plot([0, 1], [0, 1], 'k--', linewidth=2, label='Clasificador aleatorio (AUC = 0.500)', alpha=0.5)
+    plt.scatter([fpr[idx]], [tpr[idx]], s=300, color='red', zorder=5, edgecolors='darkred', linewidths=2, label=f'Umbral óptimo ({umbral:.4f})')
+    
+    plt.xlabel('Tasa de Falsos Positivos', fontsize=13, fontweight='bold')
+    plt.ylabel('Sensibilidad', fontsize=13, fontweight='bold')
+    plt.title(f'Curva ROC - Conjunto de Prueba\nSensibilidad: {metricas["sensibilidad"]*100:.2f}%', fontsize=15, fontweight='bold', pad=15)
+    plt.legend(loc='lower right')
+    plt.grid(True, alpha=0.3, linestyle='--')
+    plt.tight_layout()
+    plt.savefig(ruta, dpi=perfil.dpi, bbox_inches='tight')
 
 class DetectorRiesgoDiabetes:
-    def __init__(self, ruta_base: Path, config: ConfiguracionModelo = None):
+    def __init__(self, ruta_base: Path, config: ConfiguracionModelo = None, forzar: bool = False, perfil_graficos: str = "completo",
+                 n_trabajos: Optional[int] = None, verbosidad: int = 10, instrumentar: Optional[bool] = None):
         self.ruta_base = ruta_base
         self.config = config if config else ConfiguracionModelo()
+        self.forzar = forzar
+        self.perfil_graficos = perfil_graficos
         self.modelo = None
-        self.n_trabajos = max(1, cpu_count() - 1)
+        self.pesos_entrenamiento: Optional[pd.Series] = None
+        self.indices_eval_entrenamiento: Optional[np.ndarray] = None
+        self.iteraciones_ajustadas: Optional[int] = None
+        # Sin n_trabajos explícito se usa el perfil medido en esta máquina (autoajuste_rendimiento.py), si existe.
+        self.perfil_rendimiento = cargar_perfil(self.ruta_base)
+        self.n_trabajos = n_trabajos or hilos_entrenamiento(self.perfil_rendimiento, self.config.profundidad) or hilos_por_defecto()
+        self.verbosidad = verbosidad
+        self.pools = CachePools(
+            self.ruta_base / "dataset" / "cache" / "pools", self.config.n_bordes, self.config.tipo_bordes, verbose=bool(verbosidad)
+        ) if self.config.cache_pools else None
         self.dir_salida = self.ruta_base / "resultados"
         self.dir_salida.mkdir(parents=True, exist_ok=True)
+        self.dir_artefacto = self.dir_salida / CARPETA_ARTEFACTO
+        # Sin instrumentar explícito decide la variable DIABETES_INSTRUMENTACION; apagada no mide nada.
+        self.instrumentacion = Instrumentacion("entrenamiento", instrumentar)
         np.random.seed(self.config.semilla_aleatoria)
 
+    def _rutas_particion(self, nombre: str) -> Tuple[Path, Path]:
+        return self.ruta_base / "dataset" / f"{nombre}.csv", self.ruta_base / "dataset" / "cache" / nombre
+
+    def _ruta_indices(self) -> Optional[Path]:
+        """Archivo de índices de la partición elegida, si existe el almacén columnar completo."""
+        _, ruta_completo = self._rutas_particion("completo")
+        if not cache_vigente(ruta_completo):
+            return None
+        semilla = self.config.semilla_particion
+        if semilla is None:
+            meta, _ = cargar_columnas(ruta_completo)
+            semilla = meta["particion"]["semilla"]
+        ruta = self.ruta_base / "dataset" / "particiones" / f"semilla_{semilla}.npz"
+        return ruta if ruta.exists() else None
+
+    def _nombre_entrenamiento(self) -> str:
+        return "train_colapsado" if self.config.colapsar_duplicados else "train"
+
+    def _fuentes_datos(self, nombres=None) -> List[Path]:
+        """Archivos que ``cargar_datos`` leerá realmente: almacén columnar e índices si existen, o los CSV."""
+        fuentes = []
+        for nombre in nombres or (self._nombre_entrenamiento(), "test"):
+            ruta_csv, ruta_cache = self._rutas_particion(nombre)
+            ruta_indices = self._ruta_indices()
+            if nombre == "train_colapsado" and cache_vigente(ruta_cache, fuente=ruta_csv):
+                fuentes += sorted(ruta_cache.glob("*.bin"))
+            elif nombre != "train_colapsado" and ruta_indices is not None:
+                fuentes += sorted(self._rutas_particion("completo")[1].glob("*.bin")) + [ruta_indices]
+            else:
+                fuentes.append(ruta_csv)
+        return sorted(set(fuentes))
+
+    def _fuentes_codigo(self) -> List[Path]:
+        return [Path(__file__)] + fuentes_comun()
+
+    def _leer_particion(self, nombre: str) -> pd.DataFrame:
+        ruta_csv, ruta_cache = self._rutas_particion(nombre)
+        if nombre == "train_colapsado" and cache_vigente(ruta_cache, fuente=ruta_csv):
+            print(f"    > {nombre}: caché columnar ({ruta_cache.relative_to(self.ruta_base)})")
+            return cargar_columnar(ruta_cache)
+
+        ruta_indices = self._ruta_indices()
+        if nombre != "train_colapsado" and ruta_indices is not None:
+            indices = self._indices_particion(nombre, ruta_indices)
+            _, columnas = cargar_columnas(self._rutas_particion("completo")[1])
+            print(f"    > {nombre}: almacén columnar + índices ({ruta_indices.relative_to(self.ruta_base)})")
+            return materializar(columnas, indices)
+
+        print(f"    > {nombre}: CSV ({ruta_csv.relative_to(self.ruta_base)})")
+        return leer_csv_modelo(ruta_csv)
+
     def cargar_datos(self) -> Tuple[pd.DataFrame, pd.Series, pd.DataFrame, pd.Series]:
-        df_entrenamiento = pd.read_csv(self.ruta_base / "dataset" / "train.csv")
-        df_prueba = pd.read_csv(self.ruta_base / "dataset" / "test.csv")
-        
+        df_entrenamiento = self._leer_particion(self._nombre_entrenamiento())
+        df_prueba = self._leer_particion("test")
+
+        # Con duplicados colapsados, cada fila única pesa tantas veces como aparecía en el entrenamiento.
+        self.pesos_entrenamiento = None
+        if COLUMNA_CONTEO in df_entrenamiento.columns:
+            self.pesos_entrenamiento = df_entrenamiento[COLUMNA_CONTEO].astype(np.float64)
+            df_entrenamiento = df_entrenamiento.drop(COLUMNA_CONTEO, axis=1)
+
         return (
-            df_entrenamiento.drop('estado_diabetes', axis=1),
-            df_entrenamiento['estado_diabetes'],
-            df_prueba.drop('estado_diabetes', axis=1),
-            df_prueba['estado_diabetes']
+            df_entrenamiento.drop(COLUMNA_OBJETIVO, axis=1),
+            df_entrenamiento[COLUMNA_OBJETIVO],
+            df_prueba.drop(COLUMNA_OBJETIVO, axis=1),
+            df_prueba[COLUMNA_OBJETIVO]
         )
 
-    def _calcular_metricas(self, y_verdadero: np.ndarray, y_predicho: np.ndarray, y_proba: np.ndarray) -> Dict[str, float]:
-        vn, fp, fn, vp = confusion_matrix(y_verdadero, y_predicho).ravel()
+    def _indices_particion(self, nombre: str, ruta_indices: Path) -> np.ndarray:
+        particion = cargar_particion(ruta_indices)
+        if self.config.pliegue is None:
+            return particion[nombre]
+        return dict(zip(("train", "test"), indices_pliegue(particion, self.config.pliegue)))[nombre]
+
+    def _archivo_particion(self, nombre: str) -> Path:
+        """CSV con las filas de la partición, para que CatBoost lo lea sin pasar por pandas.
+
+        Si la partición sale del almacén columnar, sus filas se vuelcan por bloques a
+        ``dataset/cache/archivos/`` y el archivo se reutiliza mientras sus fuentes no cambien.
+        """
+        ruta_csv, ruta_cache = self._rutas_particion(nombre)
+        ruta_indices = self._ruta_indices()
+        if nombre == "train_colapsado" and ruta_csv.exists():
+            return ruta_csv
+        if nombre == "train_colapsado" and cache_vigente(ruta_cache):
+            carpeta_columnas, indices = ruta_cache, None
+        elif nombre != "train_colapsado" and ruta_indices is not None:
+            carpeta_columnas, indices = self._rutas_particion("completo")[1], self._indices_particion(nombre, ruta_indices)
+        else:
+            return ruta_csv
+
+        sufijo = "" if self.config.pliegue is None else f"_pliegue{self.config.pliegue}"
+        ruta = self.ruta_base / "dataset" / "cache" / "archivos" / f"{nombre}{sufijo}.csv"
+        ruta_huella = ruta.with_suffix(".json")
+        fuentes = sorted(carpeta_columnas.glob("*.bin")) + sorted(carpeta_columnas.glob("*.json"))
+        if indices is not None:
+            fuentes.append(ruta_indices)
+        huella = {str(f.relative_to(self.ruta_base)): huella_archivo(f) for f in fuentes}
+        if ruta.exists() and ruta_huella.exists():
+            with open(ruta_huella, encoding="utf-8") as f:
+                if json.load(f) == huella:
+                    print(f"    > {nombre}: archivo exportado ({ruta.relative_to(self.ruta_base)})")
+                    return ruta
+
+        _, columnas = cargar_columnas(carpeta_columnas)
+        n_filas = len(next(iter(columnas.values()))) if indices is None else len(indices)
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        temporal = ruta.with_suffix(".tmp")
+        with open(temporal, "w", newline="", encoding="utf-8") as f:
+            for inicio in range(0, max(n_filas, 1), FILAS_POR_BLOQUE_EXPORTACION):
+                fin = min(inicio + FILAS_POR_BLOQUE_EXPORTACION, n_filas)
+                bloque = np.arange(inicio, fin) if indices is None else indices[inicio:fin]
+                materializar(columnas, bloque).to_csv(f, header=inicio == 0, index=False)
+        temporal.replace(ruta)
+        with open(ruta_huella, "w", encoding="utf-8") as f:
+            json.dump(huella, f, indent=2)
+        print(f"    > {nombre}: exportado a {ruta.relative_to(self.ruta_base)} ({n_filas:,} filas)")
+        return ruta
+
+    def cargar_pools(self) -> Tuple[Pool, pd.Series, Pool, pd.Series]:
+        """Como ``cargar_datos``, pero CatBoost lee cada partición de su archivo con un ``.cd`` generado.
+
+        Las características nunca pasan por pandas: de cada archivo solo se leen la etiqueta y,
+        en el entrenamiento colapsado, el conteo (que CatBoost ya toma como peso por el ``.cd``).
+        """
+        self.pesos_entrenamiento = None
+        resultado = []
+        for nombre in (self._nombre_entrenamiento(), "test"):
+            ruta = self._archivo_particion(nombre)
+            with open(ruta, encoding="utf-8") as f:
+                columnas = f.readline().strip().split(",")
+            ruta_cd = self.ruta_base / "dataset" / "cache" / "archivos" / f"{ruta.stem}.cd"
+            descripcion = descripcion_columnas(columnas)
+            # Solo se reescribe si cambia, para no alterar la fecha del .cd en cada carga.
+            if not ruta_cd.exists() or ruta_cd.read_text(encoding="utf-8") != descripcion:
+                ruta_cd.parent.mkdir(parents=True, exist_ok=True)
+                ruta_cd.write_text(descripcion, encoding="utf-8")
+            if self.pools is not None and nombre != "test":
+                pool = self.pools.obtener_de_archivo(ruta, ruta_cd, self.n_trabajos)
+            else:
+                pool = Pool(str(ruta), column_description=str(ruta_cd), delimiter=",", has_header=True, thread_count=self.n_trabajos)
+            # El lector C de pandas solo tokeniza las columnas pedidas; pyarrow reservaría el archivo completo.
+            leidas = pd.read_csv(ruta, usecols=[c for c in (COLUMNA_OBJETIVO, COLUMNA_CONTEO) if c in columnas],
+                                 dtype={COLUMNA_OBJETIVO: np.uint8, COLUMNA_CONTEO: np.float64}, engine="c")
+            if COLUMNA_CONTEO in leidas.columns:
+                self.pesos_entrenamiento = leidas[COLUMNA_CONTEO].astype(np.float64)
+            resultado += [pool, leidas[COLUMNA_OBJETIVO].astype(np.uint8)]
+        return tuple(resultado)
+
+    def _calcular_metricas(self, curva: CurvaConfusion, umbral: float) -> Dict[str, float]:
+        """Métricas al umbral dado, leídas de la curva de confusión (sin recorrer de nuevo los datos)."""
+        conteos = curva.en_umbral(umbral)
+        sensibilidad = conteos['vp'] / curva.total_positivos if curva.total_positivos > 0 else 0.0
+        roc_auc = curva.auc()
         return {
-            'sensibilidad': recall_score(y_verdadero, y_predicho),
-            'roc_auc': roc_auc_score(y_verdadero, y_proba),
-            'puntaje_balance': (recall_score(y_verdadero, y_predicho) + roc_auc_score(y_verdadero, y_proba)) / 2,
-            'vp': int(vp), 'vn': int(vn), 'fp': int(fp), 'fn': int(fn)
+            'sensibilidad': float(sensibilidad),
+            'roc_auc': roc_auc,
+            'puntaje_balance': (float(sensibilidad) + roc_auc) / 2,
+            'vp': int(round(conteos['vp'])), 'vn': int(round(conteos['vn'])), 'fp': int(round(conteos['fp'])), 'fn': int(round(conteos['fn']))
         }
 
-    def optimizar_umbral(self, y_verdadero: np.ndarray, y_proba: np.ndarray) -> Tuple[float, float]:
-        umbrales = np.linspace(0.001, 0.5, 1000)
-        
-        def calcular_youden(umbral):
-            y_predicho = (y_proba >= umbral).astype(int)
-            vn, fp, fn, vp = confusion_matrix(y_verdadero, y_predicho).ravel()
-            sensibilidad = vp / (vp + fn) if (vp + fn) > 0 else 0
-            especificidad = vn / (vn + fp) if (vn + fp) > 0 else 0
-            return 0.9 * sensibilidad + 0.1 * especificidad
-
-        mejor_umbral = max(umbrales, key=calcular_youden)
-        return mejor_umbral, roc_auc_score(y_verdadero, y_proba)
-
-    def entrenar(self, X_entrenamiento, y_entrenamiento, X_prueba, y_prueba):
-        self.modelo = CatBoostClassifier(
+    def optimizar_umbral(self, y_verdadero: np.ndarray, y_proba: np.ndarray) -> Tuple[float, CurvaConfusion]:
+        """Umbral que maximiza 0.9·sensibilidad + 0.1·especificidad entre todas las puntuaciones de [0.001, 0.5].
+
+        Devuelve también la curva de confusión completa para reutilizarla en métricas y gráficos.
+        """
+        curva = curva_confusion(y_verdadero, y_proba)
+        mejor_umbral = buscar_umbral_optimo(curva, peso_sensibilidad=0.9, minimo=0.001, maximo=0.5)
+        if mejor_umbral is None:
+            mejor_umbral = buscar_umbral_optimo(curva, peso_sensibilidad=0.9, minimo=-np.inf, maximo=np.inf)
+        return mejor_umbral, curva
+
+    def _indices_eval_entrenamiento(self, n_filas: int) -> Optional[np.ndarray]:
+        """Filas del entrenamiento que se evalúan en cada iteración (None = todas)."""
+        fraccion = self.config.fraccion_eval_entrenamiento
+        if fraccion >= 1.0:
+            return None
+        rng = np.random.default_rng(self.config.semilla_aleatoria)
+        return np.sort(rng.choice(n_filas, size=max(1, int(round(n_filas * fraccion))), replace=False))
+
+    def modelo_base(self, ponderado: bool = False) -> CatBoostClassifier:
+        """Clasificador sin ajustar con los hiperparámetros de la configuración."""
+        # Los pesos por fila se multiplican con pesos_clases; AUC solo los considera si se pide explícitamente.
+        metrica_auc = 'AUC:use_weights=true' if ponderado else 'AUC'
+        return CatBoostClassifier(
             iterations=self.config.iteraciones,
             learning_rate=self.config.tasa_aprendizaje,
             depth=self.config.profundidad,
             l2_leaf_reg=self.config.reg_l2_hoja,
+            border_count=self.config.n_bordes,
+            feature_border_type=self.config.tipo_bordes,
             class_weights=self.config.pesos_clases,
             random_seed=self.config.semilla_aleatoria,
             verbose=False,
@@ -83,162 +374,160 @@ class DetectorRiesgoDiabetes:
             subsample=0.85,
             colsample_bylevel=0.9,
             min_data_in_leaf=20,
-            eval_metric='AUC',
+            eval_metric=metrica_auc,
             custom_metric=['Recall'],
+            use_best_model=False,
+            # Detector de sobreajuste sobre el último conjunto de evaluación (prueba): se detiene tras
+            # ``paciencia`` iteraciones sin mejorar el AUC.
+            early_stopping_rounds=self.config.paciencia,
             allow_writing_files=False
         )
-        
+
+    def _ajustar(self, X_entrenamiento, y_entrenamiento, X_prueba, y_prueba, pesos_entrenamiento=None) -> Tuple[Pool, Pool]:
+        """Ajusta todas las iteraciones sin recortar y devuelve los pools de evaluación (entrenamiento, prueba)."""
+        self.modelo = self.modelo_base(ponderado=pesos_entrenamiento is not None)
+        if isinstance(X_entrenamiento, Pool):
+            # Pool leído de archivo (``cargar_pools``): ya lleva etiquetas y pesos.
+            pool_entrenamiento = X_entrenamiento
+        elif self.pools is not None:
+            pool_entrenamiento = self.pools.obtener(X_entrenamiento, y_entrenamiento, pesos_entrenamiento, self.n_trabajos)
+        else:
+            pool_entrenamiento = Pool(X_entrenamiento, y_entrenamiento, weight=pesos_entrenamiento)
+        self.indices_eval_entrenamiento = self._indices_eval_entrenamiento(len(y_entrenamiento))
+        if self.indices_eval_entrenamiento is None:
+            pool_eval_entrenamiento = pool_entrenamiento
+        else:
+            idx = self.indices_eval_entrenamiento
+            pool_eval_entrenamiento = pool_entrenamiento.slice(idx) if isinstance(X_entrenamiento, Pool) else Pool(
+                X_entrenamiento.iloc[idx], y_entrenamiento.iloc[idx],
+                weight=None if pesos_entrenamiento is None else np.asarray(pesos_entrenamiento)[idx]
+            )
+        pool_prueba = X_prueba if isinstance(X_prueba, Pool) else Pool(X_prueba, y_prueba)
         self.modelo.fit(
-            X_entrenamiento, y_entrenamiento,
-            eval_set=[(X_entrenamiento, y_entrenamiento), (X_prueba, y_prueba)],
-            verbose=10
+            pool_entrenamiento,
+            eval_set=[pool_eval_entrenamiento, pool_prueba],
+            verbose=self.verbosidad
         )
+        return pool_eval_entrenamiento, pool_prueba
+
+    def entrenar(self, X_entrenamiento, y_entrenamiento, X_prueba, y_prueba, pesos_entrenamiento=None) -> Tuple[np.ndarray, np.ndarray]:
+        """Ajusta el modelo y devuelve las probabilidades finales de los dos conjuntos de evaluación.
+
+        Las probabilidades salen de las aproximaciones que CatBoost ya calculó durante el ajuste,
+        sin volver a predecir. El recorte a la mejor iteración se hace a mano: a las aproximaciones
+        solo se les resta la contribución de los árboles descartados.
+        """
+        pool_eval_entrenamiento, pool_prueba = self._ajustar(X_entrenamiento, y_entrenamiento, X_prueba, y_prueba, pesos_entrenamiento)
+        crudos = [np.asarray(aprox[0], dtype=np.float64) for aprox in self.modelo.get_test_evals()]
+        mejor_iteracion, n_arboles = self.modelo.get_best_iteration(), self.modelo.tree_count_
+        self.iteraciones_ajustadas = n_arboles
+        if self.verbosidad and n_arboles < self.config.iteraciones:
+            print(f"Parada temprana tras {n_arboles} iteraciones: {self.config.paciencia} sin mejorar el AUC de prueba.")
+        if mejor_iteracion is not None and mejor_iteracion + 1 < n_arboles:
+            for i, pool in enumerate((pool_eval_entrenamiento, pool_prueba)):
+                crudos[i] -= self.modelo.predict(pool, prediction_type='RawFormulaVal', ntree_start=mejor_iteracion + 1, ntree_end=n_arboles)
+            self.modelo.shrink(ntree_end=mejor_iteracion + 1)
+            if self.verbosidad:
+                print(f"Modelo recortado a las primeras {mejor_iteracion + 1} iteraciones.")
+        proba_entrenamiento, proba_prueba = (1.0 / (1.0 + np.exp(-c)) for c in crudos)
+        return proba_entrenamiento, proba_prueba
+
+    def evaluar(self, datos: Optional[Tuple[pd.DataFrame, pd.Series, pd.DataFrame, pd.Series]] = None) -> Dict[str, float]:
+        """Entrena con la configuración actual y devuelve las métricas de prueba sin escribir artefactos.
+
+        ``datos`` permite reutilizar conjuntos ya cargados (junto con ``pesos_entrenamiento``).
+        """
+        X_entrenamiento, y_entrenamiento, X_prueba, y_prueba = datos if datos is not None else self.cargar_datos()
+        _, y_proba_prueba = self.entrenar(X_entrenamiento, y_entrenamiento, X_prueba, y_prueba, self.pesos_entrenamiento)
+        umbral_optimo, curva_prueba = self.optimizar_umbral(y_prueba, y_proba_prueba)
+        return self._calcular_metricas(curva_prueba, umbral_optimo)
 
-    def generar_graficos(self, historial_entrenamiento: pd.DataFrame, historial_prueba: pd.DataFrame, mejor_iteracion: int, metricas_prueba: Dict, y_prueba, y_proba, umbral_optimo):
+    def _firma_parametros(self, iteraciones: int, X_entrenamiento, y_entrenamiento) -> Tuple:
+        """Parámetros que CatBoost resuelve para ``iteraciones`` (salvo las propias iteraciones).
+
+        Algunos valores por defecto dependen del número de iteraciones (p. ej.
+        ``leaf_estimation_iterations`` pasa de 1 a 10 a partir de 200), así que solo comparten
+        prefijo los modelos con la misma firma. Se obtiene con un ajuste mínimo sobre 256 filas.
+        """
+        parametros = self.modelo_base().get_params()
+        parametros.update(iterations=iteraciones, thread_count=1)
+        sonda = CatBoostClassifier(**parametros)
+        if isinstance(X_entrenamiento, Pool):
+            sonda.fit(X_entrenamiento.slice(list(range(min(256, X_entrenamiento.num_row())))))
+        else:
+            sonda.fit(X_entrenamiento.iloc[:256], y_entrenamiento.iloc[:256])
+        resueltos = sonda.get_all_params()
+        resueltos.pop('iterations', None)
+        return tuple(sorted((k, str(v)) for k, v in resueltos.items()))
+
+    def evaluar_prefijos(self, datos, iteraciones: List[int]) -> Dict[int, Dict[str, float]]:
+        """Métricas de prueba para varios números de iteraciones, con un ajuste por grupo de prefijos.
+
+        Con la misma semilla y los mismos parámetros resueltos, el modelo de k iteraciones es un
+        prefijo del más largo. Cada k se evalúa recortando a la mejor iteración dentro de las
+        primeras k según el historial de AUC de prueba, igual que ``entrenar`` con ``iteraciones=k``.
+        """
+        X_entrenamiento, y_entrenamiento, X_prueba, y_prueba = datos
+        grupos: Dict[Tuple, List[int]] = {}
+        for k in sorted(set(iteraciones)):
+            grupos.setdefault(self._firma_parametros(k, X_entrenamiento, y_entrenamiento), []).append(k)
+
+        resultados = {}
+        config = self.config
+        for grupo in grupos.values():
+            # Copia con las iteraciones del grupo: la configuración del detector (y de quien la comparta) no cambia.
+            self.config = replace(config, iteraciones=max(grupo))
+            try:
+                _, pool_prueba = self._ajustar(X_entrenamiento, y_entrenamiento, X_prueba, y_prueba, self.pesos_entrenamiento)
+            finally:
+                self.config = config
+            historial = self.modelo.get_evals_result()['validation_1']
+            auc_prueba = np.asarray(historial[next(k for k in historial if k.startswith('AUC'))])
+            crudo_final = np.asarray(self.modelo.get_test_evals()[1][0], dtype=np.float64)
+            n_arboles = self.modelo.tree_count_
+            for k in grupo:
+                mejor = int(np.argmax(auc_prueba[:k]))
+                crudo = crudo_final
+                if mejor + 1 < n_arboles:
+                    crudo = crudo_final - self.modelo.predict(pool_prueba, prediction_type='RawFormulaVal', ntree_start=mejor + 1, ntree_end=n_arboles)
+                umbral, curva = self.optimizar_umbral(y_prueba, 1.0 / (1.0 + np.exp(-crudo)))
+                resultados[k] = self._calcular_metricas(curva, umbral)
+        return resultados
+
+    def generar_graficos(self, servicio: ServicioGraficos, historial_entrenamiento: pd.DataFrame, historial_prueba: pd.DataFrame, mejor_iteracion: int, metricas_prueba: Dict, curva_prueba: CurvaConfusion, umbral_optimo):
+        """Envía las cuatro figuras del entrenamiento al servicio de gráficos."""
+        self.generar_graficos_evolucion(servicio, historial_entrenamiento, historial_prueba, mejor_iteracion)
+        self.generar_graficos_prueba(servicio, metricas_prueba, curva_prueba, umbral_optimo)
+
+    def generar_graficos_evolucion(self, servicio: ServicioGraficos, historial_entrenamiento: pd.DataFrame, historial_prueba: pd.DataFrame, mejor_iteracion: int):
         config_graficos = [
             (historial_entrenamiento, 'roc_auc', 'Entrenamiento', '#2E86AB', 'ROC AUC Evaluado en Conjunto de Entrenamiento por Iteración', 'ROC AUC (%)', 'evolucion_entrenamiento.png'),
             (historial_prueba, 'roc_auc', 'Prueba', '#A23B72', 'ROC AUC Evaluado en Conjunto de Prueba por Iteración', 'ROC AUC (%)', 'evolucion_prueba.png')
         ]
 
         for df, col, etiqueta, color, titulo, etiqueta_y, nombre_archivo in config_graficos:
-            plt.figure(figsize=(12, 7))
-            plt.plot(df['iteracion'], df[col], linewidth=2.5, color=color, alpha=0.9, label=etiqueta, marker='o', markevery=20, markersize=6)
-            plt.scatter([0], [0.0], s=100, color='red', zorder=5, edgecolors='darkred', linewidths=2)
-            plt.annotate('Sin entrenamiento\n(0%)', xy=(0, 0), xytext=(15, 5), fontsize=10, color='darkred', fontweight='bold', arrowprops=dict(arrowstyle='->', color='darkred', lw=1.5))
-            
-            for i in range(0, len(df), 20):
-                if i == 0: continue
-                val = df[col].iloc[i]
-                plt.annotate(f'{val:.1f}%', xy=(i, val), xytext=(0, 10), textcoords='offset points', ha='center', fontsize=8, fontweight='bold')
-            
-            if (len(df)-1) % 20 != 0:
-                ultima_iter = len(df) - 1
-                ultimo_val = df[col].iloc[-1]
-                plt.annotate(f'{ultimo_val:.1f}%', xy=(ultima_iter, ultimo_val), xytext=(0, 10), textcoords='offset points', ha='center', fontsize=8, fontweight='bold')
-
-            if mejor_iteracion < len(df) - 1:
-                plt.axvline(x=mejor_iteracion, color='green', linestyle='--', alpha=0.7, label=f'Mejor iteración ({mejor_iteracion})')
-            
-            plt.xlabel('Iteración del Entrenamiento', fontsize=13, fontweight='bold')
-            plt.ylabel(etiqueta_y, fontsize=13, fontweight='bold')
-            plt.title(titulo, fontsize=15, fontweight='bold', pad=15)
-            plt.ylim([0, 100])
-            plt.xlim([0, df['iteracion'].max()])
-            plt.legend(loc='lower right')
-            plt.grid(True, alpha=0.3, linestyle='--')
-            plt.tight_layout()
-            plt.savefig(self.dir_salida / nombre_archivo, dpi=300, bbox_inches='tight')
-            plt.close()
-
-        self._graficar_matriz_confusion(metricas_prueba)
-        self._graficar_curva_roc(y_prueba, y_proba, umbral_optimo, metricas_prueba)
-
-    def _graficar_matriz_confusion(self, metricas: Dict):
-        fig, ax = plt.subplots(figsize=(10, 8))
-        
-        # Matriz organizada: [[VP, FN], [FP, VN]]
-        cm = np.array([[metricas['vp'], metricas['fn']], 
-                       [metricas['fp'], metricas['vn']]])
-        
-        colores = [['#1E3A8A', '#F97316'], ['#F97316', '#1E3A8A']]
-        etiquetas_texto = [['Verdadero Positivo', 'Falso Negativo'], 
-                       ['Falso Positivo', 'Verdadero Negativo']]
-        
-        for i in range(2):
-            for j in range(2):
-                ax.add_patch(plt.Rectangle((j, i), 1, 1, facecolor=colores[i][j], alpha=0.9, edgecolor='white', linewidth=2))
-                
-                val = cm[i, j]
-                porcentaje = (val / cm.sum()) * 100
-                
-                ax.text(j + 0.5, i + 0.25, etiquetas_texto[i][j], ha='center', va='center', color='white', fontsize=12, fontweight='bold')
-                ax.text(j + 0.5, i + 0.5, f"{val:,}", ha='center', va='center', color='white', fontsize=28, fontweight='bold')
-                ax.text(j + 0.5, i + 0.75, f"{porcentaje:.1f}%", ha='center', va='center', color='white', fontsize=12)
-
-        ax.set_xlim(0, 2)
-        ax.set_ylim(2, 0)
-        
-        nombres_clases = ['Diabético', 'Sano']
-        ax.set_xticks([0.5, 1.5])
-        ax.set_xticklabels(nombres_clases, fontsize=12, fontweight='bold')
-        ax.set_yticks([0.5, 1.5])
-        ax.set_yticklabels(nombres_clases, fontsize=12, fontweight='bold', rotation=90, va='center')
-        
-        ax.set_xlabel('Predicción del Modelo', fontsize=14, fontweight='bold', labelpad=10)
-        ax.set_ylabel('Estado Real', fontsize=14, fontweight='bold', labelpad=10)
-        ax.set_title('Matriz de Confusión', fontsize=16, fontweight='bold', pad=20)
-        ax.tick_params(axis='both', which='both', length=0)
-        
-        plt.tight_layout()
-        plt.savefig(self.dir_salida / "matriz_confusion.png", dpi=300, bbox_inches='tight')
-        plt.close()
-
-    def _graficar_curva_roc(self, y_verdadero, y_proba, umbral, metricas):
-        plt.figure(figsize=(10, 8))
-        fpr, tpr, umbrales = roc_curve(y_verdadero, y_proba)
-        idx = np.argmin(np.abs(umbrales - umbral))
-        
-        plt.plot(fpr, tpr, linewidth=3, color='#2E86AB', label=f'Modelo CatBoost (AUC = {metricas["roc_auc"]:.3f})', alpha=0.9)
-        plt.plot([0, 1], [0, 1], 'k--', linewidth=2, label='Clasificador aleatorio (AUC = 0.500)', alpha=0.5)
-        plt.scatter([fpr[idx]], [tpr[idx]], s=300, color='red', zorder=5, edgecolors='darkred', linewidths=2, label=f'Umbral óptimo ({umbral:.4f})')
-        
-        plt.xlabel('Tasa de Falsos Positivos', fontsize=13, fontweight='bold')
-        plt.ylabel('Sensibilidad', fontsize=13, fontweight='bold')
-        plt.title(f'Curva ROC - Conjunto de Prueba\nSensibilidad: {metricas["sensibilidad"]*100:.2f}%', fontsize=15, fontweight='bold', pad=15)
-        plt.legend(loc='lower right')
-        plt.grid(True, alpha=0.3, linestyle='--')
-        plt.tight_layout()
-        plt.savefig(self.dir_salida / "curva_roc_prueba.png", dpi=300, bbox_inches='tight')
-        plt.close()
-
-    def ejecutar(self):
-        print(f"\n{'='*80}")
-        print(f"{'MODELO DE DETECCIÓN DE RIESGO DE DIABETES':^80}")
-        print(f"{'='*80}\n")
-        
-        print(f"[*] Cargando conjuntos de datos...")
-        X_entrenamiento, y_entrenamiento, X_prueba, y_prueba = self.cargar_datos()
-        print(f"    > Entrenamiento: {X_entrenamiento.shape[0]:,} muestras | {X_entrenamiento.shape[1]} características")
-        print(f"    > Prueba:        {X_prueba.shape[0]:,} muestras | {X_prueba.shape[1]} características")
-        print(f"    > Distribución:  {y_entrenamiento.mean()*100:.1f}% positivos en entrenamiento")
+            servicio.enviar(graficar_evolucion, self.dir_salida / nombre_archivo, df, col, etiqueta, color, titulo, etiqueta_y, mejor_iteracion)
 
-        print(f"\n[*] Iniciando entrenamiento del modelo CatBoost...")
-        self.entrenar(X_entrenamiento, y_entrenamiento, X_prueba, y_prueba)
-        
-        print(f"\n[*] Optimizando umbral de decisión...")
-        y_proba_prueba = self.modelo.predict_proba(X_prueba)[:, 1]
-        umbral_optimo, _ = self.optimizar_umbral(y_prueba, y_proba_prueba)
-        print(f"    > Umbral óptimo encontrado: {umbral_optimo:.4f}")
-        
-        y_pred_prueba = (y_proba_prueba >= umbral_optimo).astype(int)
-        metricas_prueba = self._calcular_metricas(y_prueba, y_pred_prueba, y_proba_prueba)
-        
-        y_proba_entrenamiento = self.modelo.predict_proba(X_entrenamiento)[:, 1]
-        y_pred_entrenamiento = (y_proba_entrenamiento >= umbral_optimo).astype(int)
-        metricas_entrenamiento = self._calcular_metricas(y_entrenamiento, y_pred_entrenamiento, y_proba_entrenamiento)
-        
-        print(f"\n{'='*80}")
-        print(f"{'RESULTADOS FINALES':^80}")
-        print(f"{'='*80}")
-        print(f"{'Métrica':<35} | {'Entrenamiento':<15} | {'Prueba (Validación)':<15}")
-        print(f"{'-'*35}-+-{'-'*15}-+-{'-'*15}")
-        print(f"{'Sensibilidad (Recall)':<35} | {metricas_entrenamiento['sensibilidad']*100:6.2f}%         | {metricas_prueba['sensibilidad']*100:6.2f}%")
-        print(f"{'ROC AUC (ROC AUC)':<35} | {metricas_entrenamiento['roc_auc']*100:6.2f}%         | {metricas_prueba['roc_auc']*100:6.2f}%")
-        print(f"{'Puntaje Balance (Balance Score)':<35} | {metricas_entrenamiento['puntaje_balance']*100:6.2f}%         | {metricas_prueba['puntaje_balance']*100:6.2f}%")
+    def generar_graficos_prueba(self, servicio: ServicioGraficos, metricas_prueba: Dict, curva_prueba: CurvaConfusion, umbral_optimo):
+        servicio.enviar(graficar_matriz_confusion, self.dir_salida / "matriz_confusion.png", metricas_prueba)
+        fpr, tpr = curva_prueba.puntos_roc()
+        # puntos_roc antepone (0, 0): el estado i de la curva está en la posición i + 1.
+        idx = curva_prueba.posicion(umbral_optimo) + 1
+        servicio.enviar(
+            graficar_curva_roc, self.dir_salida / "curva_roc_prueba.png",
+            fpr, tpr, idx, umbral_optimo, metricas_prueba,
+        )
 
-        print(f"\n[*] Guardando artefactos del modelo...")
-        joblib.dump({
-            'modelo': self.modelo,
-            'nombres_caracteristicas': list(X_entrenamiento.columns),
-            'umbral_optimo': umbral_optimo,
-            'metricas': metricas_prueba
-        }, self.dir_salida / "modelo.pkl")
-            
+    def _historiales(self, pesos) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Historial de ROC AUC y sensibilidad por iteración, en entrenamiento y prueba."""
         evals = self.modelo.get_evals_result()
         recall_key = next((k for k in evals['validation_0'].keys() if 'Recall' in k), None)
-        
-        auc_entrenamiento = [x * 100 for x in evals['validation_0']['AUC']]
-        auc_prueba = [x * 100 for x in evals['validation_1']['AUC']]
+        if pesos is not None:
+            recall_key = next((k for k in evals['validation_0'].keys() if k == 'Recall:use_weights=true'), recall_key)
+        auc_key = next(k for k in evals['validation_0'].keys() if k.startswith('AUC'))
+
+        auc_entrenamiento = [x * 100 for x in evals['validation_0'][auc_key]]
+        auc_prueba = [x * 100 for x in evals['validation_1'][auc_key]]
         recall_entrenamiento = [x * 100 for x in evals['validation_0'][recall_key]] if recall_key else [0.0] * len(auc_entrenamiento)
         recall_prueba = [x * 100 for x in evals['validation_1'][recall_key]] if recall_key else [0.0] * len(auc_prueba)
 
@@ -248,23 +537,212 @@ class DetectorRiesgoDiabetes:
             'roc_auc': [0.0] + auc_entrenamiento,
             'sensibilidad': [0.0] + recall_entrenamiento
         })
-        
+
         historial_prueba = pd.DataFrame({
             'iteracion': iteraciones,
             'roc_auc': [0.0] + auc_prueba,
             'sensibilidad': [0.0] + recall_prueba
         })
-        
-        historial_entrenamiento.to_csv(self.dir_salida / "historial_entrenamiento.csv", index=False)
-        historial_prueba.to_csv(self.dir_salida / "historial_prueba.csv", index=False)
-        
-        print(f"[*] Generando visualizaciones...")
-        self.generar_graficos(historial_entrenamiento, historial_prueba, self.modelo.get_best_iteration(), metricas_prueba, y_prueba, y_proba_prueba, umbral_optimo)
-        
+        return historial_entrenamiento, historial_prueba
+
+    def _ejecutar_entrenamiento(self, servicio: ServicioGraficos, huella_datos: Optional[str] = None) -> Dict[str, Any]:
+        """Entrena, evalúa y guarda el artefacto; cada figura se envía a ``servicio`` en cuanto existen sus datos."""
+        etapa = self.instrumentacion.etapa
+        print(f"[*] Cargando conjuntos de datos{' desde archivos (sin pandas)' if self.config.desde_archivos else ''}...")
+        with etapa("carga_datos"):
+            X_entrenamiento, y_entrenamiento, X_prueba, y_prueba = self.cargar_pools() if self.config.desde_archivos else self.cargar_datos()
+        pesos = self.pesos_entrenamiento
+        (filas_entrenamiento, n_caracteristicas), (filas_prueba, _) = (
+            (X.num_row(), X.num_col()) if isinstance(X, Pool) else X.shape for X in (X_entrenamiento, X_prueba)
+        )
+        if pesos is None:
+            print(f"    > Entrenamiento: {filas_entrenamiento:,} muestras | {n_caracteristicas} características")
+        else:
+            print(f"    > Entrenamiento: {int(pesos.sum()):,} muestras en {filas_entrenamiento:,} filas únicas | {n_caracteristicas} características")
+        print(f"    > Prueba:        {filas_prueba:,} muestras | {n_caracteristicas} características")
+        print(f"    > Distribución:  {np.average(y_entrenamiento, weights=pesos)*100:.1f}% positivos en entrenamiento")
+        print(f"    > Memoria:       {memoria_residente_mb():,.0f} MB residentes tras la carga (pico {memoria_pico_mb():,.0f} MB)")
+
+        print(f"\n[*] Iniciando entrenamiento del modelo CatBoost...")
+        with etapa("ajuste"):
+            y_proba_entrenamiento, y_proba_prueba = self.entrenar(X_entrenamiento, y_entrenamiento, X_prueba, y_prueba, pesos)
+        if self.indices_eval_entrenamiento is not None:
+            # Las métricas de entrenamiento se calculan sobre la misma muestra evaluada durante el ajuste.
+            y_entrenamiento = y_entrenamiento.iloc[self.indices_eval_entrenamiento]
+            pesos = None if pesos is None else np.asarray(pesos)[self.indices_eval_entrenamiento]
+            print(f"    > Métricas de entrenamiento sobre una muestra de {len(y_entrenamiento):,} filas")
+        print(f"    > Memoria:       {memoria_residente_mb():,.0f} MB residentes tras el ajuste (pico {memoria_pico_mb():,.0f} MB)")
+
+        # El historial ya existe: sus figuras se dibujan mientras se optimiza el umbral y se calculan las métricas.
+        mejor_iteracion = self.modelo.get_best_iteration()
+        historial_entrenamiento, historial_prueba = self._historiales(pesos)
+        self.generar_graficos_evolucion(servicio, historial_entrenamiento, historial_prueba, mejor_iteracion)
+
+        print(f"\n[*] Optimizando umbral de decisión...")
+        with etapa("umbral"):
+            umbral_optimo, curva_prueba = self.optimizar_umbral(y_prueba, y_proba_prueba)
+        print(f"    > Umbral óptimo encontrado: {umbral_optimo:.4f}")
+
+        with etapa("metricas"):
+            metricas_prueba = self._calcular_metricas(curva_prueba, umbral_optimo)
+
+            curva_entrenamiento = curva_confusion(y_entrenamiento, y_proba_entrenamiento, pesos)
+            metricas_entrenamiento = self._calcular_metricas(curva_entrenamiento, umbral_optimo)
+        self.generar_graficos_prueba(servicio, metricas_prueba, curva_prueba, umbral_optimo)
+
+        print(f"\n{'='*80}")
+        print(f"{'RESULTADOS FINALES':^80}")
+        print(f"{'='*80}")
+        print(f"{'Métrica':<35} | {'Entrenamiento':<15} | {'Prueba (Validación)':<15}")
+        print(f"{'-'*35}-+-{'-'*15}-+-{'-'*15}")
+        print(f"{'Sensibilidad (Recall)':<35} | {metricas_entrenamiento['sensibilidad']*100:6.2f}%         | {metricas_prueba['sensibilidad']*100:6.2f}%")
+        print(f"{'ROC AUC (ROC AUC)':<35} | {metricas_entrenamiento['roc_auc']*100:6.2f}%         | {metricas_prueba['roc_auc']*100:6.2f}%")
+        print(f"{'Puntaje Balance (Balance Score)':<35} | {metricas_entrenamiento['puntaje_balance']*100:6.2f}%         | {metricas_prueba['puntaje_balance']*100:6.2f}%")
+
+        intervalos = None
+        if self.config.replicas_bootstrap > 0:
+            with etapa("bootstrap"):
+                intervalos = {
+                    'entrenamiento': bootstrap_metricas(
+                        y_entrenamiento, y_proba_entrenamiento, umbral_optimo, pesos, self.config.replicas_bootstrap,
+                        semilla=self.config.semilla_aleatoria, hilos=self.n_trabajos
+                    ),
+                    'prueba': bootstrap_metricas(
+                        y_prueba, y_proba_prueba, umbral_optimo, None, self.config.replicas_bootstrap,
+                        semilla=self.config.semilla_aleatoria, hilos=self.n_trabajos
+                    ),
+                }
+            print(f"\nIntervalos de confianza 95% (bootstrap de Poisson, {self.config.replicas_bootstrap} réplicas, umbral fijo):")
+            for clave, nombre in (('sensibilidad', 'Sensibilidad (Recall)'), ('roc_auc', 'ROC AUC (ROC AUC)'), ('puntaje_balance', 'Puntaje Balance (Balance Score)')):
+                (e_bajo, e_alto), (p_bajo, p_alto) = intervalos['entrenamiento'][clave], intervalos['prueba'][clave]
+                print(f"{nombre:<35} | {e_bajo*100:5.2f}–{e_alto*100:5.2f}%  | {p_bajo*100:5.2f}–{p_alto*100:5.2f}%")
+
+        print(f"\n[*] Guardando artefactos del modelo...")
+        with etapa("guardado_artefactos"):
+            guardar_artefacto(self.dir_artefacto, self.modelo, {
+                'umbral_optimo': umbral_optimo,
+                'metricas': metricas_prueba,
+                'mejor_iteracion': mejor_iteracion,
+                'intervalos': intervalos,
+                'parada': {
+                    'paciencia': self.config.paciencia,
+                    'iteraciones_configuradas': self.config.iteraciones,
+                    'iteraciones_ajustadas': self.iteraciones_ajustadas,
+                    'parada_temprana': self.iteraciones_ajustadas < self.config.iteraciones,
+                    'arboles_guardados': self.modelo.tree_count_,
+                },
+                'huella_datos': huella_datos,
+            })
+            
+            historial_entrenamiento.to_csv(self.dir_salida / "historial_entrenamiento.csv", index=False)
+            historial_prueba.to_csv(self.dir_salida / "historial_prueba.csv", index=False)
+
+        return {
+            'umbral_optimo': umbral_optimo,
+            'metricas_prueba': metricas_prueba,
+            'mejor_iteracion': mejor_iteracion,
+            'historial_entrenamiento': historial_entrenamiento,
+            'historial_prueba': historial_prueba,
+            'curva_prueba': curva_prueba
+        }
+
+    def _cargar_resultados_previos(self) -> Dict[str, Any]:
+        artefacto = cargar_artefacto(self.dir_artefacto)
+        self.modelo = artefacto['modelo']
+        return {
+            'umbral_optimo': artefacto['umbral_optimo'],
+            'metricas_prueba': artefacto['metricas'],
+            'mejor_iteracion': artefacto.get('mejor_iteracion', self.modelo.get_best_iteration()),
+            'historial_entrenamiento': pd.read_csv(self.dir_salida / "historial_entrenamiento.csv"),
+            'historial_prueba': pd.read_csv(self.dir_salida / "historial_prueba.csv"),
+            'curva_prueba': None
+        }
+
+    def ejecutar(self):
+        print(f"\n{'='*80}")
+        print(f"{'MODELO DE DETECCIÓN DE RIESGO DE DIABETES':^80}")
+        print(f"{'='*80}\n")
+
+        # El servicio de gráficos vive toda la ejecución: las figuras se envían en cuanto existen sus datos
+        # (el historial tras el ajuste, la matriz y la curva ROC tras el umbral) y al final se espera a todas.
+        with ServicioGraficos(self.perfil_graficos) as servicio:
+            resultados = self._ejecutar_etapas(servicio)
+
+        self.instrumentacion.guardar(self.dir_salida / "traza_entrenamiento.json")
         print(f"\n[OK] Proceso completado exitosamente.")
         print(f"     Resultados guardados en: {self.dir_salida}\n")
-        
-        return metricas_prueba
+
+        return resultados['metricas_prueba']
+
+    def _ejecutar_etapas(self, servicio: ServicioGraficos) -> Dict[str, Any]:
+        manifiesto = ManifiestoEtapas(self.dir_salida / "manifiesto_etapas.json", forzar=self.forzar)
+        rutas_historial = [self.dir_salida / "historial_entrenamiento.csv", self.dir_salida / "historial_prueba.csv"]
+
+        etapa_entrenamiento = manifiesto.comprobar(
+            "entrenamiento",
+            entradas=self._fuentes_datos() + self._fuentes_codigo(),
+            # cache_pools cuenta: con más de 200 000 filas los bordes del pool cuantizado (todas las filas)
+            # no son los que fit calcula sobre una submuestra, así que el modelo puede cambiar.
+            configuracion=asdict(self.config),
+            salidas=archivos_artefacto(self.dir_artefacto) + rutas_historial,
+        )
+        if etapa_entrenamiento.vigente:
+            with self.instrumentacion.etapa("carga_resultados"):
+                resultados = self._cargar_resultados_previos()
+        else:
+            # Huella de los datos de entrenamiento y prueba (entradas de la etapa que no son código), para el artefacto.
+            datos = {clave: huella for clave, huella in etapa_entrenamiento.entradas.items() if not clave.endswith(".py")}
+            with self.instrumentacion.etapa("entrenamiento"):
+                resultados = self._ejecutar_entrenamiento(servicio, huella_configuracion(datos))
+            manifiesto.registrar(etapa_entrenamiento)
+
+        etapa_graficos = manifiesto.comprobar(
+            "graficos",
+            entradas=archivos_artefacto(self.dir_artefacto) + self._fuentes_codigo() + rutas_historial + self._fuentes_datos(("test",)),
+            configuracion={"perfil_graficos": self.perfil_graficos},
+            salidas=[self.dir_salida / nombre for nombre in (
+                "evolucion_entrenamiento.png", "evolucion_prueba.png", "matriz_confusion.png", "curva_roc_prueba.png"
+            )],
+        )
+        if etapa_entrenamiento.vigente and not etapa_graficos.vigente:
+            if resultados['curva_prueba'] is None:
+                with self.instrumentacion.etapa("prediccion_prueba"):
+                    df_prueba = self._leer_particion("test")
+                    y_proba_prueba = self.modelo.predict_proba(
+                        df_prueba.drop(COLUMNA_OBJETIVO, axis=1), thread_count=hilos_prediccion(self.perfil_rendimiento) or self.n_trabajos
+                    )[:, 1]
+                    resultados['curva_prueba'] = curva_confusion(df_prueba[COLUMNA_OBJETIVO], y_proba_prueba)
+            print(f"[*] Generando visualizaciones...")
+            self.generar_graficos(
+                servicio, resultados['historial_entrenamiento'], resultados['historial_prueba'], resultados['mejor_iteracion'],
+                resultados['metricas_prueba'], resultados['curva_prueba'], resultados['umbral_optimo']
+            )
+        if not etapa_entrenamiento.vigente or not etapa_graficos.vigente:
+            # Tras un entrenamiento las figuras ya se enviaron durante la etapa; aquí solo se espera a que terminen.
+            with self.instrumentacion.etapa("graficos"):
+                servicio.esperar()
+            manifiesto.registrar(etapa_graficos)
+        return resultados
 
 if __name__ == "__main__":
-    DetectorRiesgoDiabetes(Path(__file__).parent.parent.parent).ejecutar()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Entrenamiento del modelo de detección de riesgo de diabetes.")
+    parser.add_argument("--forzar", action="store_true",
+                        help="Reentrena y regenera las gráficas aunque los datos y la configuración no hayan cambiado.")
+    parser.add_argument("--perfil-graficos", choices=sorted(PERFILES), default="completo",
+                        help="'rapido' dibuja a menor resolución, con series diezmadas y sin anotaciones por punto.")
+    parser.add_argument("--bootstrap", type=int, default=0, metavar="N",
+                        help="Calcula intervalos de confianza del 95%% con N réplicas de bootstrap de Poisson.")
+    parser.add_argument("--paciencia", type=int, default=None, metavar="N",
+                        help="Detiene el ajuste tras N iteraciones sin mejorar el AUC de prueba.")
+    parser.add_argument("--desde-archivos", action="store_true",
+                        help="CatBoost lee las particiones directamente de archivo (con un .cd generado), sin DataFrames.")
+    parser.add_argument("--sin-cache-pools", action="store_true",
+                        help="Cuantiza el entrenamiento en cada ajuste en lugar de reutilizar dataset/cache/pools.")
+    parser.add_argument("--instrumentar", action="store_true",
+                        help="Mide tiempo, CPU y pico de memoria por etapa y los guarda en resultados/traza_entrenamiento.json.")
+    args = parser.parse_args()
+    
+    config = ConfiguracionModelo(replicas_bootstrap=args.bootstrap, cache_pools=not args.sin_cache_pools,
+                                 desde_archivos=args.desde_archivos, paciencia=args.paciencia)
+    DetectorRiesgoDiabetes(Path(__file__).parent.parent.parent, config, forzar=args.forzar, perfil_graficos=args.perfil_graficos,
+                           instrumentar=args.instrumentar or None).ejecutar()
@@ -1,31 +1,26 @@
-import joblib
+import sys
+import argparse
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 from pathlib import Path
+from typing import Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from comun.artefacto import archivos_artefacto, cargar_artefacto, localizar_artefacto
+from comun.cache_etapas import ManifiestoEtapas, fuentes_comun
+from comun.graficos import PERFILES, PerfilGraficos, ServicioGraficos
+from comun.instrumentacion import Instrumentacion
 
 # 1. Configuración de rutas (Ajusta si tu carpeta 'resultados' está en otro lado)
 BASE_DIR = Path(__file__).parent.parent.parent # Misma lógica que tu script original
-RUTA_MODELO = BASE_DIR / "resultados" / "modelo.pkl"
+RUTA_RESULTADOS = BASE_DIR / "resultados"
 RUTA_SALIDA = BASE_DIR / "resultados" / "Figura6_Feature_Importance.png"
+RUTA_MANIFIESTO = BASE_DIR / "resultados" / "manifiesto_etapas.json"
+RUTA_TRAZA = BASE_DIR / "resultados" / "traza_importancia.json"
 
-def generar_grafico_importancia():
-    print(f"[*] Buscando modelo en: {RUTA_MODELO}")
-    
-    if not RUTA_MODELO.exists():
-        print("[!] Error: No encuentro el archivo modelo.pkl. Verifica la ruta.")
-        return
-
-    # 2. Cargar el diccionario guardado
-    datos_guardados = joblib.load(RUTA_MODELO)
-    modelo = datos_guardados['modelo']
-    nombres_cols = datos_guardados['nombres_caracteristicas'] # Tu script original guardó esto, ¡genial!
-
-    # 3. Calcular importancia
-    importancia = modelo.get_feature_importance()
+def graficar_importancia(perfil: PerfilGraficos, ruta: str, importancia: np.ndarray, nombres_cols):
     indices = np.argsort(importancia)
-
-    # 4. Graficar con estilo profesional
     plt.figure(figsize=(12, 8))
     
     # Barra horizontal
@@ -41,11 +36,49 @@ def generar_grafico_importancia():
     plt.tight_layout()
     
     # 5. Guardar
-    plt.savefig(RUTA_SALIDA, dpi=300, bbox_inches='tight')
-    plt.close()
+    plt.savefig(ruta, dpi=perfil.dpi, bbox_inches='tight')
+
+def generar_grafico_importancia(forzar: bool = False, perfil: str = "completo", instrumentar: Optional[bool] = None):
+    print(f"[*] Buscando modelo en: {RUTA_RESULTADOS}")
+    
+    try:
+        ruta_modelo = localizar_artefacto(RUTA_RESULTADOS)
+    except FileNotFoundError:
+        print("[!] Error: No encuentro el modelo (resultados/modelo/ ni modelo.pkl). Verifica la ruta.")
+        return
+
+    manifiesto = ManifiestoEtapas(RUTA_MANIFIESTO, forzar=forzar)
+    etapa = manifiesto.comprobar("importancia", entradas=archivos_artefacto(ruta_modelo) + [Path(__file__)] + fuentes_comun(), configuracion={"perfil_graficos": perfil}, salidas=[RUTA_SALIDA])
+    if etapa.vigente:
+        return
+
+    instrumentacion = Instrumentacion("importancia", instrumentar)
+
+    # 2. Cargar el diccionario guardado
+    with instrumentacion.etapa("carga_modelo"):
+        datos_guardados = cargar_artefacto(ruta_modelo)
+        modelo = datos_guardados['modelo']
+        nombres_cols = datos_guardados['nombres_caracteristicas'] # Tu script original guardó esto, ¡genial!
+
+    # 3. Calcular importancia
+    with instrumentacion.etapa("importancia"):
+        importancia = modelo.get_feature_importance()
+
+    # 4. Graficar con estilo profesional (una sola figura: no compensa lanzar el pool)
+    with instrumentacion.etapa("grafico"), ServicioGraficos(perfil, procesos=0) as servicio:
+        servicio.enviar(graficar_importancia, RUTA_SALIDA, importancia, list(nombres_cols))
+    manifiesto.registrar(etapa)
+    instrumentacion.guardar(RUTA_TRAZA)
     
     print(f"[OK] ¡Figura 6 generada exitosamente!")
     print(f"     Guardada en: {RUTA_SALIDA}")
 
 if __name__ == "__main__":
-    generar_grafico_importancia()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Gráfico de importancia de variables del modelo entrenado.")
+    parser.add_argument("--forzar", action="store_true", help="Regenera la figura aunque el modelo no haya cambiado.")
+    parser.add_argument("--perfil-graficos", choices=sorted(PERFILES), default="completo",
+                        help="'rapido' dibuja a menor resolución.")
+    parser.add_argument("--instrumentar", action="store_true",
+                        help="Mide tiempo, CPU y pico de memoria por etapa y los guarda en resultados/traza_importancia.json.")
+    args = parser.parse_args()
+    generar_grafico_importancia(forzar=args.forzar, perfil=args.perfil_graficos, instrumentar=args.instrumentar or None)
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+import sys
+import json
+import argparse
+import subprocess
+import numpy as np
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from comun.artefacto import ARCHIVO_LEGADO, CARPETA_ARTEFACTO, archivos_artefacto, convertir_legado
+
+RUTA_BASE = Path(__file__).resolve().parent.parent.parent
+CARPETA_SCRIPTS = Path(__file__).resolve().parent.parent
+
+# Se ejecuta en un intérprete nuevo para medir la carga en frío: incluye importar CatBoost (o joblib)
+# y dejar el modelo listo para predecir, pero no el arranque del propio intérprete.
+CODIGO_MEDICION = """
+import sys, time, json
+inicio = time.perf_counter()
+sys.path.insert(0, {scripts!r})
+from comun.artefacto import cargar_artefacto, leer_metadatos
+if {modo!r} == "importar":
+    import catboost
+elif {modo!r} == "metadatos":
+    umbral = leer_metadatos({ruta!r})["umbral_optimo"]
+elif {modo!r} == "numpy":
+    umbral = cargar_artefacto({ruta!r}, motor="numpy")["umbral_optimo"]
+    assert "catboost" not in sys.modules
+else:
+    umbral = cargar_artefacto({ruta!r})["umbral_optimo"]
+print(json.dumps({{"segundos": time.perf_counter() - inicio}}))
+"""
+
+
+def medir_carga(ruta: Path, repeticiones: int, modo: str = "completo") -> List[float]:
+    """Segundos de ``repeticiones`` cargas en procesos nuevos; ``modo`` es 'completo', 'numpy', 'metadatos' o 'importar'."""
+    codigo = CODIGO_MEDICION.format(scripts=str(CARPETA_SCRIPTS), ruta=str(ruta), modo=modo)
+    tiempos = []
+    for _ in range(repeticiones):
+        salida = subprocess.run([sys.executable, "-c", codigo], capture_output=True, text=True, check=True).stdout
+        tiempos.append(json.loads(salida.strip().splitlines()[-1])["segundos"])
+    return tiempos
+
+
+def ejecutar_comparacion(ruta_base: Path = RUTA_BASE, repeticiones: int = 5, convertir: bool = False) -> Dict[str, Dict]:
+    dir_resultados = ruta_base / "resultados"
+    legado, nativo = dir_resultados / ARCHIVO_LEGADO, dir_resultados / CARPETA_ARTEFACTO
+    if convertir and legado.exists():
+        convertir_legado(legado, nativo)
+        print(f"[*] {legado} convertido a {nativo}/")
+
+    # 'import catboost' es un suelo común a los dos formatos completos: el resto es la carga del modelo.
+    casos = {
+        "pickle legado": (legado, "completo"),
+        "nativo (cbm + json)": (nativo, "completo"),
+        "nativo con NumPy": (nativo, "numpy"),
+        "solo metadatos": (nativo, "metadatos"),
+        "solo import catboost": (nativo, "importar"),
+    }
+    print(f"[*] Carga en frío, {repeticiones} procesos nuevos por caso:")
+    resultados = {}
+    for nombre, (ruta, modo) in casos.items():
+        archivos = [a for a in archivos_artefacto(ruta) if a.exists()]
+        if not archivos:
+            print(f"    > {nombre:<22} no existe {ruta}")
+            continue
+        tiempos = medir_carga(ruta, repeticiones, modo)
+        tamano = sum(a.stat().st_size for a in archivos) if modo != "importar" else 0
+        resultados[nombre] = {"mediana_s": float(np.median(tiempos)), "minimo_s": min(tiempos), "bytes": tamano}
+        print(f"    > {nombre:<22} mediana {np.median(tiempos) * 1000:8.1f} ms | mínimo {min(tiempos) * 1000:8.1f} ms | "
+              f"{tamano / 1e6:6.2f} MB en disco")
+    return resultados
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara el tiempo de carga en frío del modelo.pkl legado y del artefacto nativo.")
+    parser.add_argument("--repeticiones", type=int, default=5, help="Procesos nuevos por formato.")
+    parser.add_argument("--convertir", action="store_true",
+                        help="Antes de medir, reescribe resultados/modelo.pkl como resultados/modelo/.")
+    args = parser.parse_args()
+    ejecutar_comparacion(repeticiones=args.repeticiones, convertir=args.convertir)
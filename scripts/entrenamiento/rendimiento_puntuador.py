@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from autoajuste_rendimiento import LOTES, medir
+from comun.artefacto import cargar_artefacto
+from comun.concurrencia import nucleos_disponibles
+from entrenamiento import DetectorRiesgoDiabetes
+
+RUTA_BASE = Path(__file__).resolve().parent.parent.parent
+
+# Diferencia máxima admitida entre las probabilidades de CatBoost y las del evaluador NumPy.
+TOLERANCIA_PROBABILIDAD = 1e-9
+
+
+def comparar_probabilidades(nativo, numpy_, X: pd.DataFrame) -> float:
+    diferencia = float(np.max(np.abs(nativo.predict_proba(X)[:, 1] - numpy_.predict_proba(X)[:, 1])))
+    if diferencia > TOLERANCIA_PROBABILIDAD:
+        raise AssertionError(f"El evaluador NumPy difiere de CatBoost en {diferencia:.3g} (> {TOLERANCIA_PROBABILIDAD}).")
+    return diferencia
+
+
+def ejecutar_comparacion(ruta_base: Path = RUTA_BASE, lotes: List[int] = LOTES, repeticiones: int = 3) -> Dict[str, Dict]:
+    nativo = cargar_artefacto(ruta_base / "resultados", motor="catboost")
+    numpy_ = cargar_artefacto(ruta_base / "resultados", motor="numpy")
+    nombres = nativo["nombres_caracteristicas"]
+
+    _, _, X_prueba, _ = DetectorRiesgoDiabetes(ruta_base, verbosidad=0).cargar_datos()
+    X_prueba = X_prueba[nombres]
+    diferencia = comparar_probabilidades(nativo["modelo"], numpy_["modelo"], X_prueba)
+    print(f"[*] {len(X_prueba):,} filas de prueba | {nativo['modelo'].tree_count_} árboles | "
+          f"diferencia máxima de probabilidad {diferencia:.2e}")
+
+    nucleos = nucleos_disponibles()
+    predictores = {"catboost 1 hilo": lambda lote: nativo["modelo"].predict_proba(lote, thread_count=1)}
+    if nucleos > 1:
+        predictores[f"catboost {nucleos} hilos"] = lambda lote: nativo["modelo"].predict_proba(lote, thread_count=nucleos)
+    predictores["numpy"] = numpy_["modelo"].predict_proba
+
+    resultados = {}
+    for tamano in lotes:
+        repeticion = int(np.ceil(tamano / len(X_prueba)))
+        lote = (pd.concat([X_prueba] * repeticion, ignore_index=True) if repeticion > 1 else X_prueba).iloc[:tamano]
+        # Las dos entradas habituales: un DataFrame (app) y una matriz float32 ya preparada (lotes grandes).
+        matriz = lote.to_numpy(dtype=np.float32)
+        resultados[str(tamano)] = {}
+        for nombre, predecir in predictores.items():
+            for entrada, datos in (("DataFrame", lote), ("float32", matriz)):
+                segundos = medir(lambda: predecir(datos), repeticiones)
+                resultados[str(tamano)][f"{nombre} ({entrada})"] = tamano / segundos
+                print(f"    > lote={tamano:<7} {nombre:<18} {entrada:<9} {tamano / segundos:12,.0f} filas/s | "
+                      f"{segundos * 1000:9.3f} ms por lote")
+    return resultados
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara el rendimiento de predict_proba de CatBoost con el evaluador NumPy.")
+    parser.add_argument("--lotes", type=int, nargs="+", default=LOTES, help="Tamaños de lote de predicción.")
+    parser.add_argument("--repeticiones", type=int, default=3, help="Rondas por medición; se conserva la más rápida.")
+    args = parser.parse_args()
+    ejecutar_comparacion(lotes=args.lotes, repeticiones=args.repeticiones)
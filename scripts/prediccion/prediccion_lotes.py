@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from collections import deque
+from pathlib import Path
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from comun.artefacto import MOTORES, cargar_artefacto, leer_metadatos
+from comun.cache_predicciones import CachePredicciones
+from comun.concurrencia import limitar_nucleos, repartir_nucleos
+from comun.esquema import ESQUEMA, POR_DESTINO, TIPO_LECTURA, contar_motivos, describir_motivos, reglas_validacion, validar_filas
+from comun.instrumentacion import Instrumentacion
+from comun.memoria import memoria_pico_mb
+from comun.perfil_rendimiento import cargar_perfil, hilos_prediccion, tamano_lote
+
+RUTA_BASE = Path(__file__).resolve().parent.parent.parent
+RUTA_MODELO = RUTA_BASE / "resultados"
+RUTA_TRAZA = RUTA_BASE / "resultados" / "traza_prediccion.json"
+
+# Filas por bloque leído del CSV y enviado a un trabajador si no hay perfil de rendimiento: lo bastante
+# grande para que el envío entre procesos y la escritura no dominen, y lo bastante pequeño para acotar la memoria.
+FILAS_POR_BLOQUE = 65_536
+
+# Bloques en vuelo por trabajador: uno puntuándose y otro esperando, para que nunca se queden sin
+# trabajo mientras el proceso principal lee o escribe. La memoria queda acotada a unos
+# ``procesos × BLOQUES_POR_PROCESO`` bloques, sea cual sea el tamaño del archivo.
+BLOQUES_POR_PROCESO = 2
+
+# Cada cuántos segundos se informa del avance.
+SEGUNDOS_ENTRE_AVISOS = 5.0
+
+COLUMNA_PROBABILIDAD = "probabilidad"
+COLUMNA_RIESGO = "riesgo_alto"
+COLUMNA_INCIDENCIAS = "incidencias"
+
+ORIGEN_POR_DESTINO: Dict[str, str] = {c.destino: c.origen for c in ESQUEMA}
+
+
+def resolver_columnas(cabecera: Sequence[str], nombres: Sequence[str]) -> Dict[str, str]:
+    """Columna del CSV que corresponde a cada característica del modelo.
+
+    Se aceptan los nombres del modelo o los originales del BRFSS (``BMI``, ``Age``...); si falta
+    alguna característica se lanza ``ValueError`` con todas las que faltan.
+    """
+    cabecera = set(cabecera)
+    columnas, faltan = {}, []
+    for nombre in nombres:
+        if nombre in cabecera:
+            columnas[nombre] = nombre
+        elif ORIGEN_POR_DESTINO.get(nombre) in cabecera:
+            columnas[nombre] = ORIGEN_POR_DESTINO[nombre]
+        else:
+            faltan.append(nombre)
+    if faltan:
+        raise ValueError(f"Faltan columnas del modelo en el archivo de entrada: {', '.join(faltan)}.")
+    return columnas
+
+
+# Estado de cada proceso trabajador: el modelo se carga una sola vez por proceso.
+_MODELO = None
+_OPCIONES: Dict = {}
+
+
+def _cargar_modelo(ruta_modelo: Path, motor: str, hilos: int, cache: int):
+    global _MODELO, _OPCIONES
+    _MODELO = cargar_artefacto(ruta_modelo, motor=motor)["modelo"]
+    if cache:
+        _MODELO = CachePredicciones(_MODELO, capacidad=cache)
+    _OPCIONES = {"thread_count": hilos}
+
+
+def _inicializar_trabajador(ruta_modelo: Path, motor: str, hilos: int, cache: int):
+    # Solo en los procesos del pool: en el proceso principal limitar_nucleos cambiaría su entorno para siempre.
+    limitar_nucleos(hilos)
+    _cargar_modelo(ruta_modelo, motor, hilos, cache)
+
+
+def puntuar_bloque(matriz: np.ndarray) -> np.ndarray:
+    """Probabilidad de la clase positiva para una matriz float32 con las columnas en el orden del modelo."""
+    return _MODELO.predict_proba(matriz, **_OPCIONES)[:, 1]
+
+
+class EscritorCSV:
+    """Escribe un CSV bloque a bloque. Con pyarrow instalado usa su escritor, unas cuatro veces más
+    rápido que ``DataFrame.to_csv`` al formatear las probabilidades (entrecomilla los textos); si no,
+    el de pandas. ``tipos`` fija de antemano el nombre y el tipo de cada columna (alias de arrow:
+    ``"string"``, ``"float64"``...), para que un bloque con una columna toda nula no cambie el esquema.
+    """
+
+    def __init__(self, ruta: Path, tipos: Dict[str, str]):
+        try:
+            import pyarrow
+            import pyarrow.csv
+        except ImportError:
+            self._arrow = None
+            self._archivo = open(ruta, "w", newline="", encoding="utf-8")
+        else:
+            self._arrow = (pyarrow, pyarrow.csv)
+            self._archivo = open(ruta, "wb")
+            self._esquema = pyarrow.schema([(nombre, pyarrow.type_for_alias(tipo)) for nombre, tipo in tipos.items()])
+        self._columnas = list(tipos)
+        self._escritor = None
+        self._primero = True
+
+    def escribir(self, df: pd.DataFrame):
+        if self._arrow is None:
+            df[self._columnas].to_csv(self._archivo, header=self._primero, index=False)
+        else:
+            pa, csv = self._arrow
+            tabla = pa.Table.from_pandas(df, schema=self._esquema, preserve_index=False).replace_schema_metadata(None)
+            if self._escritor is None:
+                self._escritor = csv.CSVWriter(self._archivo, tabla.schema)
+            self._escritor.write_table(tabla)
+        self._primero = False
+
+    def cerrar(self):
+        if self._escritor is not None:
+            self._escritor.close()
+        self._archivo.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        self.cerrar()
+
+
+def _resuelto(valor) -> Future:
+    futuro = Future()
+    futuro.set_result(valor)
+    return futuro
+
+
+def predecir_archivo(entrada: Path, salida: Path, ruta_modelo: Path = RUTA_MODELO, motor: str = "catboost",
+                     procesos: Optional[int] = None, hilos: Optional[int] = None,
+                     filas_por_bloque: Optional[int] = None, conservar: Sequence[str] = (),
+                     cache: int = 0, instrumentar: Optional[bool] = None) -> Dict:
+    """Puntúa ``entrada`` por bloques y escribe ``salida`` con las columnas conservadas, la probabilidad,
+    la clase según ``umbral_optimo`` y las incidencias de validación de cada fila, en el orden de entrada.
+
+    Los bloques se reparten entre ``procesos`` trabajadores que cargan el modelo una vez. Las filas
+    que no pasan la validación del esquema (nulos, fuera de rango, no enteros) no se puntúan: quedan
+    sin probabilidad ni clase y con sus motivos en ``incidencias``. La salida se escribe en un
+    temporal que solo sustituye a ``salida`` si se completa.
+
+    Sin ``filas_por_bloque`` ni ``hilos`` se usan el tamaño de lote y los hilos de predicción de
+    ``resultados/perfil_rendimiento.json``, si se midió en esta máquina (``FILAS_POR_BLOQUE`` y 1 si no).
+    """
+    if filas_por_bloque is None or hilos is None:
+        perfil = cargar_perfil(RUTA_BASE)
+        if filas_por_bloque is None:
+            filas_por_bloque = tamano_lote(perfil) or FILAS_POR_BLOQUE
+        if hilos is None:
+            hilos = hilos_prediccion(perfil) or 1
+    if filas_por_bloque < 1:
+        raise ValueError("filas_por_bloque debe ser al menos 1.")
+    instrumentacion = Instrumentacion("prediccion", instrumentar)
+    metadatos = leer_metadatos(ruta_modelo)
+    nombres: List[str] = list(metadatos["nombres_caracteristicas"])
+    umbral = float(metadatos["umbral_optimo"])
+
+    cabecera = pd.read_csv(entrada, nrows=0).columns
+    columnas = resolver_columnas(cabecera, nombres)
+    faltan = [c for c in conservar if c not in cabecera]
+    if faltan:
+        raise ValueError(f"Las columnas a conservar no están en el archivo de entrada: {', '.join(faltan)}.")
+    reglas = reglas_validacion([n for n in nombres if n in POR_DESTINO])
+    tipos = {origen: TIPO_LECTURA for origen in columnas.values()}
+    # Las columnas conservadas que no son características se copian tal cual, como texto.
+    tipos.update({c: str for c in conservar if c not in tipos})
+
+    procesos, hilos = repartir_nucleos(sys.maxsize, procesos, hilos)
+    print(f"[*] Prediciendo {entrada} con {ruta_modelo} (motor {motor}, umbral {umbral:.4f})")
+    print(f"    > {procesos} procesos × {hilos} hilos | bloques de {filas_por_bloque:,} filas"
+          + (f" | caché de {cache:,} intervalos por proceso" if cache else ""))
+
+    salida = Path(salida)
+    salida.parent.mkdir(parents=True, exist_ok=True)
+    temporal = salida.with_name(f"{salida.name}.{os.getpid()}.tmp")
+    filas = no_validas = 0
+    conteos = {r.codigo: 0 for r in reglas}
+    inicio = ultimo_aviso = time.perf_counter()
+    pool = ProcessPoolExecutor(max_workers=procesos, initializer=_inicializar_trabajador,
+                               initargs=(ruta_modelo, motor, hilos, cache)) if procesos > 1 else None
+    if pool is None:
+        with instrumentacion.etapa("carga_modelo"):
+            _cargar_modelo(ruta_modelo, motor, hilos, cache)
+    en_vuelo: "deque[Tuple[pd.DataFrame, np.ndarray, Future]]" = deque()
+
+    def escribir_siguiente(escritor: EscritorCSV):
+        nonlocal filas
+        base, mascaras, futuro = en_vuelo.popleft()
+        with instrumentacion.etapa("espera_prediccion"):
+            probabilidades = futuro.result()
+        with instrumentacion.etapa("escritura"):
+            validas = mascaras == 0
+            probabilidades[~validas] = np.nan
+            base[COLUMNA_PROBABILIDAD] = probabilidades
+            # Misma regla que la aplicación: riesgo alto si la probabilidad alcanza el umbral.
+            base[COLUMNA_RIESGO] = pd.arrays.IntegerArray((probabilidades >= umbral).astype(np.int8), mask=~validas)
+            base[COLUMNA_INCIDENCIAS] = describir_motivos(mascaras, reglas)
+            escritor.escribir(base)
+        filas += len(base)
+
+    try:
+        # Esquema de salida fijo: las columnas conservadas con el tipo con que se leen.
+        tipos_salida = {c: "string" if tipos[c] is str else TIPO_LECTURA for c in conservar}
+        tipos_salida.update({COLUMNA_PROBABILIDAD: "float64", COLUMNA_RIESGO: "int8", COLUMNA_INCIDENCIAS: "string"})
+        with EscritorCSV(temporal, tipos_salida) as escritor:
+            lector = pd.read_csv(entrada, usecols=list(tipos), dtype=tipos, chunksize=filas_por_bloque)
+            while True:
+                with instrumentacion.etapa("lectura"):
+                    bloque = next(lector, None)
+                if bloque is None:
+                    break
+                if bloque.empty:
+                    continue
+                with instrumentacion.etapa("validacion"):
+                    caracteristicas = bloque[[columnas[n] for n in nombres]].set_axis(nombres, axis=1)
+                    mascaras = validar_filas(caracteristicas, reglas)
+                    if mascaras.any():
+                        no_validas += int(np.count_nonzero(mascaras))
+                        for codigo, n in contar_motivos(mascaras, reglas).items():
+                            conteos[codigo] += n
+                    matriz = caracteristicas.to_numpy(dtype=np.float32)
+                    base = bloque[list(conservar)]
+                if pool is None:
+                    with instrumentacion.etapa("prediccion"):
+                        en_vuelo.append((base, mascaras, _resuelto(puntuar_bloque(matriz))))
+                else:
+                    en_vuelo.append((base, mascaras, pool.submit(puntuar_bloque, matriz)))
+                del bloque, caracteristicas, matriz
+
+                # Se escribe en orden: se espera al bloque más antiguo solo cuando la ventana está llena.
+                while len(en_vuelo) >= procesos * BLOQUES_POR_PROCESO or (pool is None and en_vuelo):
+                    escribir_siguiente(escritor)
+                ahora = time.perf_counter()
+                if ahora - ultimo_aviso >= SEGUNDOS_ENTRE_AVISOS:
+                    ultimo_aviso = ahora
+                    print(f"    > {filas:,} filas escritas | {filas / (ahora - inicio):,.0f} filas/s | "
+                          f"pico de memoria {memoria_pico_mb():.0f} MB")
+            while en_vuelo:
+                escribir_siguiente(escritor)
+            if filas == 0:
+                # Archivo sin filas: la salida lleva al menos la cabecera.
+                escritor.escribir(pd.DataFrame(columns=list(tipos_salida)))
+        os.replace(temporal, salida)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        if temporal.exists():
+            temporal.unlink()
+
+    segundos = time.perf_counter() - inicio
+    resumen = {
+        "filas": filas,
+        "no_validas": no_validas,
+        "segundos": segundos,
+        "filas_por_segundo": filas / segundos if segundos else 0.0,
+        "procesos": procesos,
+        "hilos": hilos,
+        "motor": motor,
+        "pico_memoria_mb": memoria_pico_mb(),
+    }
+    instrumentacion.anotar("prediccion", resumen)
+    print(f"[OK] {filas:,} filas en {segundos:.2f} s ({resumen['filas_por_segundo']:,.0f} filas/s), "
+          f"pico de memoria {resumen['pico_memoria_mb']:.0f} MB")
+    if no_validas:
+        detalle = ", ".join(f"{codigo}={n:,}" for codigo, n in conteos.items() if n)
+        print(f"    > {no_validas:,} filas no válidas sin puntuar ({detalle})")
+    print(f"[OK] Predicciones guardadas en: {salida}")
+    instrumentacion.guardar(RUTA_TRAZA)
+    return resumen
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Predicción por lotes de un CSV de pacientes, en streaming y con varios procesos.")
+    parser.add_argument("entrada", type=Path, help="CSV con las características del modelo (nombres del modelo o del BRFSS).")
+    parser.add_argument("salida", type=Path, help="CSV de salida con probabilidad, clase e incidencias por fila.")
+    parser.add_argument("--modelo", type=Path, default=RUTA_MODELO,
+                        help="Carpeta de resultados, carpeta del artefacto o modelo.pkl (por defecto resultados/).")
+    parser.add_argument("--motor", choices=MOTORES, default="catboost",
+                        help="'numpy' evalúa los árboles sin CatBoost; con lotes grandes CatBoost es más rápido.")
+    parser.add_argument("--procesos", type=int, default=None, help="Trabajadores (por defecto, uno por núcleo).")
+    parser.add_argument("--hilos", type=int, default=None,
+                        help="thread_count de CatBoost en cada trabajador (por defecto, el del perfil de rendimiento o 1).")
+    parser.add_argument("--filas-por-bloque", type=int, default=None,
+                        help=f"Filas leídas y puntuadas a la vez (por defecto, el lote del perfil de rendimiento o {FILAS_POR_BLOQUE:,}).")
+    parser.add_argument("--conservar", nargs="+", default=[], help="Columnas de entrada que se copian a la salida (p. ej. un identificador).")
+    parser.add_argument("--cache", type=int, default=0, metavar="ENTRADAS",
+                        help="Memoriza probabilidades por intervalo de bordes (CachePredicciones) con esta capacidad por proceso.")
+    parser.add_argument("--instrumentar", action="store_true",
+                        help="Mide tiempo, CPU y pico de memoria por etapa y los guarda en resultados/traza_prediccion.json.")
+    args = parser.parse_args()
+    predecir_archivo(args.entrada, args.salida, ruta_modelo=args.modelo, motor=args.motor, procesos=args.procesos,
+                     hilos=args.hilos, filas_por_bloque=args.filas_por_bloque, conservar=args.conservar,
+                     cache=args.cache, instrumentar=args.instrumentar or None)
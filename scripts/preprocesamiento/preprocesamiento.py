@@ -1,9 +1,28 @@
 import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from sklearn.model_selection import train_test_split
-from dataclasses import dataclass
-from typing import Dict
+from pathlib import Path
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from comun.cache_etapas import ManifiestoEtapas, fuentes_comun
+from comun.columnar import ARCHIVO_META, EscritorColumnar, cargar_columnas, guardar_particion, materializar
+from comun.estadisticas import EstadisticasColumna
+from comun.graficos import PERFILES, PerfilGraficos, ServicioGraficos
+from comun.instrumentacion import Instrumentacion
+from comun.esquema import (
+    COLUMNA_CONTEO, COLUMNA_OBJETIVO, COLUMNAS_MODELO, MAPEO_COLUMNAS, POR_DESTINO,
+    aplicar_tipos, columnas_lectura, contar_motivos, describir_motivos, motor_lectura,
+    reglas_validacion, tipos_lectura, validar_filas,
+)
 
 @dataclass
 class ConfiguracionPreprocesamiento:
@@ -11,102 +30,354 @@ class ConfiguracionPreprocesamiento:
     archivo_salida_completo: str = "dataset/modificado.csv"
     archivo_train: str = "dataset/train.csv"
     archivo_test: str = "dataset/test.csv"
+    archivo_train_colapsado: str = "dataset/train_colapsado.csv"
+    carpeta_cache: Optional[str] = "dataset/cache"
+    carpeta_particiones: str = "dataset/particiones"
+    archivo_resumen: str = "dataset/resumen_columnas.json"
+    archivo_cuarentena: str = "dataset/cuarentena.csv"
     carpeta_informe: str = "dataset/informe"
     nombre_informe_html: str = "informe_preprocesamiento.html"
+    archivo_manifiesto: str = "dataset/manifiesto_etapas.json"
+    archivo_traza: str = "dataset/traza_preprocesamiento.json"
     test_size: float = 0.2
     random_state: int = 42
+    tamano_bloque: Optional[int] = None
+    semillas_adicionales: Tuple[int, ...] = ()
+    k_pliegues: int = 0
+    exportar_csv: bool = False
+    colapsar_duplicados: bool = False
+    perfil_graficos: str = "completo"
+    procesos_graficos: Optional[int] = None
+    forzar: bool = False
+    # None: decide la variable de entorno DIABETES_INSTRUMENTACION.
+    instrumentar: Optional[bool] = None
+
+# Campos que no alteran el contenido de los artefactos y por eso no forman parte de la huella de etapa.
+CAMPOS_SIN_HUELLA = ("tamano_bloque", "forzar", "archivo_manifiesto", "procesos_graficos", "archivo_traza", "instrumentar")
+
+
+def dividir_indices(y: np.ndarray, test_size: float, random_state: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Índices de entrenamiento y prueba de ``train_test_split`` estratificado, en el orden en que los devuelve.
+
+    La partición solo depende de las etiquetas, así que basta con ellas (un byte por fila) para
+    obtener exactamente la misma que al dividir el DataFrame completo.
+    """
+    return train_test_split(np.arange(len(y)), test_size=test_size, random_state=random_state, stratify=y)
+
+
+def asignar_pliegues(y: np.ndarray, k: int, semilla: int) -> np.ndarray:
+    """Pliegue estratificado (0..k-1) para cada fila de ``y``, determinista bajo ``semilla``."""
+    rng = np.random.default_rng(semilla)
+    pliegues = np.empty(len(y), dtype=np.uint8)
+    for clase in np.unique(y):
+        filas = np.flatnonzero(y == clase)
+        pliegues[filas[rng.permutation(len(filas))]] = np.arange(len(filas)) % k
+    return pliegues
+
+
+class ColapsadorDuplicados:
+    """Agrupa filas idénticas (características + etiqueta) acumulando cuántas veces aparece cada una.
+
+    Solo retiene las filas únicas, por lo que también funciona con la lectura por bloques.
+    """
+
+    def __init__(self):
+        self.conteos: Optional[pd.Series] = None
+
+    def actualizar(self, bloque: pd.DataFrame):
+        conteo = bloque.value_counts(dropna=False, sort=False)
+        self.conteos = conteo if self.conteos is None else self.conteos.add(conteo, fill_value=0)
+
+    def resultado(self) -> pd.DataFrame:
+        colapsado = self.conteos.sort_index().astype("int64").rename(COLUMNA_CONTEO).reset_index()
+        return aplicar_tipos(colapsado)
+
+
+class ResumenColumnas:
+    """Estadísticas por columna para el informe, acumuladas bloque a bloque sin retener el dataset.
+
+    Cada columna usa un ``EstadisticasColumna`` sobre el rango declarado en el esquema, de
+    modo que resúmenes de bloques o procesos distintos se pueden unir con ``combinar``.
+    """
+
+    def __init__(self):
+        self.n_filas = 0
+        self.columnas = []
+        self.tipos: Dict[str, str] = {}
+        self.estadisticas: Dict[str, EstadisticasColumna] = {}
+        self.n_cuarentena = 0
+        self.validacion: Dict[str, int] = {}
+
+    def registrar_validacion(self, conteos: Dict[str, int]):
+        for codigo, n in conteos.items():
+            self.validacion[codigo] = self.validacion.get(codigo, 0) + n
+
+    def _columna(self, col: str, tipo: str) -> EstadisticasColumna:
+        if col not in self.estadisticas:
+            self.columnas.append(col)
+            self.tipos[col] = tipo
+            self.estadisticas[col] = EstadisticasColumna(POR_DESTINO[col].minimo, POR_DESTINO[col].maximo)
+        return self.estadisticas[col]
+
+    def actualizar(self, bloque: pd.DataFrame):
+        self.n_filas += len(bloque)
+        for col in bloque.columns:
+            self._columna(col, str(bloque[col].dtype)).actualizar(bloque[col])
+
+    def combinar(self, otro: "ResumenColumnas"):
+        self.n_filas += otro.n_filas
+        self.n_cuarentena += otro.n_cuarentena
+        self.registrar_validacion(otro.validacion)
+        for col in otro.columnas:
+            self._columna(col, otro.tipos[col]).combinar(otro.estadisticas[col])
+
+    def describir(self) -> pd.DataFrame:
+        filas = {col: self.estadisticas[col].describir() for col in self.columnas}
+        return pd.DataFrame.from_dict(filas, orient="index", columns=["count", "mean", "std", "min", "25%", "50%", "75%", "max"])
+
+    def guardar(self, ruta: str):
+        datos = {
+            "n_filas": self.n_filas,
+            "columnas": self.columnas,
+            "tipos": self.tipos,
+            "n_cuarentena": self.n_cuarentena,
+            "validacion": self.validacion,
+            "estadisticas": {col: est.a_dict() for col, est in self.estadisticas.items()},
+        }
+        with open(ruta, "w", encoding="utf-8") as f:
+            json.dump(datos, f)
+
+    @classmethod
+    def cargar(cls, ruta: str) -> "ResumenColumnas":
+        with open(ruta, encoding="utf-8") as f:
+            datos = json.load(f)
+        resumen = cls()
+        resumen.n_filas = datos["n_filas"]
+        resumen.columnas = datos["columnas"]
+        resumen.tipos = datos["tipos"]
+        resumen.n_cuarentena = datos["n_cuarentena"]
+        resumen.validacion = datos["validacion"]
+        resumen.estadisticas = {col: EstadisticasColumna.desde_dict(d) for col, d in datos["estadisticas"].items()}
+        return resumen
+
+class SalidasParticion:
+    """Destinos de la partición, alimentados bloque a bloque.
+
+    El dataset completo se escribe una sola vez en el almacén columnar, con las filas de
+    entrenamiento primero y las de prueba después, cada grupo en el orden de ``train_test_split``.
+    Así la partición canónica son dos rangos contiguos, que se leen como vistas del memmap. Otras
+    semillas y los pliegues k-fold se guardan como arrays de índices. Los CSV solo se escriben si
+    se piden con ``exportar_csv``.
+
+    En memoria, cada partición llega ya ordenada y se añade al final (``agregar``). Por bloques,
+    tras ``reservar`` cada fila se escribe en su posición final (``agregar_en_posiciones``), y
+    ``train.csv``/``test.csv`` se exportan al cerrar desde el almacén.
+    """
+
+    def __init__(self, config: ConfiguracionPreprocesamiento):
+        self.config = config
+        self.exportar_csv = config.exportar_csv or not config.carpeta_cache
+        self.completo = self.prueba = None
+        self.n_train: Optional[int] = None
+        if config.carpeta_cache:
+            self.completo = EscritorColumnar(os.path.join(config.carpeta_cache, "completo"))
+            self.prueba = EscritorColumnar(os.path.join(config.carpeta_cache, ".completo_prueba"))
+        self.colapsador = ColapsadorDuplicados() if config.colapsar_duplicados else None
+        self.conteo_train = pd.Series(dtype="int64", name="estado_diabetes")
+        self.conteo_test = pd.Series(dtype="int64", name="estado_diabetes")
+        self.n_bloques = 0
+        pd.DataFrame(columns=["fila"] + list(COLUMNAS_MODELO) + ["motivos"]).to_csv(
+            config.archivo_cuarentena, index=False, encoding="utf-8"
+        )
+
+    def agregar_cuarentena(self, cuarentena: Optional[pd.DataFrame]):
+        if cuarentena is not None and len(cuarentena):
+            cuarentena.to_csv(self.config.archivo_cuarentena, index=False, header=False, mode="a", encoding="utf-8")
+
+    def _opciones_csv(self) -> Dict:
+        primero = self.n_bloques == 0
+        return dict(index=False, encoding="utf-8", mode="w" if primero else "a", header=primero)
+
+    def _contar(self, train_df: pd.DataFrame, test_df: pd.DataFrame):
+        if self.colapsador is not None:
+            self.colapsador.actualizar(train_df)
+        self.conteo_train = self.conteo_train.add(train_df[COLUMNA_OBJETIVO].value_counts(), fill_value=0).astype("int64")
+        self.conteo_test = self.conteo_test.add(test_df[COLUMNA_OBJETIVO].value_counts(), fill_value=0).astype("int64")
+        self.n_bloques += 1
+
+    def agregar(self, dataset_modelo: pd.DataFrame, train_df: pd.DataFrame, test_df: pd.DataFrame):
+        if self.exportar_csv:
+            opciones = self._opciones_csv()
+            dataset_modelo.to_csv(self.config.archivo_salida_completo, **opciones)
+            train_df.to_csv(self.config.archivo_train, **opciones)
+            test_df.to_csv(self.config.archivo_test, **opciones)
+        if self.completo is not None:
+            self.completo.agregar(train_df)
+            self.prueba.agregar(test_df)
+        self._contar(train_df, test_df)
+
+    def reservar(self, columnas: List[str], n_train: int, n_test: int):
+        """Prepara la escritura por posición: ``n_train`` filas de entrenamiento seguidas de ``n_test`` de prueba.
+
+        Sin ``carpeta_cache`` el almacén va a una carpeta temporal, solo para exportar los CSV en orden.
+        """
+        if self.completo is None:
+            self.completo = EscritorColumnar(tempfile.mkdtemp(prefix="particion_"))
+        else:
+            self.prueba.descartar()
+        self.prueba = None
+        self.n_train = n_train
+        self.completo.reservar(columnas, n_train + n_test)
+
+    def agregar_en_posiciones(self, dataset_modelo: pd.DataFrame, split_df: pd.DataFrame, posiciones: np.ndarray):
+        if self.exportar_csv:
+            dataset_modelo.to_csv(self.config.archivo_salida_completo, **self._opciones_csv())
+        self.completo.escribir_en(split_df, posiciones)
+        es_prueba = posiciones >= self.n_train
+        self._contar(split_df[~es_prueba], split_df[es_prueba])
+
+    def cerrar(self, n_cuarentena: int = 0):
+        if n_cuarentena:
+            print(f"⚠️ {n_cuarentena:,} filas no superaron la validación y se enviaron a: {self.config.archivo_cuarentena}")
+        if self.completo is not None:
+            n_train = self.completo.n_filas if self.n_train is None else self.n_train
+            if self.prueba is not None:
+                self.completo.concatenar(self.prueba)
+            self.completo.cerrar(extra={"particion": {"semilla": self.config.random_state, "n_train": n_train}})
+            if self.n_train is not None and self.exportar_csv:
+                self._exportar_particion_csv()
+            if self.config.carpeta_cache:
+                print(f"✅ Dataset completo preprocesado guardado en: {self.completo.carpeta}")
+                self._guardar_particiones(n_train, self.completo.n_filas)
+            else:
+                shutil.rmtree(self.completo.carpeta, ignore_errors=True)
+        if self.exportar_csv:
+            print(f"CSV exportados: {self.config.archivo_salida_completo}, {self.config.archivo_train}, {self.config.archivo_test}")
+        self._guardar_colapsado()
+
+    def _exportar_particion_csv(self):
+        """Escribe ``train.csv`` y ``test.csv`` desde el almacén ya ordenado, por tramos de ``tamano_bloque`` filas."""
+        _, columnas = cargar_columnas(self.completo.carpeta)
+        tramo = self.config.tamano_bloque or max(self.completo.n_filas, 1)
+        for ruta, inicio, fin in ((self.config.archivo_train, 0, self.n_train),
+                                  (self.config.archivo_test, self.n_train, self.completo.n_filas)):
+            pd.DataFrame(columns=self.completo.columnas).to_csv(ruta, index=False, encoding="utf-8")
+            for desde in range(inicio, fin, tramo):
+                indices = np.arange(desde, min(desde + tramo, fin))
+                materializar(columnas, indices).to_csv(ruta, index=False, header=False, mode="a", encoding="utf-8")
+
+    def _guardar_particiones(self, n_train: int, n_filas: int):
+        _, columnas = cargar_columnas(self.completo.carpeta)
+        etiquetas = np.asarray(columnas[COLUMNA_OBJETIVO])
+        k = self.config.k_pliegues
+        
+        particiones = {self.config.random_state: (np.arange(n_train), np.arange(n_train, n_filas))}
+        for semilla in self.config.semillas_adicionales:
+            particiones[semilla] = dividir_indices(etiquetas, self.config.test_size, semilla)
+        
+        for semilla, (train, test) in particiones.items():
+            pliegues = asignar_pliegues(etiquetas[train], k, semilla) if k > 1 else None
+            guardar_particion(ruta_particion(self.config, semilla), n_filas, train, test, pliegues)
+        print(f"Índices de partición guardados en: {self.config.carpeta_particiones} "
+              f"(semillas {', '.join(str(s) for s in particiones)}{f', {k} pliegues' if k > 1 else ''})")
+
+    def _guardar_colapsado(self):
+        if self.colapsador is None:
+            return
+        colapsado = self.colapsador.resultado()
+        n_filas = int(colapsado[COLUMNA_CONTEO].sum())
+        if self.exportar_csv:
+            colapsado.to_csv(self.config.archivo_train_colapsado, index=False, encoding="utf-8")
+        if self.config.carpeta_cache:
+            escritor = EscritorColumnar(os.path.join(self.config.carpeta_cache, "train_colapsado"))
+            escritor.agregar(colapsado)
+            escritor.cerrar(fuente=self.config.archivo_train_colapsado if self.exportar_csv else None)
+        print(f"Entrenamiento colapsado: {n_filas:,} filas → {len(colapsado):,} filas únicas "
+              f"({len(colapsado) / max(n_filas, 1) * 100:.1f}%)")
+
+
+def ruta_particion(config: ConfiguracionPreprocesamiento, semilla: int) -> str:
+    return os.path.join(config.carpeta_particiones, f"semilla_{semilla}.npz")
+
+
+def graficar_distribucion_objetivo(perfil: PerfilGraficos, ruta: str, frecuencias: pd.Series):
+    frec = frecuencias.sort_index()
+    total = frec.sum()
+    plt.figure()
+    frec.plot(kind="bar")
+    plt.title("Distribución de estado_diabetes (0=Sin riesgo, 1=Riesgo)")
+    plt.xlabel("estado_diabetes")
+    plt.ylabel("Cantidad de registros")
+    
+    if perfil.anotaciones:
+        for i, (idx, val) in enumerate(frec.items()):
+            porcentaje = val / total * 100
+            plt.text(i, val, f"{val}\n({porcentaje:.1f}%)", ha="center", va="bottom", fontsize=8)
+    
+    plt.tight_layout()
+    plt.savefig(ruta, dpi=perfil.dpi)
+
+
+def graficar_histograma_imc(perfil: PerfilGraficos, ruta: str, valores: np.ndarray, pesos: np.ndarray):
+    plt.figure()
+    plt.hist(valores, bins=40, weights=pesos)
+    plt.grid(True)
+    plt.title("Histograma de IMC")
+    plt.xlabel("IMC")
+    plt.ylabel("Cantidad de registros")
+    plt.tight_layout()
+    plt.savefig(ruta, dpi=perfil.dpi)
+
 
 class PreprocesadorDatos:
     def __init__(self, config: ConfiguracionPreprocesamiento):
         self.config = config
-        self.mapeo_columnas = {
-            "Diabetes_012": "estado_diabetes",
-            "HighBP": "hipertension",
-            "HighChol": "colesterol_alto",
-            "CholCheck": "chequeo_colesterol_reciente",
-            "BMI": "imc",
-            "Smoker": "fumador_historico",
-            "Stroke": "derrame_cerebral_previo",
-            "HeartDiseaseorAttack": "enfermedad_cardiaca_o_infarto",
-            "PhysActivity": "actividad_fisica_reciente",
-            "Fruits": "consumo_frutas",
-            "Veggies": "consumo_verduras",
-            "HvyAlcoholConsump": "consumo_alcohol_elevado",
-            "AnyHealthcare": "tiene_atencion_medica",
-            "NoDocbcCost": "no_fue_medico_por_costo",
-            "GenHlth": "salud_general",
-            "MentHlth": "dias_mala_salud_mental",
-            "PhysHlth": "dias_mala_salud_fisica",
-            "DiffWalk": "dificultad_caminar",
-            "Sex": "sexo",
-            "Age": "rango_edad",
-            "Education": "nivel_educativo",
-            "Income": "rango_ingresos",
-        }
-        self.columnas_modelo = [
-            "estado_diabetes",
-            "imc",
-            "rango_edad",
-            "sexo",
-            "actividad_fisica_reciente",
-            "consumo_frutas",
-            "consumo_verduras",
-            "fumador_historico",
-            "consumo_alcohol_elevado",
-            "salud_general",
-            "dias_mala_salud_fisica",
-            "dias_mala_salud_mental",
-            "dificultad_caminar",
-        ]
-
-    def generar_graficos(self, dataset: pd.DataFrame) -> Dict[str, str]:
+        self.mapeo_columnas = dict(MAPEO_COLUMNAS)
+        self.columnas_modelo = list(COLUMNAS_MODELO)
+        self.reglas = reglas_validacion(self.columnas_modelo)
+        self.instrumentacion = Instrumentacion("preprocesamiento", config.instrumentar)
+
+    def generar_graficos(self, resumen: ResumenColumnas, servicio: ServicioGraficos) -> Dict[str, str]:
+        """Envía las figuras del informe al servicio de gráficos y devuelve sus nombres de archivo."""
         rutas_imagenes = {}
         
-        if "estado_diabetes" in dataset.columns:
-            frec = dataset["estado_diabetes"].value_counts().sort_index()
-            total = frec.sum()
-            plt.figure()
-            frec.plot(kind="bar")
-            plt.title("Distribución de estado_diabetes (0=Sin riesgo, 1=Riesgo)")
-            plt.xlabel("estado_diabetes")
-            plt.ylabel("Cantidad de registros")
-            
-            for i, (idx, val) in enumerate(frec.items()):
-                porcentaje = val / total * 100
-                plt.text(i, val, f"{val}\n({porcentaje:.1f}%)", ha="center", va="bottom", fontsize=8)
-            
+        if "estado_diabetes" in resumen.estadisticas:
             nombre_img = "dist_estado_diabetes.png"
-            ruta_img = os.path.join(self.config.carpeta_informe, nombre_img)
-            plt.tight_layout()
-            plt.savefig(ruta_img, dpi=300)
-            plt.close()
+            servicio.enviar(
+                graficar_distribucion_objetivo, os.path.join(self.config.carpeta_informe, nombre_img),
+                resumen.estadisticas["estado_diabetes"].frecuencias,
+            )
             rutas_imagenes["dist_estado_diabetes"] = nombre_img
 
-        if "imc" in dataset.columns:
-            plt.figure()
-            dataset["imc"].hist(bins=40)
-            plt.title("Histograma de IMC")
-            plt.xlabel("IMC")
-            plt.ylabel("Cantidad de registros")
+        if "imc" in resumen.estadisticas:
             nombre_img = "hist_imc.png"
-            ruta_img = os.path.join(self.config.carpeta_informe, nombre_img)
-            plt.tight_layout()
-            plt.savefig(ruta_img, dpi=300)
-            plt.close()
+            servicio.enviar(
+                graficar_histograma_imc, os.path.join(self.config.carpeta_informe, nombre_img),
+                *resumen.estadisticas["imc"].distribucion(),
+            )
             rutas_imagenes["hist_imc"] = nombre_img
             
         return rutas_imagenes
 
-    def generar_informe_html(self, dataset: pd.DataFrame, rutas_imagenes: Dict[str, str]):
-        n_filas, n_columnas = dataset.shape
+    def generar_informe_html(self, resumen: ResumenColumnas, rutas_imagenes: Dict[str, str]):
+        n_filas, n_columnas = resumen.n_filas, len(resumen.columnas)
         
         df_info_vars = pd.DataFrame({
-            "variable": dataset.columns,
-            "tipo_dato": [str(dataset[col].dtype) for col in dataset.columns],
-            "valores_nulos": [dataset[col].isna().sum() for col in dataset.columns],
+            "variable": resumen.columnas,
+            "tipo_dato": [resumen.tipos[col] for col in resumen.columnas],
+            "valores_nulos": [resumen.estadisticas[col].nulos for col in resumen.columnas],
         })
         
-        desc = dataset.describe(include="all").transpose()
+        desc = resumen.describir()
+        
+        df_validacion = pd.DataFrame(
+            [{"regla": codigo, "filas_en_cuarentena": n} for codigo, n in resumen.validacion.items() if n > 0],
+            columns=["regla", "filas_en_cuarentena"],
+        )
+        if len(df_validacion):
+            tabla_validacion_html = df_validacion.to_html(index=False, classes="table table-striped", border=0)
+        else:
+            tabla_validacion_html = "<p>Todas las filas cumplieron los rangos declarados en el esquema.</p>"
         
         tabla_vars_html = df_info_vars.to_html(index=False, classes="table table-striped", border=0)
         tabla_desc_html = desc.to_html(classes="table table-striped", border=0)
@@ -133,7 +404,10 @@ class PreprocesadorDatos:
 <div class="resumen">
     <p><strong>Cantidad de registros:</strong> {n_filas}</p>
     <p><strong>Cantidad de variables:</strong> {n_columnas}</p>
+    <p><strong>Registros en cuarentena:</strong> {resumen.n_cuarentena}</p>
 </div>
+<h2>Validación de rangos</h2>
+{tabla_validacion_html}
 <h2>Variables incluidas en el modelo</h2>
 {tabla_vars_html}
 <h2>Estadísticas descriptivas</h2>
@@ -160,61 +434,243 @@ class PreprocesadorDatos:
             f.write(html)
         return ruta_html
 
-    def ejecutar(self):
-        os.makedirs(self.config.carpeta_informe, exist_ok=True)
-        
-        print(f"Cargando dataset desde: {self.config.archivo_entrada}")
-        df = pd.read_csv(self.config.archivo_entrada)
-        
+    def _opciones_lectura(self, motor: str) -> Dict:
+        return dict(usecols=columnas_lectura(), dtype=tipos_lectura(), engine=motor)
+
+    def _validar_bloque(self, df: pd.DataFrame) -> Tuple[pd.DataFrame, np.ndarray]:
+        """Renombra y selecciona las columnas del modelo y devuelve la máscara de motivos de cada fila."""
         df_es = df.rename(columns=self.mapeo_columnas)
         dataset_modelo = df_es[self.columnas_modelo].copy()
+        dataset_modelo[COLUMNA_OBJETIVO] = pd.to_numeric(dataset_modelo[COLUMNA_OBJETIVO], errors="coerce")
+        return dataset_modelo, validar_filas(dataset_modelo, self.reglas)
+
+    def _transformar_bloque(self, df: pd.DataFrame, resumen: ResumenColumnas, inicio: int = 0):
+        """Renombra, valida y binariza un bloque; devuelve las filas válidas y las de cuarentena."""
+        dataset_modelo, mascaras = self._validar_bloque(df)
+        invalidas = mascaras != 0
+        cuarentena = None
+        if invalidas.any():
+            cuarentena = dataset_modelo[invalidas]
+            cuarentena.insert(0, "fila", inicio + np.flatnonzero(invalidas))
+            cuarentena["motivos"] = describir_motivos(mascaras[invalidas], self.reglas)
+            dataset_modelo = dataset_modelo[~invalidas].copy()
+            resumen.n_cuarentena += len(cuarentena)
+            resumen.registrar_validacion(contar_motivos(mascaras[invalidas], self.reglas))
         
-        print("Binarizando 'estado_diabetes' (0 vs 1/2 → 0/1)...")
-        dataset_modelo["estado_diabetes"] = pd.to_numeric(dataset_modelo["estado_diabetes"], errors="coerce")
-        dataset_modelo["estado_diabetes"] = (dataset_modelo["estado_diabetes"] > 0).astype(int)
-        
-        print("Distribución global de 'estado_diabetes' binarizado:")
-        print(dataset_modelo["estado_diabetes"].value_counts())
+        dataset_modelo[COLUMNA_OBJETIVO] = (dataset_modelo[COLUMNA_OBJETIVO] > 0).astype(np.uint8)
+        dataset_modelo = aplicar_tipos(dataset_modelo)
+        resumen.actualizar(dataset_modelo)
+        return dataset_modelo, cuarentena
+
+    def _columnas_split(self) -> List[str]:
+        return [c for c in self.columnas_modelo if c != COLUMNA_OBJETIVO] + [COLUMNA_OBJETIVO]
+
+    def _procesar_en_memoria(self, resumen: ResumenColumnas):
+        etapa = self.instrumentacion.etapa
+        print(f"Cargando dataset desde: {self.config.archivo_entrada}")
+        with etapa("lectura"):
+            df = pd.read_csv(self.config.archivo_entrada, **self._opciones_lectura(motor_lectura()))
         
-        dataset_modelo.to_csv(self.config.archivo_salida_completo, index=False, encoding="utf-8")
-        print(f"✅ Dataset completo preprocesado guardado en: {self.config.archivo_salida_completo}")
+        print("Validando rangos y binarizando 'estado_diabetes' (0 vs 1/2 → 0/1)...")
+        salidas = SalidasParticion(self.config)
+        with etapa("validacion"):
+            dataset_modelo, cuarentena = self._transformar_bloque(df, resumen)
+        with etapa("escritura"):
+            salidas.agregar_cuarentena(cuarentena)
         
         print("\nRealizando partición train/test...")
-        X = dataset_modelo.drop(columns=["estado_diabetes"])
-        y = dataset_modelo["estado_diabetes"]
-        
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=self.config.test_size, random_state=self.config.random_state, stratify=y
+        with etapa("division"):
+            split_df = dataset_modelo[self._columnas_split()]
+            train, test = dividir_indices(split_df[COLUMNA_OBJETIVO].to_numpy(), self.config.test_size, self.config.random_state)
+            train_df, test_df = split_df.iloc[train], split_df.iloc[test]
+        with etapa("escritura"):
+            salidas.agregar(dataset_modelo, train_df, test_df)
+        with etapa("cierre"):
+            salidas.cerrar(resumen.n_cuarentena)
+        return salidas.conteo_train, salidas.conteo_test
+
+    def _leer_bloques(self):
+        lector = pd.read_csv(
+            self.config.archivo_entrada, chunksize=self.config.tamano_bloque, **self._opciones_lectura("c")
         )
+        while True:
+            # La lectura del bloque se mide aparte: el lector solo lee del CSV al pedirle el siguiente.
+            with self.instrumentacion.etapa("lectura"):
+                bloque = next(lector, None)
+            if bloque is None:
+                return
+            yield bloque
+
+    def _procesar_por_bloques(self, resumen: ResumenColumnas):
+        print(f"Leyendo dataset por bloques de {self.config.tamano_bloque:,} filas desde: {self.config.archivo_entrada}")
+        etapa = self.instrumentacion.etapa
         
-        train_df = X_train.copy()
-        train_df["estado_diabetes"] = y_train
-        test_df = X_test.copy()
-        test_df["estado_diabetes"] = y_test
+        # Primera pasada: solo se retiene la etiqueta binarizada de cada fila válida (un byte por fila),
+        # que es todo lo que necesita train_test_split para dar la misma partición que en memoria.
+        print("Primera pasada: etiquetas de las filas válidas...")
+        etiquetas = []
+        for bloque in self._leer_bloques():
+            with etapa("validacion"):
+                dataset_modelo, mascaras = self._validar_bloque(bloque)
+                etiquetas.append((dataset_modelo[COLUMNA_OBJETIVO].to_numpy()[mascaras == 0] > 0).astype(np.uint8))
         
-        train_df.to_csv(self.config.archivo_train, index=False, encoding="utf-8")
-        test_df.to_csv(self.config.archivo_test, index=False, encoding="utf-8")
+        salidas = SalidasParticion(self.config)
+        with etapa("division"):
+            etiquetas = np.concatenate(etiquetas) if etiquetas else np.empty(0, dtype=np.uint8)
+            train, test = dividir_indices(etiquetas, self.config.test_size, self.config.random_state)
+            # Posición final de cada fila válida en el almacén: entrenamiento primero, prueba después.
+            posiciones = np.empty(len(etiquetas), dtype=np.uint32)
+            posiciones[train] = np.arange(len(train))
+            posiciones[test] = len(train) + np.arange(len(test))
+            salidas.reservar(self._columnas_split(), len(train), len(test))
+            del etiquetas, train, test
         
-        print(f"Conjunto de entrenamiento guardado en: {self.config.archivo_train}")
-        print(f"Conjunto de prueba guardado en: {self.config.archivo_test}")
+        print("Segunda pasada: validando, binarizando 'estado_diabetes' (0 vs 1/2 → 0/1) y escribiendo cada fila en su partición...")
+        inicio = validas = 0
+        for bloque in self._leer_bloques():
+            with etapa("validacion"):
+                dataset_modelo, cuarentena = self._transformar_bloque(bloque, resumen, inicio)
+            with etapa("escritura"):
+                salidas.agregar_cuarentena(cuarentena)
+                destino = posiciones[validas:validas + len(dataset_modelo)]
+                salidas.agregar_en_posiciones(dataset_modelo, dataset_modelo[self._columnas_split()], destino)
+            inicio += len(bloque)
+            validas += len(dataset_modelo)
         
-        print("\nDistribución en TRAIN:")
-        print(train_df["estado_diabetes"].value_counts(normalize=True))
-        print("\nDistribución en TEST:")
-        print(test_df["estado_diabetes"].value_counts(normalize=True))
+        with etapa("cierre"):
+            salidas.cerrar(resumen.n_cuarentena)
+        return salidas.conteo_train, salidas.conteo_test
+
+    def _salidas_particion(self) -> List[str]:
+        salidas = [self.config.archivo_resumen, self.config.archivo_cuarentena]
+        exportar_csv = self.config.exportar_csv or not self.config.carpeta_cache
+        if exportar_csv:
+            salidas += [self.config.archivo_salida_completo, self.config.archivo_train, self.config.archivo_test]
+        if self.config.carpeta_cache:
+            salidas.append(os.path.join(self.config.carpeta_cache, "completo", ARCHIVO_META))
+            semillas = (self.config.random_state,) + tuple(self.config.semillas_adicionales)
+            salidas += [ruta_particion(self.config, semilla) for semilla in semillas]
+        if self.config.colapsar_duplicados:
+            if exportar_csv:
+                salidas.append(self.config.archivo_train_colapsado)
+            if self.config.carpeta_cache:
+                salidas.append(os.path.join(self.config.carpeta_cache, "train_colapsado", ARCHIVO_META))
+        return salidas
+
+    def _configuracion_etapa(self, campos_excluidos=()) -> Dict:
+        configuracion = asdict(self.config)
+        for campo in CAMPOS_SIN_HUELLA + tuple(campos_excluidos):
+            configuracion.pop(campo, None)
+        return configuracion
+
+    def _fuentes_codigo(self) -> List[str]:
+        return [__file__] + [str(ruta) for ruta in fuentes_comun()]
+
+    def ejecutar(self):
+        os.makedirs(self.config.carpeta_informe, exist_ok=True)
+        # El servicio de gráficos vive todo el pipeline: cada figura se envía en cuanto existen sus
+        # datos y se dibuja mientras avanza el resto; al final se espera a todas.
+        with ServicioGraficos(self.config.perfil_graficos, self.config.procesos_graficos) as servicio:
+            self._ejecutar_etapas(servicio)
+        self.instrumentacion.guardar(self.config.archivo_traza)
+
+    def _ejecutar_etapas(self, servicio: ServicioGraficos):
+        etapa = self.instrumentacion.etapa
+        manifiesto = ManifiestoEtapas(self.config.archivo_manifiesto, forzar=self.config.forzar)
+        
+        etapa_particion = manifiesto.comprobar(
+            "particion",
+            entradas=[self.config.archivo_entrada] + self._fuentes_codigo(),
+            configuracion=self._configuracion_etapa(campos_excluidos=("carpeta_informe", "nombre_informe_html", "perfil_graficos")),
+            salidas=self._salidas_particion(),
+        )
+        if etapa_particion.vigente:
+            with etapa("carga_resumen"):
+                resumen = ResumenColumnas.cargar(self.config.archivo_resumen)
+        else:
+            resumen = ResumenColumnas()
+            with etapa("particion"):
+                if self.config.tamano_bloque:
+                    conteo_train, conteo_test = self._procesar_por_bloques(resumen)
+                else:
+                    conteo_train, conteo_test = self._procesar_en_memoria(resumen)
+                resumen.guardar(self.config.archivo_resumen)
+            manifiesto.registrar(etapa_particion)
+        
+        ruta_html = os.path.join(self.config.carpeta_informe, self.config.nombre_informe_html)
+        etapa_informe = manifiesto.comprobar(
+            "informe",
+            entradas=[self.config.archivo_resumen] + self._fuentes_codigo(),
+            configuracion={
+                "carpeta_informe": self.config.carpeta_informe,
+                "nombre_informe_html": self.config.nombre_informe_html,
+                "perfil_graficos": self.config.perfil_graficos,
+            },
+            salidas=[
+                ruta_html,
+                os.path.join(self.config.carpeta_informe, "dist_estado_diabetes.png"),
+                os.path.join(self.config.carpeta_informe, "hist_imc.png"),
+            ],
+        )
+        if not etapa_informe.vigente:
+            # Las figuras solo necesitan el resumen: se envían ya y se dibujan mientras se
+            # imprimen las distribuciones y se escribe el HTML.
+            with etapa("graficos"):
+                rutas_imagenes = self.generar_graficos(resumen, servicio)
+        
+        if not etapa_particion.vigente:
+            print("Distribución global de 'estado_diabetes' binarizado:")
+            print(resumen.estadisticas["estado_diabetes"].frecuencias.sort_values(ascending=False).rename_axis("estado_diabetes"))
+            
+            print("\nDistribución en TRAIN:")
+            print(conteo_train / conteo_train.sum())
+            print("\nDistribución en TEST:")
+            print(conteo_test / conteo_test.sum())
         
-        print("\nGenerando gráficas e informe HTML...")
-        rutas_imagenes = self.generar_graficos(dataset_modelo)
-        ruta_html = self.generar_informe_html(dataset_modelo, rutas_imagenes)
-        print(f"Informe HTML generado en: {ruta_html}")
+        if not etapa_informe.vigente:
+            print("\nGenerando gráficas e informe HTML...")
+            with etapa("informe"):
+                with etapa("html"):
+                    ruta_html = self.generar_informe_html(resumen, rutas_imagenes)
+                with etapa("espera_graficos"):
+                    servicio.esperar()
+            manifiesto.registrar(etapa_informe)
+            print(f"Informe HTML generado en: {ruta_html}")
         
         print("\n Preprocesamiento + partición train/test + informe HTML completados.")
-        print(f"   - {self.config.archivo_salida_completo}")
-        print(f"   - {self.config.archivo_train}")
-        print(f"   - {self.config.archivo_test}")
+        for ruta in self._salidas_particion():
+            print(f"   - {ruta}")
         print(f"   - {ruta_html}")
 
 if __name__ == "__main__":
-    config = ConfiguracionPreprocesamiento()
+    parser = argparse.ArgumentParser(description="Preprocesamiento y partición train/test del dataset de riesgo de diabetes.")
+    parser.add_argument("--tamano-bloque", type=int, default=None,
+                        help="Procesa la entrada por bloques de N filas con memoria acotada (por defecto, todo en memoria).")
+    parser.add_argument("--forzar", action="store_true",
+                        help="Ejecuta todas las etapas aunque sus entradas y configuración no hayan cambiado.")
+    parser.add_argument("--exportar-csv", action="store_true",
+                        help="Escribe además modificado.csv, train.csv y test.csv (por defecto solo el almacén columnar e índices).")
+    parser.add_argument("--semillas", type=int, nargs="*", default=[],
+                        help="Semillas adicionales para las que se guardan índices de partición train/test.")
+    parser.add_argument("--k-pliegues", type=int, default=0,
+                        help="Número de pliegues estratificados (k-fold) a guardar dentro del entrenamiento de cada partición.")
+    parser.add_argument("--colapsar-duplicados", action="store_true",
+                        help="Genera además el entrenamiento con filas únicas y su columna 'conteo' para usarla como peso.")
+    parser.add_argument("--perfil-graficos", choices=sorted(PERFILES), default="completo",
+                        help="'rapido' dibuja a menor resolución, con series diezmadas y sin anotaciones por punto.")
+    parser.add_argument("--instrumentar", action="store_true",
+                        help="Mide tiempo, CPU y pico de memoria por etapa y los guarda en dataset/traza_preprocesamiento.json.")
+    args = parser.parse_args()
+    
+    config = ConfiguracionPreprocesamiento(
+        tamano_bloque=args.tamano_bloque,
+        exportar_csv=args.exportar_csv,
+        semillas_adicionales=tuple(args.semillas),
+        k_pliegues=args.k_pliegues,
+        colapsar_duplicados=args.colapsar_duplicados,
+        perfil_graficos=args.perfil_graficos,
+        forzar=args.forzar,
+        instrumentar=args.instrumentar or None,
+    )
     preprocesador = PreprocesadorDatos(config)
-    preprocesador.ejecutar()
\ No newline at end of file
+    preprocesador.ejecutar()
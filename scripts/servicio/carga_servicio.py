@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+import sys
+import json
+import time
+import asyncio
+import argparse
+import numpy as np
+import pandas as pd
+from dataclasses import replace
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from comun.artefacto import cargar_artefacto
+from servicio import ConfiguracionServicio, PERCENTILES, ServicioPrediccion
+
+RUTA_BASE = Path(__file__).resolve().parent.parent.parent
+RUTA_PACIENTES = RUTA_BASE / "dataset" / "test.csv"
+
+# Diferencia máxima admitida entre la probabilidad del servicio y la del modelo cargado directamente
+# (el JSON redondea a la representación más corta del float64, que se relee exacta).
+TOLERANCIA_PROBABILIDAD = 1e-9
+
+
+async def _peticion(lector: asyncio.StreamReader, escritor: asyncio.StreamWriter, metodo: str, ruta: str,
+                    cuerpo: bytes = b"") -> Tuple[int, Dict]:
+    escritor.write(f"{metodo} {ruta} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                   f"Content-Length: {len(cuerpo)}\r\n\r\n".encode("latin-1") + cuerpo)
+    await escritor.drain()
+    estado = int((await lector.readline()).split()[1])
+    longitud = 0
+    while True:
+        linea = await lector.readline()
+        if linea in (b"\r\n", b""):
+            break
+        nombre, _, valor = linea.decode("latin-1").partition(":")
+        if nombre.strip().lower() == "content-length":
+            longitud = int(valor)
+    return estado, json.loads(await lector.readexactly(longitud))
+
+
+async def consultar(host: str, puerto: int, metodo: str, ruta: str, datos=None) -> Tuple[int, Dict]:
+    """Una petición en una conexión nueva (para /estado o pruebas puntuales)."""
+    lector, escritor = await asyncio.open_connection(host, puerto)
+    try:
+        return await _peticion(lector, escritor, metodo, ruta, b"" if datos is None else json.dumps(datos).encode("utf-8"))
+    finally:
+        escritor.close()
+        await escritor.wait_closed()
+
+
+async def _cliente(host: str, puerto: int, cuerpos: List[bytes], indices: range, latencias: List[float],
+                   probabilidades: np.ndarray):
+    """Envía sus pacientes de uno en uno por una conexión persistente, esperando cada respuesta."""
+    lector, escritor = await asyncio.open_connection(host, puerto)
+    try:
+        for i in indices:
+            inicio = time.perf_counter()
+            estado, respuesta = await _peticion(lector, escritor, "POST", "/predecir", cuerpos[i])
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            if estado == 200:
+                probabilidades[i] = respuesta["probabilidad"]
+    finally:
+        escritor.close()
+        await escritor.wait_closed()
+
+
+async def ejecutar_carga(host: str, puerto: int, cuerpos: List[bytes], concurrencia: int) -> Dict:
+    """Reparte los pacientes entre ``concurrencia`` clientes simultáneos y mide la latencia de cada petición."""
+    latencias: List[float] = []
+    probabilidades = np.full(len(cuerpos), np.nan)
+    inicio = time.perf_counter()
+    await asyncio.gather(*(
+        _cliente(host, puerto, cuerpos, range(c, len(cuerpos), concurrencia), latencias, probabilidades)
+        for c in range(concurrencia)
+    ))
+    segundos = time.perf_counter() - inicio
+    _, estado = await consultar(host, puerto, "GET", "/estado")
+    return {
+        "peticiones_por_segundo": len(cuerpos) / segundos,
+        "latencia_ms": {f"p{q}": float(np.percentile(latencias, q)) for q in PERCENTILES},
+        "filas_por_lote_medio": estado["filas_por_lote_medio"],
+        "probabilidades": probabilidades,
+    }
+
+
+async def comparar(config: ConfiguracionServicio, lotes_maximos: List[Optional[int]], concurrencia: int, n_pacientes: int,
+                   url: Optional[str] = None) -> Dict[str, Dict]:
+    X = pd.read_csv(RUTA_PACIENTES, nrows=n_pacientes)
+    artefacto = cargar_artefacto(config.ruta_modelo, motor="catboost")
+    X = X[artefacto["nombres_caracteristicas"]]
+    esperadas = artefacto["modelo"].predict_proba(X)[:, 1]
+    cuerpos = [json.dumps(p).encode("utf-8") for p in X.to_dict(orient="records")]
+    print(f"[*] {len(cuerpos):,} peticiones de un paciente con {concurrencia} clientes simultáneos")
+
+    resultados = {}
+    destinos = [None] if url else [replace(config, lote_maximo=n, puerto=0) for n in lotes_maximos]
+    for configuracion in destinos:
+        servicio = None
+        if configuracion is None:
+            nombre = f"externo {url}"
+            host, puerto = url.rsplit(":", 1)
+            puerto = int(puerto)
+        else:
+            servicio = ServicioPrediccion(configuracion)
+            # Con lote_maximo None el servicio toma el del perfil de rendimiento.
+            nombre = f"lote_maximo={servicio.config.lote_maximo}"
+            host, puerto = configuracion.host, await servicio.iniciar()
+        try:
+            medida = await ejecutar_carga(host, puerto, cuerpos, concurrencia)
+        finally:
+            if servicio is not None:
+                await servicio.detener()
+        diferencia = float(np.nanmax(np.abs(medida.pop("probabilidades") - esperadas)))
+        if not diferencia <= TOLERANCIA_PROBABILIDAD:
+            raise AssertionError(f"El servicio difiere del modelo en {diferencia:.3g} (> {TOLERANCIA_PROBABILIDAD}).")
+        resultados[nombre] = medida
+        latencia = " | ".join(f"{p} {v:7.2f} ms" for p, v in medida["latencia_ms"].items())
+        lote = medida["filas_por_lote_medio"]
+        print(f"    > {nombre:<16} {medida['peticiones_por_segundo']:9,.0f} peticiones/s | {latencia} | "
+              f"{lote:6.1f} filas por lote | diferencia máxima {diferencia:.1e}")
+    return resultados
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prueba de carga del servicio de predicción en localhost.")
+    parser.add_argument("--url", default=None, metavar="HOST:PUERTO",
+                        help="Servicio ya arrancado; por defecto se arranca uno en este proceso por cada --lote-maximo.")
+    parser.add_argument("--lote-maximo", type=int, nargs="+", default=[1, None],
+                        help="Tamaños máximos de micro-lote a comparar (1 = sin micro-lotes; por defecto se comparan 1 y el del perfil de rendimiento).")
+    parser.add_argument("--espera-maxima-ms", type=float, default=ConfiguracionServicio.espera_maxima_ms)
+    parser.add_argument("--motor", default=ConfiguracionServicio.motor)
+    parser.add_argument("--concurrencia", type=int, default=64, help="Clientes simultáneos.")
+    parser.add_argument("--pacientes", type=int, default=20_000, help="Peticiones en total (filas de dataset/test.csv).")
+    args = parser.parse_args()
+    config = ConfiguracionServicio(espera_maxima_ms=args.espera_maxima_ms, motor=args.motor)
+    asyncio.run(comparar(config, args.lote_maximo, args.concurrencia, args.pacientes, url=args.url))
@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+
+import sys
+import json
+import time
+import asyncio
+import argparse
+import numpy as np
+import pandas as pd
+from collections import deque
+from dataclasses import dataclass, replace
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from comun.artefacto import MOTORES, cargar_artefacto
+from comun.cache_predicciones import CachePredicciones
+from comun.esquema import POR_DESTINO, describir_motivos, reglas_validacion, validar_filas
+from comun.perfil_rendimiento import cargar_perfil, hilos_prediccion, tamano_lote
+
+RUTA_BASE = Path(__file__).resolve().parent.parent.parent
+
+# Latencias recientes con las que se calculan los percentiles de /estado.
+VENTANA_LATENCIAS = 10_000
+PERCENTILES = (50, 90, 99)
+
+# Límites de una petición HTTP: protegen al servicio de cuerpos o cabeceras desmesurados.
+MAX_BYTES_CUERPO = 8 << 20
+MAX_CABECERAS = 100
+
+# Sin perfil de rendimiento medido en esta máquina.
+LOTE_MAXIMO_POR_DEFECTO = 256
+HILOS_POR_DEFECTO = 1
+
+RAZONES = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 422: "Unprocessable Entity", 500: "Internal Server Error"}
+
+
+class ErrorPeticion(Exception):
+    def __init__(self, estado: int, mensaje: str, **detalle):
+        super().__init__(mensaje)
+        self.estado = estado
+        self.cuerpo = {"error": mensaje, **detalle}
+
+
+@dataclass
+class ConfiguracionServicio:
+    ruta_modelo: Path = RUTA_BASE / "resultados"
+    host: str = "127.0.0.1"
+    puerto: int = 8000
+    # Micro-lotes: el primer paciente que llega espera como mucho ``espera_maxima_ms`` a que se le
+    # unan otros, y el lote se cierra antes si alcanza ``lote_maximo`` filas.
+    espera_maxima_ms: float = 0.0
+    # None: el tamaño de lote y los hilos de predicción de resultados/perfil_rendimiento.json, o
+    # LOTE_MAXIMO_POR_DEFECTO y HILOS_POR_DEFECTO si no hay perfil medido en esta máquina.
+    lote_maximo: Optional[int] = None
+    motor: str = "auto"
+    hilos: Optional[int] = None
+    # Capacidad de CachePredicciones (0 la desactiva).
+    cache: int = 0
+
+
+class _Pendiente:
+    __slots__ = ("matriz", "futuro")
+
+    def __init__(self, matriz: np.ndarray, futuro: asyncio.Future):
+        self.matriz = matriz
+        self.futuro = futuro
+
+
+def _numero(valor) -> float:
+    """Valor JSON de una característica: número o ``null`` (NaN). ``true``/``false`` no se aceptan,
+    aunque ``float`` los convertiría en 1 y 0."""
+    if valor is None:
+        return np.nan
+    if isinstance(valor, bool):
+        raise TypeError("valor booleano")
+    return float(valor)
+
+
+class ServicioPrediccion:
+    """Servicio HTTP de predicción sobre asyncio, sin dependencias fuera de la biblioteca estándar.
+
+    El artefacto se carga una vez. Las peticiones solo convierten el JSON en filas y las encolan;
+    una única tarea junta las filas pendientes en micro-lotes (``espera_maxima_ms``, ``lote_maximo``)
+    y los valida y puntúa en un hilo aparte, para que el bucle de eventos siga atendiendo conexiones
+    mientras el modelo trabaja.
+
+    Rutas: ``POST /predecir`` (un paciente, una lista o ``{"pacientes": [...]}``), ``GET /estado``
+    (latencias, profundidad de la cola y tamaño de los lotes) y ``GET /salud``.
+    """
+
+    def __init__(self, config: Optional[ConfiguracionServicio] = None):
+        self.config = config or ConfiguracionServicio()
+        if self.config.lote_maximo is None or self.config.hilos is None:
+            perfil = cargar_perfil(RUTA_BASE)
+            self.config = replace(
+                self.config,
+                lote_maximo=self.config.lote_maximo if self.config.lote_maximo is not None else tamano_lote(perfil) or LOTE_MAXIMO_POR_DEFECTO,
+                hilos=self.config.hilos if self.config.hilos is not None else hilos_prediccion(perfil) or HILOS_POR_DEFECTO,
+            )
+        if self.config.lote_maximo < 1 or self.config.espera_maxima_ms < 0:
+            raise ValueError("lote_maximo debe ser al menos 1 y espera_maxima_ms no puede ser negativa.")
+        artefacto = cargar_artefacto(self.config.ruta_modelo, motor=self.config.motor)
+        self.nombres: List[str] = list(artefacto["nombres_caracteristicas"])
+        self.umbral = float(artefacto["umbral_optimo"])
+        self.modelo = artefacto["modelo"]
+        self.predictor = CachePredicciones(self.modelo, self.config.cache) if self.config.cache else self.modelo
+        self.reglas = reglas_validacion([n for n in self.nombres if n in POR_DESTINO])
+        # Rangos del esquema por columna, para descartar en NumPy las filas válidas sin pasar por pandas.
+        columnas = [POR_DESTINO.get(n) for n in self.nombres]
+        self._minimos = np.array([-np.inf if c is None else c.minimo for c in columnas], dtype=np.float32)
+        self._maximos = np.array([np.inf if c is None else c.maximo for c in columnas], dtype=np.float32)
+        self._enteras = np.array([c is not None and np.dtype(c.tipo).kind in "iu" for c in columnas])
+        self._ejecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prediccion")
+        self._cola: "deque[_Pendiente]" = deque()
+        self._filas_en_cola = 0
+        self._hay_datos: Optional[asyncio.Event] = None
+        self._agrupador: Optional[asyncio.Task] = None
+        self._servidor: Optional[asyncio.AbstractServer] = None
+        self._conexiones: Set[asyncio.Task] = set()
+        self._latencias: "deque[float]" = deque(maxlen=VENTANA_LATENCIAS)
+        self._tamanos_lote: "deque[int]" = deque(maxlen=VENTANA_LATENCIAS)
+        self.peticiones = 0
+        self.errores = 0
+        self.lotes = 0
+        self.filas = 0
+        self.inicio = time.time()
+
+    # --- Micro-lotes -------------------------------------------------------------------------
+
+    async def predecir(self, matriz: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Probabilidades y máscaras de validación (0 = fila válida) de las filas de ``matriz``."""
+        futuro = asyncio.get_running_loop().create_future()
+        self._cola.append(_Pendiente(matriz, futuro))
+        self._filas_en_cola += len(matriz)
+        self._hay_datos.set()
+        return await futuro
+
+    def _tomar_lote(self) -> List[_Pendiente]:
+        """Peticiones de la cola hasta ``lote_maximo`` filas; una petición mayor forma su propio lote."""
+        lote, filas = [], 0
+        while self._cola and (not lote or filas + len(self._cola[0].matriz) <= self.config.lote_maximo):
+            pendiente = self._cola.popleft()
+            filas += len(pendiente.matriz)
+            lote.append(pendiente)
+        self._filas_en_cola -= filas
+        if not self._cola:
+            self._hay_datos.clear()
+        return lote
+
+    def _validar(self, matriz: np.ndarray) -> np.ndarray:
+        """Máscaras de ``validar_filas`` (0 = fila válida); solo las filas sospechosas pasan por pandas,
+        que con pocos pacientes cuesta más que el propio modelo."""
+        mascaras = np.zeros(len(matriz), dtype=np.uint64)
+        validas = (matriz >= self._minimos) & (matriz <= self._maximos) & (~self._enteras | (np.rint(matriz) == matriz))
+        sospechosas = np.flatnonzero(~validas.all(axis=1))
+        if len(sospechosas):
+            mascaras[sospechosas] = validar_filas(pd.DataFrame(matriz[sospechosas], columns=self.nombres), self.reglas)
+        return mascaras
+
+    def _puntuar(self, matriz: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        mascaras = self._validar(matriz)
+        probabilidades = np.full(len(matriz), np.nan)
+        validas = mascaras == 0
+        if validas.any():
+            # PuntuadorArboles y CachePredicciones aceptan thread_count igual que CatBoost.
+            probabilidades[validas] = self.predictor.predict_proba(matriz[validas], thread_count=self.config.hilos)[:, 1]
+        return probabilidades, mascaras
+
+    async def _agrupar(self):
+        bucle = asyncio.get_running_loop()
+        espera = self.config.espera_maxima_ms / 1000
+        while True:
+            await self._hay_datos.wait()
+            limite = bucle.time() + espera
+            # Se espera a más pacientes mientras el lote no esté lleno y quede tiempo.
+            while self._filas_en_cola < self.config.lote_maximo:
+                restante = limite - bucle.time()
+                if restante <= 0:
+                    break
+                self._hay_datos.clear()
+                try:
+                    await asyncio.wait_for(self._hay_datos.wait(), restante)
+                except asyncio.TimeoutError:
+                    break
+            lote = self._tomar_lote()
+            if not lote:
+                continue
+            matriz = np.concatenate([p.matriz for p in lote]) if len(lote) > 1 else lote[0].matriz
+            try:
+                probabilidades, mascaras = await bucle.run_in_executor(self._ejecutor, self._puntuar, matriz)
+            except Exception as error:
+                for p in lote:
+                    if not p.futuro.done():
+                        p.futuro.set_exception(error)
+                continue
+            self.lotes += 1
+            self.filas += len(matriz)
+            self._tamanos_lote.append(len(matriz))
+            inicio = 0
+            for p in lote:
+                fin = inicio + len(p.matriz)
+                if not p.futuro.done():
+                    p.futuro.set_result((probabilidades[inicio:fin], mascaras[inicio:fin]))
+                inicio = fin
+            if self._cola:
+                self._hay_datos.set()
+
+    # --- Peticiones --------------------------------------------------------------------------
+
+    def _matriz(self, pacientes: List[Any]) -> np.ndarray:
+        matriz = np.empty((len(pacientes), len(self.nombres)), dtype=np.float32)
+        for i, paciente in enumerate(pacientes):
+            if not isinstance(paciente, dict):
+                raise ErrorPeticion(400, f"El paciente {i} no es un objeto JSON.")
+            faltan = [n for n in self.nombres if n not in paciente]
+            if faltan:
+                raise ErrorPeticion(400, f"Al paciente {i} le faltan características.", faltan=faltan)
+            try:
+                matriz[i] = [_numero(paciente[n]) for n in self.nombres]
+            except (TypeError, ValueError):
+                raise ErrorPeticion(400, f"El paciente {i} tiene valores no numéricos.") from None
+        return matriz
+
+    def _resultado(self, probabilidad: float, mascara: np.ndarray) -> Dict[str, Any]:
+        if np.isnan(probabilidad):
+            return {"probabilidad": None, "riesgo_alto": None,
+                    "incidencias": describir_motivos(mascara, self.reglas)[0].split(";")}
+        # Misma regla que la aplicación: riesgo alto si la probabilidad alcanza el umbral.
+        return {"probabilidad": float(probabilidad), "riesgo_alto": int(probabilidad >= self.umbral)}
+
+    async def _predecir_json(self, cuerpo: bytes) -> Tuple[int, Dict[str, Any]]:
+        try:
+            datos = json.loads(cuerpo)
+        except ValueError:
+            raise ErrorPeticion(400, "El cuerpo no es JSON válido.") from None
+        lote = isinstance(datos, list) or (isinstance(datos, dict) and "pacientes" in datos)
+        pacientes = datos if isinstance(datos, list) else datos.get("pacientes", [datos]) if isinstance(datos, dict) else None
+        if not isinstance(pacientes, list):
+            raise ErrorPeticion(400, "Se espera un paciente, una lista o {\"pacientes\": [...]}.")
+        if not pacientes:
+            return 200, {"umbral": self.umbral, "resultados": []}
+        probabilidades, mascaras = await self.predecir(self._matriz(pacientes))
+        resultados = [self._resultado(p, mascaras[i:i + 1]) for i, p in enumerate(probabilidades)]
+        if lote:
+            return 200, {"umbral": self.umbral, "resultados": resultados}
+        return (422 if resultados[0]["probabilidad"] is None else 200), {**resultados[0], "umbral": self.umbral}
+
+    def estado(self) -> Dict[str, Any]:
+        latencias = np.asarray(self._latencias, dtype=np.float64)
+        tamanos = np.asarray(self._tamanos_lote, dtype=np.float64)
+        return {
+            "peticiones": self.peticiones,
+            "errores": self.errores,
+            "lotes": self.lotes,
+            "filas": self.filas,
+            "cola_peticiones": len(self._cola),
+            "cola_filas": self._filas_en_cola,
+            "latencia_ms": {f"p{q}": float(np.percentile(latencias, q)) if len(latencias) else None for q in PERCENTILES},
+            "filas_por_lote_medio": float(tamanos.mean()) if len(tamanos) else None,
+            "segundos_activo": time.time() - self.inicio,
+            "configuracion": {"espera_maxima_ms": self.config.espera_maxima_ms, "lote_maximo": self.config.lote_maximo,
+                              "motor": self.config.motor, "hilos": self.config.hilos, "cache": self.config.cache},
+            **({"cache_predicciones": self.predictor.estadisticas()} if self.config.cache else {}),
+        }
+
+    async def _responder(self, metodo: str, ruta: str, cuerpo: bytes) -> Tuple[int, Dict[str, Any]]:
+        ruta = ruta.split("?", 1)[0]
+        if ruta == "/predecir":
+            if metodo != "POST":
+                raise ErrorPeticion(405, "Use POST en /predecir.")
+            return await self._predecir_json(cuerpo)
+        if ruta in ("/estado", "/salud"):
+            if metodo != "GET":
+                raise ErrorPeticion(405, f"Use GET en {ruta}.")
+            return 200, self.estado() if ruta == "/estado" else {"estado": "ok"}
+        raise ErrorPeticion(404, f"No existe la ruta {ruta}.")
+
+    async def _leer_cabeceras(self, linea: bytes, lector: asyncio.StreamReader) -> Tuple[str, str, str, Dict[str, str]]:
+        partes = linea.decode("latin-1").split()
+        if len(partes) != 3 or not partes[2].startswith("HTTP/"):
+            raise ErrorPeticion(400, "Petición HTTP mal formada.")
+        cabeceras = {}
+        for _ in range(MAX_CABECERAS):
+            cabecera = await lector.readline()
+            if cabecera in (b"\r\n", b"\n", b""):
+                return partes[0], partes[1], partes[2], cabeceras
+            nombre, _, valor = cabecera.decode("latin-1").partition(":")
+            cabeceras[nombre.strip().lower()] = valor.strip()
+        raise ErrorPeticion(400, "Demasiadas cabeceras.")
+
+    async def _atender(self, lector: asyncio.StreamReader, escritor: asyncio.StreamWriter):
+        """Una conexión HTTP/1.1; se mantiene abierta entre peticiones salvo ``Connection: close``."""
+        tarea = asyncio.current_task()
+        self._conexiones.add(tarea)
+        try:
+            while True:
+                linea = await lector.readline()
+                if not linea.strip():
+                    break
+                inicio = time.perf_counter()
+                mantener, cuerpo = True, None
+                try:
+                    metodo, ruta, version, cabeceras = await self._leer_cabeceras(linea, lector)
+                    mantener = version == "HTTP/1.1" and cabeceras.get("connection", "").lower() != "close"
+                    longitud = cabeceras.get("content-length", "0")
+                    if not longitud.isdigit():
+                        raise ErrorPeticion(400, "Content-Length no válido.")
+                    longitud = int(longitud)
+                    if longitud > MAX_BYTES_CUERPO:
+                        raise ErrorPeticion(413, f"El cuerpo supera {MAX_BYTES_CUERPO} bytes.")
+                    cuerpo = await lector.readexactly(longitud) if longitud else b""
+                    estado, respuesta = await self._responder(metodo, ruta, cuerpo)
+                except ErrorPeticion as error:
+                    estado, respuesta = error.estado, error.cuerpo
+                    # Si no se llegó a leer el cuerpo, no se sabe dónde empieza la siguiente petición.
+                    mantener = mantener and cuerpo is not None
+                except Exception as error:
+                    estado, respuesta = 500, {"error": f"{type(error).__name__}: {error}"}
+                self.peticiones += 1
+                self.errores += estado >= 400
+                contenido = json.dumps(respuesta, ensure_ascii=False).encode("utf-8")
+                escritor.write(
+                    f"HTTP/1.1 {estado} {RAZONES.get(estado, '')}\r\n"
+                    f"Content-Type: application/json; charset=utf-8\r\n"
+                    f"Content-Length: {len(contenido)}\r\n"
+                    f"Connection: {'keep-alive' if mantener else 'close'}\r\n\r\n".encode("latin-1") + contenido
+                )
+                await escritor.drain()
+                self._latencias.append((time.perf_counter() - inicio) * 1000)
+                if not mantener:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            self._conexiones.discard(tarea)
+            escritor.close()
+
+    # --- Ciclo de vida -----------------------------------------------------------------------
+
+    async def iniciar(self) -> int:
+        """Abre el puerto (0 elige uno libre) y arranca el agrupador; devuelve el puerto."""
+        self._hay_datos = asyncio.Event()
+        self._agrupador = asyncio.create_task(self._agrupar())
+        self._servidor = await asyncio.start_server(self._atender, self.config.host, self.config.puerto)
+        return self._servidor.sockets[0].getsockname()[1]
+
+    async def detener(self):
+        if self._servidor is not None:
+            self._servidor.close()
+            await self._servidor.wait_closed()
+        # Las conexiones abiertas se esperan en readline: se cancelan para no dejarlas a medias.
+        tareas = [t for t in (*self._conexiones, self._agrupador) if t is not None]
+        for tarea in tareas:
+            tarea.cancel()
+        await asyncio.gather(*tareas, return_exceptions=True)
+        self._ejecutor.shutdown(wait=False)
+
+    async def servir(self):
+        puerto = await self.iniciar()
+        print(f"[*] Servicio de predicción en http://{self.config.host}:{puerto} "
+              f"({len(self.nombres)} características, umbral {self.umbral:.4f}, motor {self.config.motor})")
+        print(f"    > Micro-lotes de hasta {self.config.lote_maximo} filas, espera máxima {self.config.espera_maxima_ms} ms")
+        try:
+            await self._servidor.serve_forever()
+        finally:
+            await self.detener()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servicio HTTP local de predicción del riesgo de diabetes con micro-lotes.")
+    parser.add_argument("--modelo", type=Path, default=ConfiguracionServicio.ruta_modelo,
+                        help="Carpeta de resultados, carpeta del artefacto o modelo.pkl (por defecto resultados/).")
+    parser.add_argument("--host", default=ConfiguracionServicio.host, help="Dirección de escucha (por defecto solo local).")
+    parser.add_argument("--puerto", type=int, default=ConfiguracionServicio.puerto, help="Puerto (0 elige uno libre).")
+    parser.add_argument("--espera-maxima-ms", type=float, default=ConfiguracionServicio.espera_maxima_ms,
+                        help="Tiempo máximo que un paciente espera a que se formen lotes.")
+    parser.add_argument("--lote-maximo", type=int, default=None,
+                        help=f"Filas máximas por llamada al modelo (1 desactiva los micro-lotes; por defecto, el lote "
+                             f"del perfil de rendimiento o {LOTE_MAXIMO_POR_DEFECTO}).")
+    parser.add_argument("--motor", choices=MOTORES, default=ConfiguracionServicio.motor,
+                        help="'auto' evalúa los árboles en NumPy si el artefacto los trae.")
+    parser.add_argument("--hilos", type=int, default=None,
+                        help=f"thread_count de CatBoost por lote (por defecto, el del perfil de rendimiento o {HILOS_POR_DEFECTO}).")
+    parser.add_argument("--cache", type=int, default=ConfiguracionServicio.cache, metavar="ENTRADAS",
+                        help="Memoriza probabilidades por intervalo de bordes (CachePredicciones) con esta capacidad.")
+    args = parser.parse_args()
+    servicio = ServicioPrediccion(ConfiguracionServicio(
+        ruta_modelo=args.modelo, host=args.host, puerto=args.puerto, espera_maxima_ms=args.espera_maxima_ms,
+        lote_maximo=args.lote_maximo, motor=args.motor, hilos=args.hilos, cache=args.cache,
+    ))
+    try:
+        asyncio.run(servicio.servir())
+    except KeyboardInterrupt:
+        print("\n[*] Servicio detenido.")